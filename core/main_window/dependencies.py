@@ -9,12 +9,14 @@ try:
     from core.views import VisitasView, ZonasView, ReportesView, UsuariosView
     from core.navigation_manager import NavigationManager
     from core.auth_manager import AuthManager
+    from core.visitors import VisitorManager
 except ImportError:
     from login_window import LoginDialog  # type: ignore
     from visitor_list import VisitorListWidget  # type: ignore
     from views import VisitasView, ZonasView, ReportesView, UsuariosView  # type: ignore
     from navigation_manager import NavigationManager  # type: ignore
     from auth_manager import AuthManager  # type: ignore
+    from visitors import VisitorManager  # type: ignore
 
 try:
     from core.theme import (
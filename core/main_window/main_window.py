@@ -2,12 +2,12 @@ from __future__ import annotations
 
 import sys
 
-from PySide6.QtWidgets import QApplication, QMainWindow, QStackedWidget, QSizePolicy
-from PySide6.QtCore import QSettings
+from PySide6.QtWidgets import QApplication, QMainWindow, QMessageBox, QStackedWidget, QSizePolicy
+from PySide6.QtCore import QSettings, QTimer
 from PySide6.QtGui import QGuiApplication
 
 from .auth import AuthMixin
-from .dependencies import AuthManager, NavigationManager
+from .dependencies import AuthManager, NavigationManager, VisitorManager
 from .navigation import NavigationMixin
 from .theme_control import ThemeMixin
 
@@ -33,6 +33,7 @@ class MainWindow(QMainWindow, NavigationMixin, AuthMixin, ThemeMixin):
         self.navigation_manager.set_stacked_widget(self.stacked_widget)
 
         self.setup_views()
+        self.setup_visitor_updates()
 
         self.navigation_manager.view_changed.connect(self.on_view_changed)
         self.navigation_manager.theme_changed.connect(self.on_theme_changed)
@@ -64,6 +65,35 @@ class MainWindow(QMainWindow, NavigationMixin, AuthMixin, ThemeMixin):
         self.setMinimumSize(min_w, min_h)
         self.move(available.center() - self.rect().center())
 
+    def setup_visitor_updates(self) -> None:
+        # Única consulta periódica: trae en segundo plano los cambios de otras
+        # estaciones y las vistas se actualizan con las señales de VisitorManager
+        self.visitor_manager = VisitorManager()
+        self.sync_timer = QTimer(self)
+        self.sync_timer.timeout.connect(self.visitor_manager.sync_in_background)
+        self.sync_timer.start(10000)
+
+        # Los guardados corren en segundo plano: avisar si alguno falla
+        self.visitor_manager.signals.save_failed.connect(self.on_visitor_save_failed)
+        self.visitor_manager.signals.save_conflict.connect(self.on_visitor_save_conflict)
+
+    def on_visitor_save_failed(self, visitor_ids: list, message: str) -> None:
+        QMessageBox.warning(
+            self,
+            "Error al guardar",
+            f"No se pudieron guardar {len(visitor_ids)} cambio(s) de visitantes.\n\n"
+            f"{message}\n\nLos cambios se mantienen y se reintentarán en el próximo guardado.",
+        )
+
+    def on_visitor_save_conflict(self, visitor_ids: list) -> None:
+        QMessageBox.information(
+            self,
+            "Cambios de otra estación",
+            f"{len(visitor_ids)} visita(s) fueron modificadas en otra estación antes de guardar "
+            "los cambios hechos aquí.\n\nSe muestran los datos más recientes; revise esas "
+            "visitas y vuelva a aplicar los cambios si corresponde.",
+        )
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
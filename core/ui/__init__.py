@@ -1,6 +1,8 @@
 from .table_styles import configure_modern_table, apply_modern_table_theme
+from .pagination import PaginationBar
 
 __all__ = [
     "configure_modern_table",
     "apply_modern_table_theme",
+    "PaginationBar",
 ]
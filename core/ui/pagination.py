@@ -0,0 +1,63 @@
+from PySide6.QtCore import Qt, Signal
+from PySide6.QtWidgets import QHBoxLayout, QLabel, QPushButton, QWidget
+
+
+class PaginationBar(QWidget):
+    """Controles Anterior / Siguiente para tablas que muestran una página a la vez."""
+
+    page_changed = Signal(int)
+
+    def __init__(self, page_size: int = 100, parent=None):
+        super().__init__(parent)
+        self.page_size = page_size
+        self.page = 0
+        self.page_count = 1
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 8, 0, 0)
+        layout.setSpacing(12)
+
+        self.prev_btn = QPushButton("◀ Anterior")
+        self.prev_btn.setCursor(Qt.PointingHandCursor)
+        self.prev_btn.clicked.connect(lambda: self.set_page(self.page - 1))
+
+        self.info_label = QLabel()
+        self.info_label.setAlignment(Qt.AlignCenter)
+        self.info_label.setStyleSheet("color: #64748b; font-size: 12px;")
+
+        self.next_btn = QPushButton("Siguiente ▶")
+        self.next_btn.setCursor(Qt.PointingHandCursor)
+        self.next_btn.clicked.connect(lambda: self.set_page(self.page + 1))
+
+        layout.addStretch()
+        layout.addWidget(self.prev_btn)
+        layout.addWidget(self.info_label)
+        layout.addWidget(self.next_btn)
+        layout.addStretch()
+
+    @property
+    def offset(self) -> int:
+        return self.page * self.page_size
+
+    def set_page(self, page: int) -> None:
+        """Cambia de página y avisa con ``page_changed`` para que la vista consulte."""
+        page = max(0, min(page, self.page_count - 1))
+        if page != self.page:
+            self.page = page
+            self.page_changed.emit(page)
+
+    def reset(self) -> None:
+        """Vuelve a la primera página sin emitir ``page_changed`` (p. ej. al cambiar el filtro)."""
+        self.page = 0
+
+    def update_from(self, page) -> None:
+        """Actualiza los controles con un ``VisitorPage``."""
+        self.page_count = page.page_count
+        first = page.offset + 1 if page.total else 0
+        last = page.offset + len(page)
+        self.info_label.setText(
+            f"Página {page.page_number} de {page.page_count} · {first}–{last} de {page.total}"
+        )
+        self.prev_btn.setEnabled(page.has_previous)
+        self.next_btn.setEnabled(page.has_next)
+        self.setVisible(page.page_count > 1)
@@ -6,6 +6,7 @@ from PySide6.QtCore import Qt, QThread, Signal, QTimer
 from PySide6.QtGui import QFont, QPixmap, QColor, QGuiApplication
 from core.ui.icon_loader import get_icon_for_emoji
 from core.ui.resource_paths import get_logo_path
+from core.ui.pagination import PaginationBar
 import sys
 import os
 from datetime import datetime, timedelta
@@ -254,6 +255,19 @@ class ChartWidget(QWidget):
 class ReportesView(QWidget):
     """Vista para reportes y estadísticas"""
     
+    # Filas por página de la tabla de visitantes
+    PAGE_SIZE = 100
+
+    # Período de la tabla -> meses anteriores al actual que incluye (None = todo).
+    # Por defecto solo el mes en curso, que ya está en memoria; los meses
+    # anteriores y el archivo se leen solo si se eligen
+    PERIODS = {
+        "Este mes": 0,
+        "Últimos 3 meses": 2,
+        "Últimos 12 meses": 11,
+        "Todo el historial": None,
+    }
+
     def __init__(self, parent=None, auth_manager=None):
         super().__init__(parent)
         self.visitor_manager = VisitorManager()
@@ -264,16 +278,56 @@ class ReportesView(QWidget):
         # Configurar tamaño mínimo para mejor visualización de la tabla
         self.setMinimumSize(1300, 700)  # Ancho mínimo de 1300px para acomodar todas las columnas
         
+        # Los cambios notificados por VisitorManager se agrupan en un solo redibujado
+        self._stale = False
+        self._render_timer = QTimer(self)
+        self._render_timer.setSingleShot(True)
+        self._render_timer.setInterval(300)
+        self._render_timer.timeout.connect(self.render_visitors_data)
+
         self.setup_ui()
-        
-        # Timer para actualizar automáticamente cada 10 segundos
-        self.refresh_timer = QTimer()
-        self.refresh_timer.timeout.connect(self.refresh_visitors_data)
-        self.refresh_timer.start(10000)  # 10 segundos
+
+        signals = self.visitor_manager.signals
+        signals.visitor_added.connect(self.on_visitors_changed)
+        signals.visitor_updated.connect(self.on_visitors_changed)
+        signals.visitor_removed.connect(self.on_visitors_changed)
+        signals.dataset_reloaded.connect(self.on_visitors_changed)
+        signals.history_progress.connect(self.on_history_progress)
+        signals.report_ready.connect(self.on_report_ready)
         
         # Conectar el evento de cambio de tamaño para ajustar las columnas
         self.resizeEvent = self.on_resize_event
     
+    def on_filter_changed(self, _text=None):
+        self.pagination.reset()
+        self.render_visitors_data()
+
+    def _period_since(self):
+        """Inicio del período elegido para la tabla y la exportación (None = sin límite)."""
+        months_back = self.PERIODS.get(self.period_combo.currentText(), 0)
+        if months_back is None:
+            return None
+        now = datetime.now()
+        month = now.year * 12 + now.month - 1 - months_back
+        return f"{month // 12:04d}-{month % 12 + 1:02d}-01 00:00:00"
+
+    def on_visitors_changed(self, visitor_ids=None):
+        """Programa el redibujado; si la vista está oculta se hace al mostrarla"""
+        if self.isVisible():
+            self._render_timer.start()
+        else:
+            self._stale = True
+
+    def on_history_progress(self, loaded, total):
+        # Visitas anteriores del mes cargadas en segundo plano
+        self.on_visitors_changed()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self._stale:
+            self._stale = False
+            self.render_visitors_data()
+
     def update_auth_manager(self, auth_manager):
         """Actualiza la instancia del AuthManager"""
         self.auth_manager = auth_manager
@@ -764,8 +818,21 @@ class ReportesView(QWidget):
                 border-color: {DUOC_PRIMARY};
             }}
         """)
-        self.filter_combo.currentTextChanged.connect(self.refresh_visitors_data)
+        self.filter_combo.currentTextChanged.connect(self.on_filter_changed)
         action_layout.addWidget(self.filter_combo)
+
+        # Período de la tabla
+        period_label = QLabel("Período:")
+        period_label.setFont(QFont("Arial", self.screen_config['btn_font_size'], QFont.Bold))
+        action_layout.addWidget(period_label)
+
+        self.period_combo = QComboBox()
+        self.period_combo.addItems(list(self.PERIODS))
+        self.period_combo.setMinimumSize(self.screen_config['btn_width'], self.screen_config['btn_height'])
+        self.period_combo.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
+        self.period_combo.setStyleSheet(self.filter_combo.styleSheet())
+        self.period_combo.currentTextChanged.connect(self.on_filter_changed)
+        action_layout.addWidget(self.period_combo)
         
         # Botón para exportar a Excel responsivo
         self.btn_export = QPushButton("📊 Exportar a Excel")
@@ -817,6 +884,12 @@ class ReportesView(QWidget):
         self.visitors_table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         content_layout.addWidget(self.visitors_table, 1)  # El 1 hace que tome todo el espacio disponible
 
+        # La tabla muestra una página a la vez
+        self.pagination = PaginationBar(self.PAGE_SIZE)
+        self.pagination.setVisible(False)
+        self.pagination.page_changed.connect(lambda _page: self.render_visitors_data())
+        content_layout.addWidget(self.pagination)
+
         # Estado vacío
         self.empty_state = QLabel("\nNo hay datos para mostrar con el filtro seleccionado.\n")
         self.empty_state.setAlignment(Qt.AlignCenter)
@@ -839,9 +912,9 @@ class ReportesView(QWidget):
         """)
         content_layout.addWidget(self.info_label)
         
-        # Cargar datos iniciales
-        self.refresh_visitors_data()
-        self.update_statistics()
+        # Los datos se cargan al mostrar la vista por primera vez (render_visitors_data
+        # también actualiza las estadísticas)
+        self._stale = True
         
         # Configurar el área de scroll con el contenido
         scroll_area.setWidget(content_widget)
@@ -1042,21 +1115,38 @@ class ReportesView(QWidget):
         return card
     
     def refresh_visitors_data(self):
+        """Incorpora los cambios de otras estaciones y redibuja la tabla"""
+        # Los cambios de otras estaciones llegan después con las señales
+        self.visitor_manager.sync_in_background()
+        self.render_visitors_data()
+
+    def render_visitors_data(self):
         """Actualiza los datos de visitantes en la tabla"""
+        # Los cambios pendientes de agrupar quedan incluidos en este redibujado
+        self._render_timer.stop()
+        self._stale = False
         try:
-            # Recargar los datos desde el archivo JSON para obtener la información más actualizada
-            self.visitor_manager.load_visitors()
-            
-            # Determinar qué datos mostrar según el filtro
+            # Determinar qué datos mostrar según el filtro y el período
             filter_text = self.filter_combo.currentText()
+            since = self._period_since()
             if filter_text == "Solo visitantes actuales":
-                visitors_data = self.visitor_manager.get_visitor_report_data(include_departed=False)
+                filters = {"estado": "Dentro"}
             elif filter_text == "Solo visitantes que se fueron":
-                # Filtrar solo los que se fueron
-                all_data = self.visitor_manager.get_visitor_report_data(include_departed=True)
-                visitors_data = [v for v in all_data if v['estado_visita'] == "Finalizada"]
+                filters = {"estado": "Fuera", "history": True, "since": since}
             else:  # "Todos los visitantes"
-                visitors_data = self.visitor_manager.get_visitor_report_data(include_departed=True)
+                filters = {"history": True, "since": since}
+
+            # Solo se convierte a filas la página visible
+            page = self.visitor_manager.query(
+                **filters, order_by="-fecha_ingreso", limit=self.PAGE_SIZE, offset=self.pagination.offset
+            )
+            if not page.items and page.total and page.offset:
+                self.pagination.page = page.page_count - 1
+                page = self.visitor_manager.query(
+                    **filters, order_by="-fecha_ingreso", limit=self.PAGE_SIZE, offset=self.pagination.offset
+                )
+            self.pagination.update_from(page)
+            visitors_data = [self.visitor_manager.get_visitor_report_row(visitor) for visitor in page.items]
             
             # Configurar número de filas
             self.visitors_table.setRowCount(len(visitors_data))
@@ -1114,7 +1204,7 @@ class ReportesView(QWidget):
             self.visitors_table.setVisible(not no_rows)
 
             # Actualizar información del reporte
-            self.update_report_info(visitors_data)
+            self.update_report_info(page)
             
             # Actualizar estadísticas
             self.update_statistics()
@@ -1122,15 +1212,12 @@ class ReportesView(QWidget):
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Error al cargar datos: {str(e)}")
     
-    def update_report_info(self, visitors_data):
-        """Actualiza la información del reporte"""
-        total_visitors = len(visitors_data)
+    def update_report_info(self, page):
+        """Actualiza la información del reporte con los totales de todas las páginas"""
+        total_visitors = page.total
         
-        # Contar visitantes por destino
-        destinations = {}
-        for visitor in visitors_data:
-            dest = visitor['destino']
-            destinations[dest] = destinations.get(dest, 0) + 1
+        # Visitantes por destino
+        destinations = page.by_sector
         
         # Crear texto informativo
         info_text = f"📊 Total de visitantes actuales: {total_visitors}"
@@ -1140,15 +1227,27 @@ class ReportesView(QWidget):
         
         self.info_label.setText(info_text)
     
+    def _stats_since(self):
+        """Inicio del rango de los gráficos: medianoche de hace ``range_days`` días."""
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return (today - timedelta(days=self.range_days)).strftime("%Y-%m-%d %H:%M:%S")
+
     def update_statistics(self):
+        """Pide los datos de los gráficos; llegan con on_report_ready"""
+        # Solo el rango del gráfico; las particiones antiguas, el archivo y la
+        # agrupación por día se resuelven fuera del hilo de la interfaz
+        self.visitor_manager.request_report(since=self._stats_since())
+
+    def on_report_ready(self, since, all_visitors, counts_by_day):
         """Actualiza los gráficos con datos actuales"""
+        if since != self._stats_since():
+            # Respuesta a un rango anterior; el pedido vigente llega después
+            return
         try:
-            # Obtener todos los visitantes
-            all_visitors = self.visitor_manager.get_all_visitors()
             print(f"Debug: Encontrados {len(all_visitors)} visitantes")
             
             # Actualizar los gráficos
-            self.update_charts(all_visitors)
+            self.update_charts(all_visitors, counts_by_day)
 
             # Actualizar tarjetas de métricas
             stats = self.calculate_statistics(all_visitors)
@@ -1175,11 +1274,11 @@ class ReportesView(QWidget):
             import traceback
             traceback.print_exc()
     
-    def update_charts(self, visitors):
+    def update_charts(self, visitors, counts_by_day):
         """Actualiza los gráficos con datos actuales"""
         try:
             # Calcular datos para los gráficos
-            visitors_by_day = self.calculate_visitors_by_day(visitors)
+            visitors_by_day = self.calculate_visitors_by_day(counts_by_day)
             current_visitors, departed_visitors = self.calculate_visitor_status(visitors)
             popular_destinations = self.calculate_popular_destinations(visitors)
             
@@ -1212,26 +1311,17 @@ class ReportesView(QWidget):
         # Redibujar con el nuevo rango
         self.update_statistics()
     
-    def calculate_visitors_by_day(self, visitors):
-        """Calcula visitantes por día para el gráfico"""
+    def calculate_visitors_by_day(self, counts_by_day):
+        """Visitantes por día para el gráfico, a partir de ``count_visits_by_day``"""
         from datetime import datetime, timedelta
         
-        # Obtener los últimos 7 días
+        # Los días del rango, también los que no tuvieron visitas
         today = datetime.now().date()
         visitors_by_day = {}
         
-        for i in range(7):
+        for i in range(self.range_days):
             date = today - timedelta(days=i)
-            visitors_by_day[date] = 0
-        
-        # Contar visitantes por día
-        for visitor in visitors:
-            try:
-                visit_date = datetime.strptime(visitor.fecha_ingreso, "%Y-%m-%d %H:%M:%S").date()
-                if visit_date in visitors_by_day:
-                    visitors_by_day[visit_date] += 1
-            except:
-                continue
+            visitors_by_day[date] = counts_by_day.get(date.isoformat(), 0)
         
         # Ordenar por fecha
         sorted_dates = sorted(visitors_by_day.keys())
@@ -1261,12 +1351,8 @@ class ReportesView(QWidget):
         # Visitantes de hoy
         visitors_today = 0
         for visitor in visitors:
-            try:
-                visit_date = datetime.strptime(visitor.fecha_ingreso, "%Y-%m-%d %H:%M:%S").date()
-                if visit_date == today:
-                    visitors_today += 1
-            except:
-                continue
+            if visitor.entered_at is not None and visitor.entered_at.date() == today:
+                visitors_today += 1
         
         # Zonas activas (con visitantes actuales)
         active_zones = set()
@@ -1302,14 +1388,9 @@ class ReportesView(QWidget):
         completed_visits = []
         
         for visitor in visitors:
-            if visitor.fecha_salida:
-                try:
-                    entry_time = datetime.strptime(visitor.fecha_ingreso, "%Y-%m-%d %H:%M:%S")
-                    exit_time = datetime.strptime(visitor.fecha_salida, "%Y-%m-%d %H:%M:%S")
-                    duration = (exit_time - entry_time).total_seconds() / 60  # en minutos
-                    completed_visits.append(duration)
-                except:
-                    continue
+            duration = visitor.duration
+            if duration is not None:
+                completed_visits.append(duration.total_seconds() / 60)  # en minutos
         
         if completed_visits:
             avg_minutes = sum(completed_visits) / len(completed_visits)
@@ -1344,12 +1425,8 @@ class ReportesView(QWidget):
         
         visits_this_week = 0
         for visitor in visitors:
-            try:
-                visit_date = datetime.strptime(visitor.fecha_ingreso, "%Y-%m-%d %H:%M:%S").date()
-                if visit_date >= week_ago:
-                    visits_this_week += 1
-            except:
-                continue
+            if visitor.entered_at is not None and visitor.entered_at.date() >= week_ago:
+                visits_this_week += 1
         
         return visits_this_week
     
@@ -1358,14 +1435,9 @@ class ReportesView(QWidget):
         longest_duration = 0
         
         for visitor in visitors:
-            if visitor.fecha_salida:
-                try:
-                    entry_time = datetime.strptime(visitor.fecha_ingreso, "%Y-%m-%d %H:%M:%S")
-                    exit_time = datetime.strptime(visitor.fecha_salida, "%Y-%m-%d %H:%M:%S")
-                    duration = (exit_time - entry_time).total_seconds() / 60  # en minutos
-                    longest_duration = max(longest_duration, duration)
-                except:
-                    continue
+            duration = visitor.duration
+            if duration is not None:
+                longest_duration = max(longest_duration, duration.total_seconds() / 60)  # en minutos
         
         if longest_duration > 0:
             if longest_duration < 60:
@@ -1408,19 +1480,17 @@ class ReportesView(QWidget):
             return
         
         try:
-            # Recargar los datos desde el archivo JSON para obtener la información más actualizada
-            self.visitor_manager.load_visitors()
-            
-            # Determinar qué datos exportar según el filtro
+            # Determinar qué datos exportar según el filtro y el período
             filter_text = self.filter_combo.currentText()
+            since = self._period_since()
             if filter_text == "Solo visitantes actuales":
                 visitors_data = self.visitor_manager.get_visitor_report_data(include_departed=False)
             elif filter_text == "Solo visitantes que se fueron":
                 # Filtrar solo los que se fueron
-                all_data = self.visitor_manager.get_visitor_report_data(include_departed=True)
+                all_data = self.visitor_manager.get_visitor_report_data(include_departed=True, since=since)
                 visitors_data = [v for v in all_data if v['estado_visita'] == "Finalizada"]
             else:  # "Todos los visitantes"
-                visitors_data = self.visitor_manager.get_visitor_report_data(include_departed=True)
+                visitors_data = self.visitor_manager.get_visitor_report_data(include_departed=True, since=since)
             
             if not visitors_data:
                 QMessageBox.information(self, "Información", f"No hay visitantes para exportar con el filtro '{filter_text}'.")
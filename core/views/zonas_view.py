@@ -12,7 +12,7 @@ from PySide6.QtWidgets import (
     QComboBox,
     QProgressBar,
 )
-from PySide6.QtCore import Qt, QTimer
+from PySide6.QtCore import Qt
 from PySide6.QtGui import QFont, QGuiApplication
 from core.ui.icon_loader import get_icon_for_emoji
 import sys
@@ -80,7 +80,7 @@ class ZonasView(QWidget):
         self.zone_cards = {}
         self.progress_template = ""
         self.setup_ui()
-        self.setup_timer()
+        self.setup_live_updates()
 
     def setup_ui(self):
         scroll_area = QScrollArea()
@@ -607,17 +607,25 @@ class ZonasView(QWidget):
         b = max(0, int(b * (1 - factor)))
         return f"#{r:02x}{g:02x}{b:02x}"
 
-    def setup_timer(self):
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_zone_counts)
-        self.timer.start(5000)
+    def setup_live_updates(self):
+        # Las tarjetas se actualizan cuando cambia la ocupación, ya sea por esta
+        # estación o por la sincronización periódica de la ventana principal
+        # La señal llega en el hilo de la interfaz aunque el cambio venga de otro hilo
+        self.visitor_manager.signals.occupancy_changed.connect(self._on_occupancy_changed)
         self.update_zone_counts()
 
+    def _on_occupancy_changed(self, sectors):
+        self.refresh_zone_cards(sectors)
+
     def update_zone_counts(self):
-        # Forzar recarga de datos para asegurar que estén actualizados
-        self.visitor_manager.force_reload()
+        # Los cambios de otras estaciones llegan después con occupancy_changed
+        self.visitor_manager.sync_in_background()
+        self.refresh_zone_cards()
 
+    def refresh_zone_cards(self, sectors=None):
         for zone_name, info in self.zone_cards.items():
+            if sectors is not None and zone_name not in sectors:
+                continue
             # Obtener el número destacado y el label del contador
             count_number = info.get("count_number", None)
             count_label = info.get("count_label", None)
@@ -638,9 +646,8 @@ class ZonasView(QWidget):
                             if text_layout.count() > 1 and not count_label:
                                 count_label = text_layout.itemAt(1).widget()
             
-            current_visitors = self.visitor_manager.get_visitors_by_sector(zone_name)
-            current_count = len([v for v in current_visitors if v.estado == "Dentro"])
-            
+            current_count = self.visitor_manager.occupancy.inside(zone_name)
+
             if count_number:
                 count_number.setText(str(current_count))
             if count_label:
@@ -665,16 +672,33 @@ class ZonasView(QWidget):
         self.empty_state.setVisible(not any_visible)
 
     def manage_zone(self, zone_name):
-        current_visitors = self.visitor_manager.get_visitors_by_sector(zone_name)
-        current_count = len([v for v in current_visitors if v.estado == "Dentro"])
+        current_count = self.visitor_manager.occupancy.inside(zone_name)
+        if current_count == 0:
+            QMessageBox.information(
+                self,
+                f"Gestión de {zone_name}",
+                f"Zona: {zone_name}\n"
+                f"No hay visitantes dentro de la zona."
+            )
+            return
 
-        QMessageBox.information(
+        reply = QMessageBox.question(
             self,
             f"Gestión de {zone_name}",
             f"Zona: {zone_name}\n"
             f"Visitantes actuales: {current_count}\n\n"
-            f"Funcionalidad de gestión en desarrollo..."
+            f"¿Registrar la salida de todos los visitantes de la zona?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
         )
+        if reply == QMessageBox.Yes:
+            # Un solo guardado para toda la zona
+            count = self.visitor_manager.checkout_sector(zone_name)
+            QMessageBox.information(
+                self,
+                f"Gestión de {zone_name}",
+                f"Se registró la salida de {count} visitante(s) de {zone_name}."
+            )
 
     def go_to_visitors_with_filter(self, sector: str):
         # Navega a la vista de visitantes y aplica filtro por sector
@@ -433,8 +433,7 @@ class VisitorFormDialog(QDialog):
         # Verificar cupo máximo solo para nuevos visitantes
         if not self.is_edit_mode:
             selected_sector = self.sector_combo.currentText()
-            current_visitors = self.visitor_manager.get_visitors_by_sector(selected_sector)
-            current_count = len([v for v in current_visitors if v.estado == "Dentro"])
+            current_count = self.visitor_manager.occupancy.inside(selected_sector)
             
             if current_count >= 20:
                 reply = QMessageBox.question(
@@ -817,8 +816,7 @@ class QuickVisitorForm(QWidget):
     def validate_capacity(self) -> bool:
         """Valida si la zona seleccionada tiene cupo disponible"""
         selected_sector = self.sector_combo.currentText()
-        current_visitors = self.visitor_manager.get_visitors_by_sector(selected_sector)
-        current_count = len([v for v in current_visitors if v.estado == "Dentro"])
+        current_count = self.visitor_manager.occupancy.inside(selected_sector)
         
         if current_count >= 20:
             reply = QMessageBox.question(
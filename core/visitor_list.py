@@ -4,9 +4,10 @@ from PySide6.QtWidgets import (
     QMenu, QAbstractItemView, QFrame, QSplitter, QGroupBox,
     QDialog
 )
-from PySide6.QtCore import Qt, Signal, QTimer
+from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QFont, QAction, QIcon, QColor, QPixmap
 from core.ui.icon_loader import get_icon_for_emoji, get_pixmap_for_emoji
+from core.ui.pagination import PaginationBar
 try:
     from .theme import (
         DUOC_PRIMARY, DUOC_SECONDARY, DUOC_SUCCESS, DUOC_DANGER, DUOC_INFO,
@@ -83,6 +84,7 @@ except Exception:
         )
 from datetime import datetime
 from .visitors import VisitorManager
+from .visitors.search import matches_text
 from .visitor_form import VisitorFormDialog, QuickVisitorForm
 from .help_dialog import HelpDialog
 
@@ -91,6 +93,9 @@ class VisitorListWidget(QWidget):
     
     # Señales
     visitor_updated = Signal()
+
+    # Filas por página de la tabla
+    PAGE_SIZE = 100
     
     def __init__(self, parent=None, auth_manager=None):
         super().__init__(parent)
@@ -101,14 +106,12 @@ class VisitorListWidget(QWidget):
         # Configurar tamaño mínimo para mejor visualización de la tabla
         self.setMinimumSize(1200, 600)  # Ancho mínimo de 1200px para acomodar todas las columnas
         
+        # Ids de las filas mostradas, en el orden de la tabla
+        self._row_ids = []
+
         self.setup_ui()
         self.setup_connections()
         self.refresh_list()
-        
-        # Timer para actualizar la lista cada 30 segundos
-        self.refresh_timer = QTimer()
-        self.refresh_timer.timeout.connect(self.refresh_list)
-        self.refresh_timer.start(30000)  # 30 segundos
     
     def setup_ui(self):
         """Configura la interfaz de usuario"""
@@ -147,7 +150,7 @@ class VisitorListWidget(QWidget):
         self.subtitle_label.setStyleSheet("color: #64748b; font-size: 13px;")
         header_text_layout.addWidget(self.subtitle_label)
 
-        self.header_badge = QLabel("Actualización automática cada 30 segundos")
+        self.header_badge = QLabel("Actualización en tiempo real")
         self.header_badge.setAlignment(Qt.AlignLeft)
         self.header_badge.setStyleSheet(
             f"padding: 6px 14px; border-radius: 14px; font-size: 12px;"
@@ -333,6 +336,53 @@ class VisitorListWidget(QWidget):
         )
         actions_layout.addWidget(self.delete_btn)
 
+        self.checkout_btn = QPushButton("Marcar salida")
+        self.checkout_btn.setIcon(get_icon_for_emoji("🔴", 18))
+        self.checkout_btn.setEnabled(False)
+        self.checkout_btn.setCursor(Qt.PointingHandCursor)
+        self.checkout_btn.setMinimumHeight(46)
+        self.checkout_btn.setToolTip("Registrar la salida de todos los visitantes seleccionados")
+        self.checkout_btn.setStyleSheet(
+            f"""
+            QPushButton {{
+                background-color: {DUOC_SECONDARY};
+                color: #0f172a;
+                border-radius: 14px;
+                padding: 12px 22px;
+                font-weight: 600;
+            }}
+            QPushButton:hover {{
+                background-color: {duoc_darken(DUOC_SECONDARY, 0.1)};
+            }}
+            QPushButton:disabled {{
+                background-color: rgba(148, 163, 184, 0.25);
+                color: rgba(148, 163, 184, 0.9);
+            }}
+            """
+        )
+        actions_layout.addWidget(self.checkout_btn)
+
+        self.close_day_btn = QPushButton("Cerrar jornada")
+        self.close_day_btn.setIcon(get_icon_for_emoji("🌙", 18))
+        self.close_day_btn.setCursor(Qt.PointingHandCursor)
+        self.close_day_btn.setMinimumHeight(46)
+        self.close_day_btn.setToolTip("Registrar la salida de todos los visitantes que siguen dentro")
+        self.close_day_btn.setStyleSheet(
+            """
+            QPushButton {
+                background-color: #64748b;
+                color: #f8fafc;
+                border-radius: 14px;
+                padding: 12px 22px;
+                font-weight: 600;
+            }
+            QPushButton:hover {
+                background-color: #94a3b8;
+            }
+            """
+        )
+        actions_layout.addWidget(self.close_day_btn)
+
         actions_layout.addStretch()
         left_layout.addWidget(self.actions_card)
 
@@ -351,6 +401,8 @@ class VisitorListWidget(QWidget):
 
         configure_modern_table(self.visitor_table)
         apply_modern_table_theme(self.visitor_table)
+        # Selección múltiple para registrar salidas en lote
+        self.visitor_table.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.visitor_table.setContextMenuPolicy(Qt.CustomContextMenu)
 
         header = self.visitor_table.horizontalHeader()
@@ -367,6 +419,10 @@ class VisitorListWidget(QWidget):
 
         left_layout.addWidget(self.visitor_table)
 
+        self.pagination = PaginationBar(self.PAGE_SIZE)
+        self.pagination.setVisible(False)
+        left_layout.addWidget(self.pagination)
+
         self.empty_state = QLabel(
             "\nNo hay visitantes para mostrar.\n\nUsa \"Nuevo visitante\" o ajusta filtros/búsqueda."
         )
@@ -674,6 +730,8 @@ class VisitorListWidget(QWidget):
         self.add_btn.clicked.connect(self.add_visitor)
         self.edit_btn.clicked.connect(self.edit_visitor)
         self.delete_btn.clicked.connect(self.delete_visitor)
+        self.checkout_btn.clicked.connect(self.checkout_selected)
+        self.close_day_btn.clicked.connect(self.close_day)
         self.refresh_btn.clicked.connect(self.refresh_list)
         self.filter_combo.currentTextChanged.connect(self.apply_filter)
         self.search_input.textChanged.connect(self.apply_filter)
@@ -681,6 +739,15 @@ class VisitorListWidget(QWidget):
         self.visitor_table.itemSelectionChanged.connect(self.on_selection_changed)
         self.visitor_table.itemDoubleClicked.connect(self.toggle_visitor_status)
         self.visitor_table.customContextMenuRequested.connect(self.show_context_menu)
+        self.pagination.page_changed.connect(lambda _page: self.populate_table())
+
+        # Cambios hechos aquí, en otras vistas o traídos por la sincronización
+        signals = self.visitor_manager.signals
+        signals.visitor_added.connect(self.on_visitors_added)
+        signals.visitor_updated.connect(self.on_visitors_updated)
+        signals.visitor_removed.connect(self.on_visitors_removed)
+        signals.dataset_reloaded.connect(self.populate_table)
+        signals.history_progress.connect(self.on_history_progress)
     
     # === Métodos públicos para integración con otras vistas ===
     def set_zone_filter(self, sector: str):
@@ -705,7 +772,6 @@ class VisitorListWidget(QWidget):
         if dialog.exec() == QDialog.Accepted:
             visitor = dialog.get_visitor()
             if self.visitor_manager.add_visitor(visitor):
-                self.refresh_list()
                 QMessageBox.information(self, "Éxito", f"Visitante registrado en {sector}")
             else:
                 QMessageBox.warning(self, "Error", "Ya existe un visitante con ese RUT en el sistema")
@@ -716,7 +782,6 @@ class VisitorListWidget(QWidget):
         if dialog.exec() == QDialog.Accepted:
             visitor = dialog.get_visitor()
             if self.visitor_manager.add_visitor(visitor):
-                self.refresh_list()
                 QMessageBox.information(self, "Éxito", "Visitante registrado correctamente en el sistema")
             else:
                 QMessageBox.warning(self, "Error", "Ya existe un visitante con ese RUT en el sistema")
@@ -733,7 +798,9 @@ class VisitorListWidget(QWidget):
         if visitor:
             dialog = VisitorFormDialog(self, visitor, auth_manager=self.auth_manager)
             if dialog.exec() == QDialog.Accepted:
-                self.refresh_list()
+                # El diálogo edita el objeto en memoria: registrar el cambio y persistirlo
+                self.visitor_manager.mark_modified(visitor_id)
+                self.visitor_manager.request_save()
                 QMessageBox.information(self, "Éxito", "Información del visitante actualizada correctamente")
     
     def delete_visitor(self):
@@ -755,7 +822,6 @@ class VisitorListWidget(QWidget):
             
             if reply == QMessageBox.Yes:
                 if self.visitor_manager.delete_visitor(visitor_id):
-                    self.refresh_list()
                     QMessageBox.information(self, "✅ Éxito", "🗑️ Visitante eliminado correctamente del sistema")
                 else:
                     QMessageBox.critical(self, "❌ Error", "🚫 No se pudo eliminar el visitante del sistema")
@@ -776,8 +842,6 @@ class VisitorListWidget(QWidget):
             return
 
         if self.visitor_manager.toggle_visitor_status(visitor_id):
-            self.refresh_list()
-            
             visitor = self.visitor_manager.get_visitor_by_id(visitor_id)
             if visitor:
                 if visitor.estado == "Dentro":
@@ -792,6 +856,52 @@ class VisitorListWidget(QWidget):
                     f"{icon} <b>{visitor.nombre_completo}</b> {status_text} del establecimiento\n\n📍 Estado actual: <b>{visitor.estado}</b>"
                 )
     
+    def selected_open_visitor_ids(self):
+        """Ids de las filas seleccionadas cuya visita sigue abierta"""
+        rows = sorted({index.row() for index in self.visitor_table.selectionModel().selectedRows()})
+        visitor_ids = []
+        for row in rows:
+            if row >= len(self._row_ids):
+                continue
+            visitor = self.visitor_manager.get_visitor_by_id(self._row_ids[row])
+            if visitor and visitor.estado == "Dentro":
+                visitor_ids.append(visitor.id)
+        return visitor_ids
+
+    def checkout_selected(self):
+        """Registra en un solo guardado la salida de los visitantes seleccionados"""
+        visitor_ids = self.selected_open_visitor_ids()
+        if not visitor_ids:
+            return
+
+        reply = QMessageBox.question(
+            self, "Confirmar Salida",
+            f"¿Registrar la salida de {len(visitor_ids)} visitante(s) seleccionados?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            count = self.visitor_manager.checkout_many(visitor_ids)
+            QMessageBox.information(self, "🔄 Estado Actualizado", f"🔴 Se registró la salida de {count} visitante(s)")
+
+    def close_day(self):
+        """Cierre de jornada: registra la salida de todos los visitantes que siguen dentro"""
+        open_count = len(self.visitor_manager.get_current_visitors())
+        if open_count == 0:
+            QMessageBox.information(self, "Cerrar jornada", "No hay visitantes dentro del establecimiento")
+            return
+
+        reply = QMessageBox.question(
+            self, "Cerrar jornada",
+            f"Hay {open_count} visitante(s) dentro del establecimiento.\n\n"
+            f"¿Registrar la salida de todos ellos?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            count = self.visitor_manager.checkout_all_open(before=datetime.now())
+            QMessageBox.information(self, "🔄 Estado Actualizado", f"🔴 Se registró la salida de {count} visitante(s)")
+
     def show_context_menu(self, position):
         """Muestra el menú contextual"""
         if self.visitor_table.itemAt(position) is None:
@@ -808,6 +918,13 @@ class VisitorListWidget(QWidget):
             self.visitor_table.itemAt(position)
         ))
         menu.addAction(toggle_action)
+
+        selected_open = self.selected_open_visitor_ids()
+        if len(selected_open) > 1:
+            checkout_action = QAction(f"Marcar salida de {len(selected_open)} seleccionados", self)
+            checkout_action.setIcon(get_icon_for_emoji("🔴", 16))
+            checkout_action.triggered.connect(self.checkout_selected)
+            menu.addAction(checkout_action)
         
         edit_action = QAction("Editar Información", self)
         edit_action.setIcon(get_icon_for_emoji("✏️", 16))
@@ -830,10 +947,13 @@ class VisitorListWidget(QWidget):
         has_selection = self.visitor_table.currentRow() >= 0
         self.edit_btn.setEnabled(has_selection)
         self.delete_btn.setEnabled(has_selection)
+        self.checkout_btn.setEnabled(bool(self.selected_open_visitor_ids()))
     
     def apply_filter(self, filter_text):
         """Aplica filtros a la lista"""
-        self.refresh_list()
+        # Filtrar y buscar trabaja sobre los datos en memoria, sin consultar la base
+        self.pagination.reset()
+        self.populate_table()
     
     def show_help(self):
         """Muestra el diálogo de ayuda"""
@@ -855,99 +975,150 @@ class VisitorListWidget(QWidget):
     
     def refresh_list(self):
         """Actualiza la lista de visitantes"""
-        # Forzar recarga de datos para asegurar que estén actualizados
-        self.visitor_manager.force_reload()
-        visitors = self.visitor_manager.get_all_visitors()
-        
-        # Aplicar filtros
+        # Los cambios de otras estaciones llegan después con las señales
+        self.visitor_manager.sync_in_background()
+        self.populate_table()
+
+    def _query_filters(self):
+        """Criterios de VisitorManager.query según el filtro y la búsqueda actuales"""
+        filters = {}
         filter_text = self.filter_combo.currentText()
-        if filter_text != "Todos":
-            if filter_text in ["Dentro", "Fuera"]:
-                visitors = [v for v in visitors if v.estado == filter_text]
-            else:
-                visitors = [v for v in visitors if v.sector == filter_text]
+        if filter_text in ["Dentro", "Fuera"]:
+            filters["estado"] = filter_text
+        elif filter_text != "Todos":
+            filters["sector"] = filter_text
 
-        # Aplicar búsqueda
-        query = self.search_input.text().strip().lower() if hasattr(self, 'search_input') else ""
+        query = self.search_input.text().strip() if hasattr(self, 'search_input') else ""
         if query:
-            def match(v):
-                return any([
-                    query in (v.rut or '').lower(),
-                    query in (v.nombre_completo or '').lower(),
-                    query in (v.acompañante or '').lower(),
-                    query in (v.sector or '').lower(),
-                ])
-            visitors = [v for v in visitors if match(v)]
-        
-        # Ordenar por fecha de ingreso (más recientes primero)
-        visitors.sort(key=lambda x: x.fecha_ingreso, reverse=True)
+            filters["text"] = query
+        return filters
+
+    def _matches_filters(self, visitor) -> bool:
+        """Indica si el visitante pasa el filtro y la búsqueda actuales"""
+        filters = self._query_filters()
+        if "estado" in filters and visitor.estado != filters["estado"]:
+            return False
+        if "sector" in filters and visitor.sector != filters["sector"]:
+            return False
+        # Misma búsqueda que VisitorManager.query (sin tildes, RUT sin puntos)
+        return matches_text(visitor, filters.get("text", ""))
+
+    def populate_table(self):
+        """Rellena la tabla con la página actual de visitantes según filtros y búsqueda"""
+        filters = self._query_filters()
+        page = self.visitor_manager.query(
+            **filters, order_by="-fecha_ingreso", limit=self.PAGE_SIZE, offset=self.pagination.offset
+        )
+        if not page.items and page.total and page.offset:
+            # La página quedó fuera de rango (p. ej. tras eliminar): ir a la última
+            self.pagination.page = page.page_count - 1
+            page = self.visitor_manager.query(
+                **filters, order_by="-fecha_ingreso", limit=self.PAGE_SIZE, offset=self.pagination.offset
+            )
         
         # Actualizar tabla
-        self.visitor_table.setRowCount(len(visitors))
+        self.visitor_table.setRowCount(len(page.items))
+        self._row_ids = [visitor.id for visitor in page.items]
         
-        for row, visitor in enumerate(visitors):
-            # ID
-            self.visitor_table.setItem(row, 0, QTableWidgetItem(visitor.id))
-            
-            # RUT - mostrar normalizado
-            rut_display = format_rut_display(visitor.rut) if visitor.rut else "N/A"
-            self.visitor_table.setItem(row, 1, QTableWidgetItem(rut_display))
-            
-            # Nombre
-            self.visitor_table.setItem(row, 2, QTableWidgetItem(visitor.nombre_completo))
-            
-            # Acompañante
-            self.visitor_table.setItem(row, 3, QTableWidgetItem(visitor.acompañante))
-            
-            # Sector
-            self.visitor_table.setItem(row, 4, QTableWidgetItem(visitor.sector))
-            
-            # Estado
-            estado_item = QTableWidgetItem(visitor.estado)
-            if visitor.estado == "Dentro":
-                estado_item.setBackground(QColor(144, 238, 144))  # Verde claro
-            else:
-                estado_item.setBackground(QColor(255, 182, 193))  # Rosa claro
-            self.visitor_table.setItem(row, 5, estado_item)
-            
-            # Fecha de ingreso
-            fecha_formatted = datetime.strptime(visitor.fecha_ingreso, "%Y-%m-%d %H:%M:%S")
-            fecha_str = fecha_formatted.strftime("%d/%m/%Y %H:%M")
-            self.visitor_table.setItem(row, 6, QTableWidgetItem(fecha_str))
-            
-            # Usuario registrador
-            usuario_registrador = visitor.usuario_registrador or "Sistema"
-            self.visitor_table.setItem(row, 7, QTableWidgetItem(usuario_registrador))
+        for row, visitor in enumerate(page.items):
+            self._fill_row(row, visitor)
+        
+        self.pagination.update_from(page)
+        self._after_rows_changed(page)
+
+    def _fill_row(self, row, visitor):
+        # ID
+        self.visitor_table.setItem(row, 0, QTableWidgetItem(visitor.id))
+        
+        # RUT - mostrar normalizado
+        rut_display = format_rut_display(visitor.rut) if visitor.rut else "N/A"
+        self.visitor_table.setItem(row, 1, QTableWidgetItem(rut_display))
         
+        # Nombre
+        self.visitor_table.setItem(row, 2, QTableWidgetItem(visitor.nombre_completo))
+        
+        # Acompañante
+        self.visitor_table.setItem(row, 3, QTableWidgetItem(visitor.acompañante))
+        
+        # Sector
+        self.visitor_table.setItem(row, 4, QTableWidgetItem(visitor.sector))
+        
+        # Estado
+        estado_item = QTableWidgetItem(visitor.estado)
+        if visitor.estado == "Dentro":
+            estado_item.setBackground(QColor(144, 238, 144))  # Verde claro
+        else:
+            estado_item.setBackground(QColor(255, 182, 193))  # Rosa claro
+        self.visitor_table.setItem(row, 5, estado_item)
+        
+        # Fecha de ingreso
+        fecha_formatted = visitor.entered_at
+        fecha_str = fecha_formatted.strftime("%d/%m/%Y %H:%M") if fecha_formatted else visitor.fecha_ingreso
+        self.visitor_table.setItem(row, 6, QTableWidgetItem(fecha_str))
+        
+        # Usuario registrador
+        usuario_registrador = visitor.usuario_registrador or "Sistema"
+        self.visitor_table.setItem(row, 7, QTableWidgetItem(usuario_registrador))
+
+    def _after_rows_changed(self, page):
         # Mostrar/ocultar estado vacío
-        self.empty_state.setVisible(len(visitors) == 0)
+        self.empty_state.setVisible(len(self._row_ids) == 0)
+        self.on_selection_changed()
 
         # Actualizar estadísticas
         if self.stats_label:
-            self.update_stats(visitors)
+            self.update_stats(page)
+
+    # === Actualización por señales de VisitorManager ===
+    def on_visitors_added(self, visitor_ids):
+        # Las altas pueden desplazar la página: se vuelve a consultar solo la página actual
+        self.populate_table()
+
+    def on_visitors_updated(self, visitor_ids):
+        visitors = [self.visitor_manager.get_visitor_by_id(visitor_id) for visitor_id in visitor_ids]
+        if any(v is None or (v.id in self._row_ids) != self._matches_filters(v) for v in visitors):
+            # Alguna fila entra o sale de la página actual
+            self.populate_table()
+            return
+
+        for visitor in visitors:
+            if visitor.id in self._row_ids:
+                self._fill_row(self._row_ids.index(visitor.id), visitor)
+        page = self.visitor_manager.query(**self._query_filters(), limit=1)
+        self._after_rows_changed(page)
+
+    def on_visitors_removed(self, visitor_ids):
+        self.populate_table()
+
+    def on_history_progress(self, loaded, total):
+        # Llegan visitas anteriores del mes: cambian los totales y las últimas páginas
+        self.populate_table()
     
     def handle_quick_registration(self):
         """Maneja el registro rápido desde el formulario lateral"""
         if self.quick_form.register_visitor():
-            # Actualizar la lista después del registro exitoso
-            self.refresh_list()
+            # La fila nueva llega con la señal visitor_added
             QMessageBox.information(
                 self, 
                 "✅ Éxito", 
                 "🚀 Visitante registrado correctamente mediante registro rápido"
             )
     
-    def update_stats(self, visitors):
-        """Actualiza las estadísticas mostradas"""
+    def update_stats(self, page):
+        """Actualiza las estadísticas mostradas con los totales del filtro actual"""
         if not self.stats_label:
             return
 
-        total = len(visitors)
-        dentro = len([v for v in visitors if v.estado == "Dentro"])
+        total = page.total
+        dentro = page.by_estado.get("Dentro", 0)
         fuera = total - dentro
 
         dentro_icon = "🟢" if dentro > 0 else "⚪"
         fuera_icon = "🔴" if fuera > 0 else "⚪"
+        if self.visitor_manager.history_complete:
+            footer = "💡 Actualizado automáticamente"
+        else:
+            footer = "⏳ Cargando visitas anteriores del mes..."
 
         stats_text = f"""
         <div style="text-align: center;">
@@ -955,7 +1126,7 @@ class VisitorListWidget(QWidget):
         👥 <b>Total:</b> {total}<br>
         {dentro_icon} <b>Dentro:</b> {dentro}<br>
         {fuera_icon} <b>Fuera:</b> {fuera}<br><br>
-        <small>💡 Actualizado automáticamente</small>
+        <small>{footer}</small>
         </div>
         """
         self.stats_label.setText(stats_text)
@@ -1,5 +1,5 @@
+from .changes import VisitorChangeSet
 from .manager import VisitorManager
 from .models import Visitor
 
-__all__ = ["Visitor", "VisitorManager"]
-
+__all__ = ["Visitor", "VisitorChangeSet", "VisitorManager"]
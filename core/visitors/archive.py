@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import gzip
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List
+
+from . import codec
+from .models import Visitor
+from .partitions import partition_key
+from .storage import BaseVisitorStorage, MongoVisitorStorage, VisitorStorageError, migrate_date_fields
+
+RETENTION_ENV_VAR = "VISITASEGURA_RETENTION_DAYS"
+# Desactivado salvo que se configure: el archivado borra visitas de la
+# colección compartida, y las estaciones con versiones anteriores no las verían
+DEFAULT_RETENTION_DAYS = 0
+ARCHIVE_COLLECTION = "VisitantesArchivo"
+
+
+def retention_days() -> int:
+    """
+    Antigüedad (días) a partir de la cual se archivan las visitas finalizadas,
+    según ``VISITASEGURA_RETENTION_DAYS`` (p. ej. 180); 0 o sin definir lo desactiva.
+    """
+    try:
+        return int(os.environ.get(RETENTION_ENV_VAR, DEFAULT_RETENTION_DAYS))
+    except ValueError:
+        return DEFAULT_RETENTION_DAYS
+
+
+class BaseVisitorArchive(ABC):
+    """
+    Almacén de visitas finalizadas retiradas del almacenamiento principal,
+    organizado por mes de ingreso. Agregar una visita ya archivada no la duplica
+    al leer.
+    """
+
+    @abstractmethod
+    def append(self, visitors: Iterable[Visitor]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def months(self) -> List[str]:
+        """Claves de mes ("YYYY-MM") con visitas archivadas."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_month(self, key: str) -> List[Visitor]:
+        raise NotImplementedError
+
+
+class GzipVisitorArchive(BaseVisitorArchive):
+    """Un archivo NDJSON comprimido por mes: ``visitas_YYYY-MM.ndjson.gz``."""
+
+    _FILENAME = re.compile(r"^visitas_(\d{4}-\d{2})\.ndjson\.gz$")
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"visitas_{key}.ndjson.gz")
+
+    def append(self, visitors: Iterable[Visitor]) -> None:
+        by_month: Dict[str, List[str]] = {}
+        for visitor in visitors:
+            line = codec.dumps(codec.encode_visitor(visitor))
+            by_month.setdefault(partition_key(visitor.fecha_ingreso), []).append(line)
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for key, lines in by_month.items():
+                # Cada lote es un miembro gzip nuevo; gzip lee los miembros concatenados
+                with gzip.open(self._path(key), "at", encoding="utf-8") as handle:
+                    handle.write("\n".join(lines) + "\n")
+        except OSError as exc:
+            raise VisitorStorageError(f"Error al escribir el archivo histórico: {exc}") from exc
+
+    def months(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        keys = []
+        for name in os.listdir(self.directory):
+            match = self._FILENAME.match(name)
+            if match:
+                keys.append(match.group(1))
+        return sorted(keys)
+
+    def read_month(self, key: str) -> List[Visitor]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return []
+
+        documents: Dict[str, Dict] = {}
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as handle:
+                for line in handle:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        document = codec.loads(line)
+                    except codec.JSONDecodeError:
+                        continue
+                    documents[document["id"]] = document
+        except (OSError, EOFError) as exc:
+            # Un miembro final truncado no invalida los anteriores ya leídos
+            print(f"Archivo histórico {path} incompleto: {exc}")
+        return codec.decode_visitors(documents.values())
+
+
+class MongoVisitorArchive(BaseVisitorArchive):
+    """Colección de archivo en MongoDB, compartida por todas las estaciones."""
+
+    def __init__(self, collection):
+        from pymongo import UpdateOne
+
+        self.collection = collection
+        self._update_op = UpdateOne
+
+    def append(self, visitors: Iterable[Visitor]) -> None:
+        operations = [
+            self._update_op(
+                {"id": visitor.id},
+                {"$set": dict(codec.encode_mongo_visitor(visitor), periodo=partition_key(visitor.fecha_ingreso))},
+                upsert=True,
+            )
+            for visitor in visitors
+        ]
+        if not operations:
+            return
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+        except Exception as exc:
+            raise VisitorStorageError(f"Error al archivar visitas en MongoDB: {exc}") from exc
+
+    def months(self) -> List[str]:
+        try:
+            return sorted(key for key in self.collection.distinct("periodo") if key)
+        except Exception as exc:
+            raise VisitorStorageError(f"Error al leer el archivo histórico de MongoDB: {exc}") from exc
+
+    def migrate_dates(self) -> int:
+        """Convierte a fechas nativas lo archivado cuando se guardaban como texto."""
+        return migrate_date_fields(self.collection)
+
+    def read_month(self, key: str) -> List[Visitor]:
+        try:
+            documents = list(self.collection.find({"periodo": key}, {"_id": 0, "periodo": 0}))
+        except Exception as exc:
+            raise VisitorStorageError(f"Error al leer el archivo histórico de MongoDB: {exc}") from exc
+        return codec.decode_mongo_visitors(documents)
+
+
+def create_archive(storage: BaseVisitorStorage, directory: str) -> BaseVisitorArchive:
+    """Archivo en MongoDB si el almacenamiento principal es MongoDB; si no, gzip local."""
+    if isinstance(storage, MongoVisitorStorage):
+        return MongoVisitorArchive(storage.collection.database[ARCHIVE_COLLECTION])
+    return GzipVisitorArchive(directory)
+
+
+class ArchiveScheduler(threading.Thread):
+    """Ejecuta ``job`` al poco de iniciar y luego una vez cada ``interval`` segundos."""
+
+    def __init__(self, job: Callable[[], int], interval: float = 24 * 3600, initial_delay: float = 60.0):
+        super().__init__(name="visitor-archive-scheduler", daemon=True)
+        self.job = job
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        delay = self.initial_delay
+        while not self._stop_event.wait(delay):
+            try:
+                self.job()
+            except Exception as exc:
+                print(f"Error en el archivado de visitas: {exc}")
+            delay = self.interval
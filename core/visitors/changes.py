@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Set
+
+from .models import Visitor
+
+
+class VisitorChangeSet:
+    """
+    Conjunto de visitantes creados, modificados y eliminados desde el último
+    guardado. Permite que cada almacenamiento persista solo lo que cambió.
+    """
+
+    def __init__(self):
+        self.created: Dict[str, Visitor] = {}
+        self.modified: Dict[str, Visitor] = {}
+        self.removed: Set[str] = set()
+        # Versión leída de las visitas eliminadas: el borrado se condiciona a
+        # ella para no descartar un cambio posterior de otra estación
+        self.removed_versions: Dict[str, int] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.created or self.modified or self.removed)
+
+    def __len__(self) -> int:
+        return len(self.created) + len(self.modified) + len(self.removed)
+
+    # ------------------------------------------------------------------
+    # Registro de cambios
+    # ------------------------------------------------------------------
+
+    def record_created(self, visitor: Visitor) -> None:
+        if visitor.id in self.removed:
+            # Reaparece un id eliminado en este mismo lote: equivale a modificarlo
+            self.removed.discard(visitor.id)
+            self.removed_versions.pop(visitor.id, None)
+            self.modified[visitor.id] = visitor
+            return
+        self.created[visitor.id] = visitor
+
+    def record_modified(self, visitor: Visitor) -> None:
+        if visitor.id in self.created:
+            self.created[visitor.id] = visitor
+            return
+        self.modified[visitor.id] = visitor
+
+    def record_removed(self, visitor_id: str, version: Optional[int] = None) -> None:
+        if self.created.pop(visitor_id, None) is not None:
+            # Nunca llegó al almacenamiento: basta con olvidarlo
+            return
+        self.modified.pop(visitor_id, None)
+        self.removed.add(visitor_id)
+        if version is not None:
+            self.removed_versions[visitor_id] = version
+
+    def forget(self, visitor_id: str) -> None:
+        """Descarta cualquier cambio registrado sobre ``visitor_id``."""
+        self.created.pop(visitor_id, None)
+        self.modified.pop(visitor_id, None)
+        self.removed.discard(visitor_id)
+        self.removed_versions.pop(visitor_id, None)
+
+    def merge(self, newer: "VisitorChangeSet") -> None:
+        """Aplica encima los cambios de ``newer``, que son posteriores a estos."""
+        for visitor in newer.created.values():
+            self.record_created(visitor)
+        for visitor in newer.modified.values():
+            self.record_modified(visitor)
+        for visitor_id in newer.removed:
+            self.record_removed(visitor_id, newer.removed_versions.get(visitor_id))
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    @property
+    def upserts(self) -> List[Visitor]:
+        return list(self.created.values()) + list(self.modified.values())
+
+    @property
+    def ids(self) -> List[str]:
+        return list(self.created) + list(self.modified) + list(self.removed)
+
+    def copy(self) -> "VisitorChangeSet":
+        clone = VisitorChangeSet()
+        clone.created = dict(self.created)
+        clone.modified = dict(self.modified)
+        clone.removed = set(self.removed)
+        clone.removed_versions = dict(self.removed_versions)
+        return clone
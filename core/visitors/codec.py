@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from .models import Visitor, _intern, parse_timestamp
+from .partitions import DATE_FORMAT
+
+try:
+    import orjson
+except ImportError:
+    # Opcional: sin orjson se usa el módulo json estándar, con el mismo resultado
+    orjson = None
+
+# Conversión entre ``Visitor`` y documentos (diccionarios) o texto JSON, por
+# lotes. La usan todos los almacenamientos para que leer miles de visitas no
+# pase por ``Visitor.__init__`` (que genera un id y una fecha de ingreso solo
+# para descartarlos).
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+# orjson.JSONDecodeError hereda de esta, así que sirve para ambos
+JSONDecodeError = json.JSONDecodeError
+
+
+def decode_visitor(document: Dict[str, Any]) -> Visitor:
+    """Documento -> ``Visitor`` sin pasar por el constructor."""
+    if "id" not in document or "fecha_ingreso" not in document:
+        # Documentos antiguos incompletos: el constructor pone los valores por defecto
+        return _decode_with_defaults(document)
+
+    visitor = Visitor.__new__(Visitor)
+    visitor.id = document["id"]
+    visitor.rut = document["rut"]
+    visitor.nombre_completo = document["nombre_completo"]
+    visitor.fecha_ingreso = document["fecha_ingreso"]
+    visitor.fecha_salida = document.get("fecha_salida")
+    visitor.acompañante = _intern(document["acompañante"])
+    visitor.sector = _intern(document["sector"])
+    visitor.estado = _intern(document.get("estado", "Dentro"))
+    visitor.usuario_registrador = _intern(document.get("usuario_registrador"))
+    visitor.version = document.get("version") or 0
+    visitor._entered_cache = None
+    visitor._exited_cache = None
+    return visitor
+
+
+def _decode_with_defaults(document: Dict[str, Any]) -> Visitor:
+    visitor = Visitor(
+        rut=document["rut"],
+        nombre_completo=document["nombre_completo"],
+        acompañante=document["acompañante"],
+        sector=document["sector"],
+        estado=document.get("estado", "Dentro"),
+        usuario_registrador=document.get("usuario_registrador"),
+    )
+    visitor.id = document.get("id", visitor.id)
+    visitor.fecha_ingreso = document.get("fecha_ingreso", visitor.fecha_ingreso)
+    visitor.fecha_salida = document.get("fecha_salida")
+    visitor.version = document.get("version") or 0
+    return visitor
+
+
+def decode_visitors(documents: Iterable[Dict[str, Any]]) -> List[Visitor]:
+    return [decode_visitor(document) for document in documents]
+
+
+def encode_visitor(visitor: Visitor) -> Dict[str, Any]:
+    return {
+        "id": visitor.id,
+        "rut": visitor.rut,
+        "nombre_completo": visitor.nombre_completo,
+        "fecha_ingreso": visitor.fecha_ingreso,
+        "fecha_salida": visitor.fecha_salida,
+        "acompañante": visitor.acompañante,
+        "sector": visitor.sector,
+        "estado": visitor.estado,
+        "usuario_registrador": visitor.usuario_registrador,
+        "version": visitor.version,
+    }
+
+
+def encode_visitors(visitors: Iterable[Visitor]) -> List[Dict[str, Any]]:
+    return [encode_visitor(visitor) for visitor in visitors]
+
+
+# ---------------------------------------------------------------------------
+# MongoDB
+# ---------------------------------------------------------------------------
+
+# En MongoDB las fechas se guardan como fechas nativas (UTC), para que los
+# rangos y las agrupaciones por día se resuelvan en el servidor con el índice.
+# En memoria y en los almacenamientos locales siguen siendo texto en hora
+# local; la conversión ocurre solo al entrar y salir de MongoDB.
+DATE_FIELDS = ("fecha_ingreso", "fecha_salida")
+
+
+def to_datetime(value: Any) -> Any:
+    """"2025-01-31 08:15:00" (hora local) -> ``datetime`` UTC; otros valores sin cambios."""
+    if not isinstance(value, str):
+        return value
+    parsed = parse_timestamp(value)
+    if parsed is None:
+        return value
+    # pymongo entrega las fechas sin zona horaria y en UTC; se guardan igual
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def from_datetime(value: Any) -> Any:
+    """Inversa de ``to_datetime``; el texto de documentos sin migrar pasa tal cual."""
+    if not isinstance(value, datetime):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone().strftime(DATE_FORMAT)
+
+
+def encode_mongo_visitor(visitor: Visitor) -> Dict[str, Any]:
+    document = encode_visitor(visitor)
+    for field in DATE_FIELDS:
+        document[field] = to_datetime(document[field])
+    return document
+
+
+def decode_mongo_visitor(document: Dict[str, Any]) -> Visitor:
+    for field in DATE_FIELDS:
+        value = document.get(field)
+        if isinstance(value, datetime):
+            document[field] = from_datetime(value)
+    return decode_visitor(document)
+
+
+def decode_mongo_visitors(documents: Iterable[Dict[str, Any]]) -> List[Visitor]:
+    return [decode_mongo_visitor(document) for document in documents]
+
+
+def mongo_filter(filter: Optional[Dict[str, Any]], legacy: bool = False) -> Dict[str, Any]:
+    """
+    Traduce un filtro de ``core.visitors.query`` (fechas como texto) a uno
+    para MongoDB con fechas nativas. Con ``legacy`` cada condición de fecha
+    acepta también la forma de texto, para documentos aún sin migrar.
+    """
+    if not filter:
+        return {}
+    translated: Dict[str, Any] = {}
+    legacy_clauses: List[Dict[str, Any]] = []
+    for key, condition in filter.items():
+        if key in ("$or", "$and", "$nor"):
+            translated[key] = [mongo_filter(sub, legacy) for sub in condition]
+        elif key in DATE_FIELDS:
+            native = _date_condition(condition)
+            if legacy and native != condition:
+                legacy_clauses.append(_either(key, native, condition))
+            else:
+                translated[key] = native
+        else:
+            translated[key] = condition
+    if not legacy_clauses:
+        return translated
+    if translated:
+        legacy_clauses.insert(0, translated)
+    return legacy_clauses[0] if len(legacy_clauses) == 1 else {"$and": legacy_clauses}
+
+
+def _date_condition(condition: Any) -> Any:
+    if not isinstance(condition, dict):
+        return to_datetime(condition)
+    converted = {}
+    for operator, operand in condition.items():
+        if operator in ("$in", "$nin"):
+            converted[operator] = [to_datetime(value) for value in operand]
+        else:
+            converted[operator] = to_datetime(operand)
+    return converted
+
+
+def _either(field: str, native: Any, text: Any) -> Dict[str, Any]:
+    negative = isinstance(text, dict) and any(operator in ("$ne", "$nin") for operator in text)
+    # Una negación debe cumplirse en ambas formas; el resto, en cualquiera
+    return {"$and" if negative else "$or": [{field: native}, {field: text}]}
+
+
+# ---------------------------------------------------------------------------
+# JSON
+# ---------------------------------------------------------------------------
+
+
+def dumps(payload: Any, indent: bool = False) -> str:
+    """JSON sin escapar tildes; ``indent`` lo deja legible (dos espacios)."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+    if indent:
+        return json.dumps(payload, indent=2, ensure_ascii=False)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+def loads(text: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
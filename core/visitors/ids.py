@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import secrets
+import socket
+import threading
+import time
+from typing import Optional
+
+# Ids de visita ordenables por tiempo, al estilo ULID:
+#
+#   VIS 20250131081500123456 7K2Q X4
+#       |                    |    +-- proceso (aleatorio al iniciar)
+#       |                    +------- estación
+#       +---------------------------- instante de creación, UTC (µs)
+#
+# El prefijo de tiempo conserva el formato de los ids anteriores
+# ("VIS%Y%m%d%H%M%S%f", que usaban la hora local): con husos al oeste de UTC,
+# como el de Chile, los nuevos se ordenan después de ellos y el índice de
+# ``id`` sirve también como índice temporal. En UTC el orden no se altera con
+# los cambios de horario. Dentro de un proceso los ids son estrictamente
+# crecientes: si el reloj no avanzó (o retrocedió) desde el último, se usa el
+# microsegundo siguiente. Estación y proceso evitan choques entre equipos y
+# entre instancias del mismo equipo.
+
+STATION_ENV_VAR = "VISITASEGURA_STATION_ID"
+
+ID_PREFIX = "VIS"
+STATION_LENGTH = 4
+
+# Base32 de Crockford: sin I, L, O ni U, y en orden ASCII
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+_lock = threading.Lock()
+_last_micros = 0
+# Segundo del último id y su texto; en altas masivas se repite mucho
+_last_second = -1
+_last_stamp = ""
+_station: Optional[str] = None
+_process = "".join(secrets.choice(_ALPHABET) for _ in range(2))
+
+
+def _base32(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, 32)
+        chars.append(_ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def station_id() -> str:
+    """
+    Identificador de esta estación en los ids: ``VISITASEGURA_STATION_ID`` si
+    está definida o, si no, derivado del nombre del equipo.
+    """
+    global _station
+    if _station is None:
+        configured = "".join(char for char in os.environ.get(STATION_ENV_VAR, "").upper() if char in _ALPHABET)
+        if configured:
+            _station = configured[:STATION_LENGTH].rjust(STATION_LENGTH, "0")
+        else:
+            digest = hashlib.sha1(socket.gethostname().encode("utf-8")).digest()
+            _station = _base32(int.from_bytes(digest[:4], "big"), STATION_LENGTH)
+    return _station
+
+
+def new_visitor_id() -> str:
+    global _last_micros, _last_second, _last_stamp
+    with _lock:
+        micros = time.time_ns() // 1000
+        if micros <= _last_micros:
+            micros = _last_micros + 1
+        _last_micros = micros
+        seconds, fraction = divmod(micros, 1_000_000)
+        if seconds != _last_second:
+            _last_second = seconds
+            _last_stamp = time.strftime("%Y%m%d%H%M%S", time.gmtime(seconds))
+        stamp = _last_stamp
+    return f"{ID_PREFIX}{stamp}{fraction:06d}{station_id()}{_process}"
+
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .models import Visitor
+
+
+class VisitorIndex:
+    """
+    Índices en memoria sobre los visitantes cargados: por ``id``, visitas
+    abiertas por RUT y visitas abiertas por sector.
+
+    Como los formularios editan los objetos ``Visitor`` directamente, se
+    recuerda con qué RUT y sector se indexó cada visita abierta para poder
+    retirarla aunque esos campos ya hayan cambiado.
+    """
+
+    def __init__(self):
+        self.by_id: Dict[str, Visitor] = {}
+        # Diccionarios como conjuntos ordenados por inserción
+        self.open: Dict[str, Visitor] = {}
+        self.open_by_rut: Dict[str, Dict[str, Visitor]] = {}
+        self.open_by_sector: Dict[str, Dict[str, Visitor]] = {}
+        self._open_keys: Dict[str, Tuple[str, str]] = {}
+
+    def rebuild(self, visitors: Iterable[Visitor]) -> None:
+        self.by_id.clear()
+        self.open.clear()
+        self.open_by_rut.clear()
+        self.open_by_sector.clear()
+        self._open_keys.clear()
+        for visitor in visitors:
+            self.add(visitor)
+
+    def add(self, visitor: Visitor) -> None:
+        self.by_id[visitor.id] = visitor
+        if visitor.estado == "Dentro":
+            self.open[visitor.id] = visitor
+            self.open_by_rut.setdefault(visitor.rut, {})[visitor.id] = visitor
+            self.open_by_sector.setdefault(visitor.sector, {})[visitor.id] = visitor
+            self._open_keys[visitor.id] = (visitor.rut, visitor.sector)
+
+    def remove(self, visitor_id: str) -> None:
+        self.by_id.pop(visitor_id, None)
+        self._remove_open(visitor_id)
+
+    def refresh(self, visitor: Visitor) -> None:
+        """Reindexa una visita cuyo estado, RUT o sector pudo cambiar."""
+        self._remove_open(visitor.id)
+        self.add(visitor)
+
+    def _remove_open(self, visitor_id: str) -> None:
+        self.open.pop(visitor_id, None)
+        keys = self._open_keys.pop(visitor_id, None)
+        if keys is None:
+            return
+        rut, sector = keys
+        for mapping, key in ((self.open_by_rut, rut), (self.open_by_sector, sector)):
+            bucket = mapping.get(key)
+            if bucket is not None:
+                bucket.pop(visitor_id, None)
+                if not bucket:
+                    del mapping[key]
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def get(self, visitor_id: str) -> Optional[Visitor]:
+        return self.by_id.get(visitor_id)
+
+    def has_open_visit(self, rut: str) -> bool:
+        return rut in self.open_by_rut
+
+    def open_visit_for(self, rut: str) -> Optional[Visitor]:
+        bucket = self.open_by_rut.get(rut)
+        return next(iter(bucket.values())) if bucket else None
+
+    def open_in_sector(self, sector: str) -> List[Visitor]:
+        return list(self.open_by_sector.get(sector, {}).values())
+
+    def open_count(self, sector: str) -> int:
+        return len(self.open_by_sector.get(sector, ()))
+
+
+def _timeline_key(visitor: Visitor) -> Tuple[str, str]:
+    return (visitor.fecha_ingreso or "", visitor.id)
+
+
+class VisitorTimeline:
+    """
+    Visitantes cargados ordenados por ``fecha_ingreso`` (el ``id`` desempata).
+
+    Las altas se insertan con ``bisect`` en su posición, casi siempre al
+    final; así "las N más recientes" o un rango de fechas se obtienen en
+    O(log n + k) sin volver a ordenar la lista. Igual que ``VisitorIndex``,
+    se recuerda la clave con que se insertó cada visita para encontrarla
+    aunque el formulario ya haya cambiado su fecha de ingreso.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[str, str]] = []
+        self._visitors: List[Visitor] = []
+        self._key_of: Dict[str, Tuple[str, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._visitors)
+
+    def rebuild(self, visitors: Iterable[Visitor]) -> None:
+        self._visitors = sorted(visitors, key=_timeline_key)
+        self._keys = [_timeline_key(visitor) for visitor in self._visitors]
+        self._key_of = {key[1]: key for key in self._keys}
+
+    def add(self, visitor: Visitor) -> None:
+        if visitor.id in self._key_of:
+            self.remove(visitor.id)
+        key = _timeline_key(visitor)
+        position = bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._visitors.insert(position, visitor)
+        self._key_of[visitor.id] = key
+
+    def extend(self, visitors: Iterable[Visitor]) -> None:
+        """Agrega varias visitas nuevas de una vez; conviene cuando caen en medio del orden."""
+        visitors = [visitor for visitor in visitors if visitor.id not in self._key_of]
+        if not visitors:
+            return
+        keys = [_timeline_key(visitor) for visitor in visitors]
+        # Dos tramos ordenados: timsort los mezcla en tiempo lineal
+        pairs = sorted(zip(self._keys + keys, self._visitors + visitors), key=itemgetter(0))
+        self._keys = [key for key, _ in pairs]
+        self._visitors = [visitor for _, visitor in pairs]
+        self._key_of.update((key[1], key) for key in keys)
+
+    def remove(self, visitor_id: str) -> None:
+        key = self._key_of.pop(visitor_id, None)
+        if key is None:
+            return
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+            del self._visitors[position]
+
+    def refresh(self, visitor: Visitor) -> None:
+        """Reubica una visita cuya fecha de ingreso pudo cambiar."""
+        if self._key_of.get(visitor.id) != _timeline_key(visitor):
+            self.add(visitor)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def _bounds(self, since: Optional[str], until: Optional[str]) -> Tuple[int, int]:
+        # (fecha,) queda antes que cualquier (fecha, id): rango semiabierto
+        start = 0 if since is None else bisect_left(self._keys, (since,))
+        end = len(self._keys) if until is None else bisect_left(self._keys, (until,))
+        return start, max(start, end)
+
+    def count(self, since: Optional[str] = None, until: Optional[str] = None) -> int:
+        start, end = self._bounds(since, until)
+        return end - start
+
+    def between(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        newest_first: bool = False,
+    ) -> List[Visitor]:
+        """Visitas con ``since <= fecha_ingreso < until``, en orden de ingreso."""
+        start, end = self._bounds(since, until)
+        visitors = self._visitors[start:end]
+        if newest_first:
+            visitors.reverse()
+        return visitors
+
+    def slice(
+        self,
+        offset: int = 0,
+        limit: int = 0,
+        newest_first: bool = True,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[Visitor]:
+        """Una página del rango sin copiar el resto (``limit`` 0: hasta el final)."""
+        start, end = self._bounds(since, until)
+        if newest_first:
+            last = end - offset
+            first = max(start, last - limit) if limit else start
+            return self._visitors[first:max(first, last)][::-1]
+        first = start + offset
+        last = min(end, first + limit) if limit else end
+        return self._visitors[first:max(first, last)]
+
+    def latest(self, count: int) -> List[Visitor]:
+        """Las ``count`` visitas con ingreso más reciente, de la más nueva a la más antigua."""
+        return self.slice(limit=count) if count > 0 else []
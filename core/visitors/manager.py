@@ -1,16 +1,62 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+import atexit
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
 
+from .archive import ArchiveScheduler, BaseVisitorArchive, MongoVisitorArchive, create_archive, retention_days
+from .changes import VisitorChangeSet
+from .indexes import VisitorIndex, VisitorTimeline
 from .models import Visitor
+from .occupancy import OccupancyRegistry
+from .search import VisitorSearchIndex, matches_text
+from .signals import VisitorSignals
+from .snapshot import VisitorSnapshot, snapshot_path_for
+from .partitions import (
+    DATE_FORMAT,
+    current_partition_start,
+    next_partition,
+    partition_key,
+    partition_start,
+    partitions_between,
+    to_timestamp,
+)
+from .outbox import OutboxReplayer, VisitorOutbox, outbox_path_for, remote_sync_enabled
+from .query import (
+    DESCENDING,
+    OrderBy,
+    Projection,
+    SortSpec,
+    UnsupportedQueryError,
+    VisitorFilter,
+    VisitorPage,
+    parse_order_by,
+    project,
+    run_query,
+    sort_visitors,
+)
+from .writer import PersistenceWorker
 from .storage import (
     BaseVisitorStorage,
-    JsonVisitorStorage,
+    MongoVisitorStorage,
+    VisitorConflictError,
     VisitorStorageError,
     create_default_storage,
+    create_local_storage,
 )
 
 
+# Carga escalonada: lo que se lee antes de mostrar la ventana y el tamaño de
+# las páginas con que se trae el resto del mes en segundo plano
+RECENT_HOURS = 24
+HISTORY_PAGE_SIZE = 1000
+# Visitas que el índice de búsqueda procesa cada vez que toma el candado
+SEARCH_INDEX_BATCH = 2000
+
+
 class VisitorManager:
     """
     Gestiona la lista de visitantes utilizando el almacenamiento disponible.
@@ -32,145 +78,1222 @@ class VisitorManager:
 
         self.data_file = data_file
         self.visitors: List[Visitor] = []
-        self.storage: BaseVisitorStorage = create_default_storage(self.data_file)
+        self._index = VisitorIndex()
+        # Visitas ordenadas por fecha de ingreso, para listados sin reordenar
+        self._timeline = VisitorTimeline()
+        self._search = VisitorSearchIndex()
+        self._search_indexing = False
+        # Ocupación por sector; sus cambios llegan a las vistas con la señal
+        # occupancy_changed, que los entrega en el hilo de la interfaz aunque
+        # ocurran al sincronizar o guardar en segundo plano
+        self.occupancy = OccupancyRegistry()
+        # Señales para que las vistas actualicen solo lo afectado
+        self.signals = VisitorSignals()
+        self.occupancy.subscribe(self._on_occupancy_changed)
+        self._pending = VisitorChangeSet()
+        # Cambios que el hilo de escritura está enviando en este momento
+        self._in_flight = VisitorChangeSet()
+        # _lock protege la lista en memoria y se suelta rápido; _write_lock
+        # serializa las escrituras y puede esperar a la red
+        self._lock = threading.RLock()
+        self._write_lock = threading.RLock()
+        self._outbox = VisitorOutbox(outbox_path_for(self.data_file))
+        # Copia local de lo leído de MongoDB, para arrancar sin esperar a la red
+        self._snapshot = VisitorSnapshot(snapshot_path_for(self.data_file))
+        # Una sola sincronización a la vez (temporizador y puesta al día inicial)
+        self._sync_lock = threading.Lock()
+        # Rango del último reporte pedido mientras se calcula otro; None = sin cálculo en curso
+        self._report_lock = threading.Lock()
+        self._report_request: Tuple[Optional[str], Optional[str]] | None = None
+        self._replayer: OutboxReplayer | None = None
+        self._remote_watermark = None
+        # Límite inferior de la partición caliente; None = historial completo en memoria
+        self._hot_since: str | None = None
+        # Particiones frías (mes -> visitas finalizadas) cargadas bajo demanda
+        self._cold: Dict[str, List[Visitor]] = {}
+        self._cold_complete = False
+        # Carga en segundo plano del resto de la partición caliente; la
+        # generación descarta páginas de una carga ya reemplazada
+        self._load_generation = 0
+        self._history_loading = False
+        self._history_complete = False
+        # Visitas archivadas por mes, leídas bajo demanda por los reportes
+        self._archive: BaseVisitorArchive | None = None
+        self._archive_storage: BaseVisitorStorage | None = None
+        self._archive_months: List[str] | None = None
+        self._archived: Dict[str, List[Visitor]] = {}
+        self._archive_scheduler: ArchiveScheduler | None = None
         self._initialized = True
 
-        self.load_visitors()
+        # Con una copia local de MongoDB se arranca desde el disco, sin esperar
+        # a la red: la conexión (ping e índices), el envío de la cola offline y
+        # la sincronización desde la marca de agua se hacen en segundo plano,
+        # como al reconectar después de trabajar sin conexión
+        cached = self._snapshot.load() if remote_sync_enabled() else None
+        if cached is not None:
+            self.storage: BaseVisitorStorage = create_local_storage(self.data_file)
+        else:
+            self.storage = create_default_storage(self.data_file)
+            if not self.storage.is_local and self._outbox:
+                # Cambios de una sesión anterior sin conexión: enviarlos antes de cargar
+                try:
+                    self._outbox.drain(self.storage)
+                except VisitorStorageError as exc:
+                    print(f"No se pudieron enviar los cambios pendientes: {exc}")
+                    self._switch_to_local_storage()
+
+        self._writer = PersistenceWorker(self._persist_pending)
+        self._writer.start()
+        # Lo encolado al cerrar la aplicación se guarda antes de salir
+        atexit.register(self.close)
+        if cached is not None:
+            self._load_from_snapshot(*cached)
+            self._start_replayer(immediate=True)
+        else:
+            self.load_visitors()
+            if self.storage.is_local:
+                self._start_replayer()
+            else:
+                self._start_date_migration()
+        if retention_days() > 0:
+            self._archive_scheduler = ArchiveScheduler(self.archive_finished_visits)
+            self._archive_scheduler.start()
+
+    def _on_occupancy_changed(self, sectors) -> None:
+        self.signals.occupancy_changed.emit(sorted(sectors))
 
     # ------------------------------------------------------------------
     # Almacenamiento
     # ------------------------------------------------------------------
 
-    def _switch_to_json_storage(self) -> None:
-        self.storage = JsonVisitorStorage(self.data_file)
+    def _switch_to_local_storage(self) -> None:
+        self._remote_watermark = getattr(self.storage, "watermark", self._remote_watermark)
+        self.storage = create_local_storage(self.data_file)
+
+    def _start_date_migration(self) -> None:
+        threading.Thread(target=self._migrate_dates, name="visitor-date-migration", daemon=True).start()
+
+    def _migrate_dates(self) -> None:
+        """
+        Pasa a fechas nativas los documentos de MongoDB que aún las tienen
+        como texto. Si se interrumpe, el próximo inicio continúa donde quedó.
+        """
+        storage = self.storage
+        if not isinstance(storage, MongoVisitorStorage):
+            return
+        try:
+            migrated = storage.migrate_dates()
+            archive = self._get_archive()
+            if isinstance(archive, MongoVisitorArchive):
+                migrated += archive.migrate_dates()
+        except VisitorStorageError as exc:
+            print(f"Migración de fechas interrumpida: {exc}")
+            return
+        if migrated:
+            print(f"Convertidas a fechas nativas {migrated} visitas en MongoDB")
+
+    # ------------------------------------------------------------------
+    # Cola offline
+    # ------------------------------------------------------------------
+
+    def _start_replayer(self, immediate: bool = False) -> None:
+        """Reintenta en segundo plano llevar a MongoDB lo escrito localmente."""
+        if not remote_sync_enabled() or self._replayer is not None:
+            return
+        self._replayer = OutboxReplayer(
+            self._outbox,
+            MongoVisitorStorage,
+            self._on_remote_restored,
+            on_sent=self._on_outbox_sent,
+            immediate=immediate,
+        )
+        self._replayer.start()
+
+    def _on_outbox_sent(
+        self,
+        saved: List[Visitor],
+        deleted: List[str],
+        conflicts: Dict[str, Optional[Visitor]],
+    ) -> None:
+        """
+        Lo reenviado desde la cola quedó en MongoDB con una versión nueva: se
+        adopta en memoria y en el respaldo local para que la próxima edición de
+        esas visitas no choque con su propio cambio, y se lleva a la copia
+        local de MongoDB (la sincronización no lo traerá: ya está en memoria).
+        Lo rechazado por conflicto se resuelve como en un guardado normal.
+        """
+        with self._lock:
+            adopted = []
+            for sent in saved:
+                current = self._index.get(sent.id)
+                if current is not None and current.version < sent.version:
+                    current.version = sent.version
+                    adopted.append(current)
+            storage = self.storage
+        if adopted and storage.is_local:
+            try:
+                storage.save_changes(adopted)
+            except VisitorStorageError as exc:
+                print(f"Error al actualizar versiones en el almacenamiento local: {exc}")
+        self._snapshot.apply(saved, deleted)
+        if conflicts:
+            self._resolve_conflicts(conflicts)
+
+    def _on_remote_restored(self, storage: BaseVisitorStorage) -> None:
+        # Se ejecuta en el hilo del reintento
+        with self._write_lock:
+            try:
+                # Lo encolado mientras se vaciaba la cola
+                self._outbox.drain(storage, self._on_outbox_sent)
+            except VisitorStorageError as exc:
+                print(f"Error al enviar los últimos cambios pendientes: {exc}")
+                self._replayer = None
+                self._start_replayer()
+                return
+
+            if self._remote_watermark is not None and hasattr(storage, "watermark"):
+                storage.watermark = self._remote_watermark
+            self.storage = storage
+            self._replayer = None
+            with self._lock:
+                # Lo leído del almacenamiento local mientras tanto puede estar desactualizado
+                self._cold = {}
+                self._cold_complete = False
+        print("Conexión con MongoDB restablecida; se reanuda el guardado en la nube")
+        self._start_date_migration()
+        # Lo que otras estaciones cambiaron mientras tanto
+        self.sync()
+
+    def pending_remote_changes(self) -> int:
+        """Cantidad de cambios locales que aún no llegan a MongoDB."""
+        return len(self._outbox)
+
+    def _hot_filter(self) -> Optional[VisitorFilter]:
+        if self._hot_since is None:
+            return None
+        return {"$or": [{"estado": "Dentro"}, {"fecha_ingreso": {"$gte": self._hot_since}}]}
+
+    def _is_hot(self, visitor: Visitor) -> bool:
+        return (
+            self._hot_since is None
+            or visitor.estado == "Dentro"
+            or visitor.fecha_ingreso >= self._hot_since
+        )
 
     def load_visitors(self) -> None:
+        """Carga la partición caliente desde el almacenamiento."""
+        # Lo aún no guardado se refiere a la lista que se va a reemplazar
+        self.flush()
+        self._cold = {}
+        self._cold_complete = False
+        self._archive_months = None
+        self._archived = {}
+        with self._lock:
+            self._load_generation += 1
+            self._history_loading = False
+            self._history_complete = False
         try:
-            self.visitors = self.storage.load()
+            if not self.storage.is_local:
+                # Mientras se descarga, la copia local deja de ser válida
+                self._snapshot.invalidate()
+            if self.storage.native_query:
+                # Partición caliente (mes en curso y visitas abiertas) en dos
+                # etapas: lo necesario para operar la portería ahora y el resto
+                # del mes en segundo plano. Los meses anteriores se cargan por
+                # rango cuando un reporte los pide
+                self._hot_since = current_partition_start()
+                recent_since = max(self._hot_since, to_timestamp(datetime.now() - timedelta(hours=RECENT_HOURS)))
+                self._set_visitors(
+                    self.storage.load_matching(
+                        {"$or": [{"estado": "Dentro"}, {"fecha_ingreso": {"$gte": recent_since}}]}
+                    )
+                )
+                if recent_since > self._hot_since:
+                    self._start_history_loader(self._hot_since, recent_since)
+                else:
+                    self._history_complete = True
+                    self._save_snapshot()
+            else:
+                self._hot_since = None
+                self._set_visitors(self.storage.load())
+                self._history_complete = True
             print(f"Cargados {len(self.visitors)} visitantes desde almacenamiento principal")
         except VisitorStorageError as exc:
             print(f"Error al cargar visitantes: {exc}")
-            print("Intentando cargar desde archivo JSON como respaldo")
-            self._switch_to_json_storage()
-            self.visitors = self.storage.load()
-            print(f"Cargados {len(self.visitors)} visitantes desde archivo JSON")
+            print("Intentando cargar desde almacenamiento local como respaldo")
+            self._switch_to_local_storage()
+            self._hot_since = None
+            self._set_visitors(self.storage.load())
+            self._history_complete = True
+            print(f"Cargados {len(self.visitors)} visitantes desde almacenamiento local")
+
+    def _load_from_snapshot(self, visitors: List[Visitor], watermark: datetime) -> None:
+        """
+        Parte de la copia local de MongoDB. Hasta reconectar se guarda como sin
+        conexión (almacenamiento local y cola); al reconectar se sincroniza
+        desde ``watermark``.
+        """
+        if self._outbox:
+            # Cambios de una sesión anterior sin conexión, aún no enviados
+            pending, deleted = self._outbox.pending()
+            by_id = {visitor.id: visitor for visitor in visitors}
+            by_id.update((visitor.id, visitor) for visitor in pending)
+            for visitor_id in deleted:
+                by_id.pop(visitor_id, None)
+            visitors = list(by_id.values())
+        self._hot_since = current_partition_start()
+        # Lo finalizado en meses anteriores pasó a las particiones frías
+        self._set_visitors([visitor for visitor in visitors if self._is_hot(visitor)])
+        self._remote_watermark = watermark
+        self._history_complete = True
+        print(f"Cargados {len(self.visitors)} visitantes desde la copia local; conectando con MongoDB")
+
+    def _save_snapshot(self) -> None:
+        """Guarda la partición caliente completa con la marca de agua a la que corresponde."""
+        if self.storage.is_local:
+            return
+        with self._sync_lock:
+            with self._lock:
+                # Lo no guardado aún no existe en MongoDB; llega con apply al guardarse
+                unsaved = set(self._pending.ids) | set(self._in_flight.ids)
+                visitors = [visitor for visitor in self.visitors if visitor.id not in unsaved]
+            watermark = getattr(self.storage, "watermark", None)
+        if watermark is not None:
+            self._snapshot.replace(visitors, watermark)
+
+    @property
+    def history_complete(self) -> bool:
+        """Indica si ya está en memoria toda la partición caliente."""
+        return self._history_complete
+
+    def _start_history_loader(self, since: str, until: str) -> None:
+        self._history_loading = True
+        loader = threading.Thread(
+            target=self._load_history,
+            args=(self._load_generation, since, until),
+            name="visitor-history-loader",
+            daemon=True,
+        )
+        loader.start()
+
+    def _load_history(self, generation: int, since: str, until: str) -> None:
+        """Trae por páginas, de la más reciente a la más antigua, las visitas finalizadas del rango."""
+        query = {"fecha_ingreso": {"$gte": since, "$lt": until}, "estado": {"$ne": "Dentro"}}
+        storage = self.storage
+        try:
+            total = storage.count(query)
+        except VisitorStorageError:
+            total = None
+
+        loaded = 0
+        while True:
+            try:
+                page = storage.query(
+                    query,
+                    sort=[("fecha_ingreso", DESCENDING), ("id", DESCENDING)],
+                    limit=HISTORY_PAGE_SIZE,
+                    skip=loaded,
+                )
+            except VisitorStorageError as exc:
+                # Queda incompleto; la comprobación de totales de sync() recargará
+                print(f"Error al cargar el historial de visitantes: {exc}")
+                with self._lock:
+                    if generation == self._load_generation:
+                        self._history_loading = False
+                return
+
+            with self._lock:
+                if generation != self._load_generation:
+                    return
+                self._merge_history(page)
+            loaded += len(page)
+            self.signals.history_progress.emit(loaded, total if total is not None else -1)
+            if len(page) < HISTORY_PAGE_SIZE:
+                break
+
+        with self._lock:
+            if generation != self._load_generation:
+                return
+            self._history_loading = False
+            self._history_complete = True
+        print(f"Historial del mes cargado en segundo plano ({loaded} visitas)")
+        self._save_snapshot()
+        self.signals.history_loaded.emit()
+
+    def _merge_history(self, visitors: List[Visitor]) -> None:
+        # Prevalece lo que ya está en memoria (sincronizado o editado aquí) y
+        # lo eliminado que aún no se guarda
+        removed = self._pending.removed | self._in_flight.removed
+        fresh = [visitor for visitor in visitors if self._index.get(visitor.id) is None and visitor.id not in removed]
+        self.visitors.extend(fresh)
+        for visitor in fresh:
+            self._index.add(visitor)
+            self._search.add(visitor)
+            self.occupancy.add(visitor)
+        # Caen antes que lo ya cargado: se intercalan de una vez
+        self._timeline.extend(fresh)
+        self._start_search_indexer()
+
+    def _start_search_indexer(self) -> None:
+        # Sin esto, la primera búsqueda indexaría todo en el hilo de la interfaz
+        with self._lock:
+            if self._search_indexing:
+                return
+            self._search_indexing = True
+        indexer = threading.Thread(target=self._build_search_index, name="visitor-search-indexer", daemon=True)
+        indexer.start()
+
+    def _build_search_index(self) -> None:
+        """Indexa lo cargado para búsqueda, por partes para no retener el candado."""
+        while True:
+            with self._lock:
+                if not self._search.index_pending(SEARCH_INDEX_BATCH):
+                    self._search_indexing = False
+                    return
+            # Cede el turno a quien espera el candado (p. ej. la interfaz)
+            time.sleep(0)
+
+    def _set_visitors(self, visitors: List[Visitor]) -> None:
+        with self._lock:
+            self._pending = VisitorChangeSet()
+            self.visitors = visitors
+            self._index.rebuild(visitors)
+            self._timeline.rebuild(visitors)
+            self._search.rebuild(visitors)
+            self.occupancy.rebuild(visitors)
+        self._start_search_indexer()
+        self.signals.dataset_reloaded.emit()
+
+    def _reindex_add(self, visitor: Visitor) -> None:
+        self._index.add(visitor)
+        self._timeline.add(visitor)
+        self._search.add(visitor)
+        self.occupancy.add(visitor)
+
+    def _reindex_remove(self, visitor_id: str) -> None:
+        self._index.remove(visitor_id)
+        self._timeline.remove(visitor_id)
+        self._search.remove(visitor_id)
+        self.occupancy.remove(visitor_id)
+
+    def _reindex_refresh(self, visitor: Visitor) -> None:
+        self._index.refresh(visitor)
+        self._timeline.refresh(visitor)
+        self._search.refresh(visitor)
+        self.occupancy.refresh(visitor)
 
     def save_visitors(self) -> bool:
+        """Persiste ahora, en el hilo actual, los cambios registrados desde el último guardado."""
+        _, saved, _ = self._flush_pending()
+        return saved
+
+    def request_save(self) -> None:
+        """Encola el guardado de los cambios pendientes en el hilo de escritura."""
+        self._writer.submit()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que el hilo de escritura termine lo solicitado hasta ahora."""
+        return self._writer.flush(timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Termina el hilo de escritura después de guardar lo pendiente."""
+        self._writer.stop()
+        self._writer.join(timeout)
+
+    def _persist_pending(self) -> None:
+        # Se ejecuta en el hilo de escritura
+        changes, saved, error = self._flush_pending()
+        if not changes:
+            return
+        if saved:
+            self.signals.changes_saved.emit(changes.ids)
+        else:
+            self.signals.save_failed.emit(changes.ids, error or "No se pudieron guardar los cambios")
+
+    def _flush_pending(self) -> Tuple[VisitorChangeSet, bool, Optional[str]]:
+        with self._write_lock:
+            with self._lock:
+                changes, self._pending = self._pending, VisitorChangeSet()
+                self._in_flight = changes
+            if not changes:
+                return changes, True, None
+
+            error = None
+            conflicts: Dict[str, Optional[Visitor]] = {}
+            try:
+                saved = self.storage.apply_changes(changes)
+            except VisitorConflictError as exc:
+                # Lo demás se guardó; las visitas en conflicto se resuelven abajo
+                print(f"Conflicto al guardar visitantes: {exc}")
+                saved = True
+                conflicts = exc.conflicts
+            except VisitorStorageError as exc:
+                print(f"Error al guardar visitantes: {exc}")
+                error = str(exc)
+                if self.storage.is_local:
+                    saved = False
+                else:
+                    # Solo el cambio: en memoria está solo la partición caliente, y
+                    # reescribir el respaldo con ella borraría los meses anteriores.
+                    # La cola lo enviará a MongoDB al volver la conexión
+                    print("Guardando en almacenamiento local; se enviará a MongoDB al reconectar")
+                    self._switch_to_local_storage()
+                    try:
+                        saved = self.storage.apply_changes(changes)
+                    except VisitorStorageError as local_exc:
+                        print(f"Error al guardar visitantes en el almacenamiento local: {local_exc}")
+                        saved = False
+                    self._start_replayer()
+
+            if saved and not self.storage.is_local:
+                self._snapshot.apply(
+                    [visitor for visitor in changes.upserts if visitor.id not in conflicts],
+                    [visitor_id for visitor_id in changes.removed if visitor_id not in conflicts],
+                )
+
+            if saved and self._replayer is not None:
+                try:
+                    self._outbox.enqueue(changes)
+                except VisitorStorageError as exc:
+                    print(f"Error al encolar cambios para MongoDB: {exc}")
+
+            with self._lock:
+                self._in_flight = VisitorChangeSet()
+                for visitor in changes.upserts:
+                    # Eliminada mientras se guardaba: el borrado debe esperar la versión recién escrita
+                    if visitor.id in self._pending.removed_versions:
+                        self._pending.removed_versions[visitor.id] = visitor.version
+                if not saved:
+                    # Conservar los cambios para reintentarlos en el próximo guardado
+                    changes.merge(self._pending)
+                    self._pending = changes
+            if conflicts:
+                self._resolve_conflicts(conflicts)
+            return changes, saved, error
+
+    def _resolve_conflicts(self, conflicts: Dict[str, Optional[Visitor]]) -> None:
+        """
+        Otra estación cambió estas visitas antes que esta: prevalece lo que
+        quedó en la base (o su eliminación) y se descarta el cambio local,
+        incluido el que se haya hecho después sobre la misma visita.
+        """
+        added_ids: List[str] = []
+        updated_ids: List[str] = []
+        removed_ids: List[str] = []
+        with self._lock:
+            for visitor_id in conflicts:
+                self._pending.forget(visitor_id)
+
+            for visitor_id, remote in conflicts.items():
+                current = self._index.get(visitor_id)
+                if remote is None:
+                    if current is not None:
+                        self.visitors.remove(current)
+                        self._reindex_remove(visitor_id)
+                        removed_ids.append(visitor_id)
+                elif current is None:
+                    # La eliminación local llegó tarde: la visita vuelve
+                    self.visitors.append(remote)
+                    self._reindex_add(remote)
+                    added_ids.append(visitor_id)
+                else:
+                    # En el mismo objeto, para no invalidar referencias de las vistas
+                    for key, value in remote.to_dict().items():
+                        setattr(current, key, value)
+                    self._reindex_refresh(current)
+                    updated_ids.append(visitor_id)
+
+        # La sincronización no los traerá: en memoria ya tienen la versión remota
+        self._snapshot.apply(
+            [remote for remote in conflicts.values() if remote is not None],
+            [visitor_id for visitor_id, remote in conflicts.items() if remote is None],
+        )
+        if added_ids:
+            self.signals.visitor_added.emit(added_ids)
+        if updated_ids:
+            self.signals.visitor_updated.emit(updated_ids)
+        if removed_ids:
+            self.signals.visitor_removed.emit(removed_ids)
+        self.signals.save_conflict.emit(list(conflicts))
+
+    def _rewrite_storage(self) -> bool:
+        with self._lock:
+            visitors = list(self.visitors)
         try:
-            return self.storage.save(self.visitors)
+            return self.storage.save(visitors)
         except VisitorStorageError as exc:
-            print(f"Error al guardar visitantes: {exc}")
-            if isinstance(self.storage, JsonVisitorStorage):
-                return False
+            print(f"Error al reescribir visitantes: {exc}")
+            return False
+
+    def _has_unsaved_changes(self) -> bool:
+        return bool(self._pending) or bool(self._in_flight)
 
-            print("Guardando en archivo JSON como respaldo")
-            self._switch_to_json_storage()
-            return self.storage.save(self.visitors)
+    def pending_changes(self) -> VisitorChangeSet:
+        """Copia de los cambios aún no persistidos."""
+        return self._pending.copy()
+
+    def mark_modified(self, visitor_id: str) -> bool:
+        """Registra como modificado un visitante editado directamente."""
+        with self._lock:
+            visitor = self.get_visitor_by_id(visitor_id)
+            if not visitor:
+                return False
+            self._reindex_refresh(visitor)
+            self._pending.record_modified(visitor)
+        self.signals.visitor_updated.emit([visitor_id])
+        return True
 
     # ------------------------------------------------------------------
     # CRUD Visitantes
     # ------------------------------------------------------------------
+    # Los cambios se aplican en memoria y se guardan en el hilo de escritura;
+    # el resultado llega con las señales changes_saved / save_failed. Si el
+    # guardado falla los cambios siguen pendientes y se reintentan en el
+    # siguiente.
 
     def add_visitor(self, visitor: Visitor) -> bool:
-        if any(v.rut == visitor.rut and v.estado == "Dentro" for v in self.visitors):
-            return False
+        with self._lock:
+            if self._index.has_open_visit(visitor.rut):
+                return False
 
-        self.visitors.append(visitor)
-        if not self.save_visitors():
-            self.visitors.pop()
-            return False
+            self.visitors.append(visitor)
+            self._reindex_add(visitor)
+            self._pending.record_created(visitor)
+        self.signals.visitor_added.emit([visitor.id])
+        self.request_save()
         return True
 
     def get_visitor_by_id(self, visitor_id: str) -> Optional[Visitor]:
-        return next((visitor for visitor in self.visitors if visitor.id == visitor_id), None)
+        return self._index.get(visitor_id)
 
     def update_visitor(self, visitor_id: str, **kwargs) -> bool:
-        visitor = self.get_visitor_by_id(visitor_id)
-        if not visitor:
-            return False
+        with self._lock:
+            visitor = self.get_visitor_by_id(visitor_id)
+            if not visitor:
+                return False
 
-        for key, value in kwargs.items():
-            if hasattr(visitor, key):
-                setattr(visitor, key, value)
+            for key, value in kwargs.items():
+                if hasattr(visitor, key):
+                    setattr(visitor, key, value)
 
-        return self.save_visitors()
+            self._reindex_refresh(visitor)
+            self._pending.record_modified(visitor)
+        self.signals.visitor_updated.emit([visitor_id])
+        self.request_save()
+        return True
 
     def delete_visitor(self, visitor_id: str) -> bool:
-        visitor = self.get_visitor_by_id(visitor_id)
-        if not visitor:
-            return False
+        with self._lock:
+            visitor = self.get_visitor_by_id(visitor_id)
+            if not visitor:
+                return False
 
-        self.visitors.remove(visitor)
-        return self.save_visitors()
+            self.visitors.remove(visitor)
+            self._reindex_remove(visitor_id)
+            self._pending.record_removed(visitor_id, visitor.version)
+        self.signals.visitor_removed.emit([visitor_id])
+        self.request_save()
+        return True
 
     def toggle_visitor_status(self, visitor_id: str) -> bool:
-        visitor = self.get_visitor_by_id(visitor_id)
-        if not visitor or visitor.estado == "Fuera":
-            return False
+        with self._lock:
+            visitor = self.get_visitor_by_id(visitor_id)
+            if not visitor or visitor.estado == "Fuera":
+                return False
+
+            visitor.toggle_estado()
+            self._reindex_refresh(visitor)
+            self._pending.record_modified(visitor)
+        self.signals.visitor_updated.emit([visitor_id])
+        self.request_save()
+        return True
+
+    # ------------------------------------------------------------------
+    # Operaciones por lote
+    # ------------------------------------------------------------------
+    # Todo el lote se aplica en memoria, se notifica con una sola señal y se
+    # guarda como un único conjunto de cambios.
+
+    def add_visitors(self, visitors: Iterable[Visitor]) -> List[Visitor]:
+        """Registra varios visitantes y devuelve los agregados; omite los RUT con una visita abierta."""
+        added: List[Visitor] = []
+        with self._lock:
+            for visitor in visitors:
+                if self._index.has_open_visit(visitor.rut):
+                    continue
+                self.visitors.append(visitor)
+                self._reindex_add(visitor)
+                self._pending.record_created(visitor)
+                added.append(visitor)
+        if added:
+            self.signals.visitor_added.emit([visitor.id for visitor in added])
+            self.request_save()
+        return added
+
+    def _checkout(self, visitors: Iterable[Visitor]) -> int:
+        checked_out: List[str] = []
+        with self._lock:
+            for visitor in visitors:
+                if visitor.estado != "Dentro":
+                    continue
+                visitor.toggle_estado()
+                self._reindex_refresh(visitor)
+                self._pending.record_modified(visitor)
+                checked_out.append(visitor.id)
+        if checked_out:
+            self.signals.visitor_updated.emit(checked_out)
+            self.request_save()
+        return len(checked_out)
 
-        visitor.toggle_estado()
-        return self.save_visitors()
+    def checkout_many(self, visitor_ids: Iterable[str]) -> int:
+        """Marca la salida de las visitas indicadas que sigan abiertas; devuelve cuántas."""
+        with self._lock:
+            visitors = [self._index.get(visitor_id) for visitor_id in visitor_ids]
+        return self._checkout(visitor for visitor in visitors if visitor is not None)
+
+    def checkout_sector(self, sector: str) -> int:
+        """Marca la salida de todas las visitas abiertas del sector."""
+        with self._lock:
+            visitors = self._index.open_in_sector(sector)
+        return self._checkout(visitors)
+
+    def checkout_all_open(self, before=None) -> int:
+        """
+        Cierre de jornada: marca la salida de las visitas abiertas que
+        ingresaron antes de ``before`` (``datetime`` o texto; ``None`` = todas).
+        """
+        before = to_timestamp(before)
+        with self._lock:
+            visitors = [
+                visitor
+                for visitor in self._index.open.values()
+                if before is None or visitor.fecha_ingreso < before
+            ]
+        return self._checkout(visitors)
 
     def delete_all_visitors(self) -> bool:
+        # Esperar a que no haya escrituras en curso que reaparezcan tras el borrado
+        with self._write_lock:
+            self._set_visitors([])
+            try:
+                self.storage.delete_all()
+                self._outbox.clear()
+                if not self.storage.is_local:
+                    # Limpiar también el respaldo local para consistencia
+                    create_local_storage(self.data_file).delete_all()
+                return True
+            except VisitorStorageError as exc:
+                print(f"Error al eliminar todos los visitantes: {exc}")
+                self._switch_to_local_storage()
+                return self._rewrite_storage()
+
+    # ------------------------------------------------------------------
+    # Archivado
+    # ------------------------------------------------------------------
+
+    def _get_archive(self) -> BaseVisitorArchive:
+        if self._archive is None or self._archive_storage is not self.storage:
+            directory = os.path.join(os.path.dirname(self.data_file), "report", "archive")
+            self._archive = create_archive(self.storage, directory)
+            self._archive_storage = self.storage
+            self._archive_months = None
+            self._archived = {}
+        return self._archive
+
+    def archive_finished_visits(self, older_than_days: int | None = None, batch_size: int = 500) -> int:
+        """
+        Mueve al archivo histórico, por lotes, las visitas "Fuera" con más de
+        ``older_than_days`` días y las quita del almacenamiento principal.
+        Siguen disponibles para los reportes vía ``get_visitors_in_range``.
+        """
+        days = retention_days() if older_than_days is None else older_than_days
+        if days <= 0:
+            return 0
+        cutoff = (datetime.now() - timedelta(days=days)).strftime(DATE_FORMAT)
+        query = {"estado": "Fuera", "fecha_ingreso": {"$lt": cutoff}}
+
+        archived = 0
+        while True:
+            with self._lock:
+                if self._replayer is not None:
+                    # Sin conexión: los borrados no deben adelantarse a la cola offline
+                    break
+                storage = self.storage
+                archive = self._get_archive()
+            batch = self.find_visitors(query, sort=[("fecha_ingreso", 1)], limit=batch_size)
+            if not batch:
+                break
+
+            changes = VisitorChangeSet()
+            for visitor in batch:
+                changes.record_removed(visitor.id, visitor.version)
+            conflicts: Dict[str, Optional[Visitor]] = {}
+            try:
+                # Primero se archiva: si algo falla después, releer el archivo deduplica por id
+                archive.append(batch)
+                with self._write_lock:
+                    storage.apply_changes(changes)
+            except VisitorConflictError as exc:
+                # Otra estación las cambió: quedan en la base y se archivarán en otra pasada
+                conflicts = exc.conflicts
+            except VisitorStorageError as exc:
+                print(f"Error al archivar visitas: {exc}")
+                break
+
+            ids = {visitor.id for visitor in batch if visitor.id not in conflicts}
+            months = {partition_key(visitor.fecha_ingreso) for visitor in batch}
+            with self._lock:
+                self.visitors = [visitor for visitor in self.visitors if visitor.id not in ids]
+                for visitor_id in ids:
+                    self._reindex_remove(visitor_id)
+                for key in months:
+                    self._cold.pop(key, None)
+                    self._archived.pop(key, None)
+                self._cold_complete = False
+                self._archive_months = None
+            if conflicts:
+                self._resolve_conflicts(conflicts)
+            if ids:
+                self.signals.visitor_removed.emit(list(ids))
+            archived += len(ids)
+            if not ids:
+                break
+
+        if archived:
+            print(f"Archivadas {archived} visitas finalizadas anteriores a {cutoff}")
+        return archived
+
+    def _load_archived(self, since: Optional[str], until: Optional[str]) -> List[Visitor]:
         try:
-            self.storage.delete_all()
-            self.visitors.clear()
-            if not isinstance(self.storage, JsonVisitorStorage):
-                # Limpiar también el respaldo JSON para consistencia
-                JsonVisitorStorage(self.data_file).delete_all()
-            return True
+            archive = self._get_archive()
+            if self._archive_months is None:
+                self._archive_months = archive.months()
+            keys = [
+                key
+                for key in self._archive_months
+                if (since is None or key >= partition_key(since))
+                and (until is None or partition_start(key) < until)
+            ]
+            for key in keys:
+                if key not in self._archived:
+                    self._archived[key] = archive.read_month(key)
         except VisitorStorageError as exc:
-            print(f"Error al eliminar todos los visitantes: {exc}")
-            self._switch_to_json_storage()
-            self.visitors.clear()
-            return self.save_visitors()
+            print(f"Error al leer el archivo histórico: {exc}")
+            return []
+        return [visitor for key in keys for visitor in self._archived.get(key, ())]
 
     # ------------------------------------------------------------------
     # Consultas
     # ------------------------------------------------------------------
 
     def get_all_visitors(self) -> List[Visitor]:
-        return list(self.visitors)
+        with self._lock:
+            return list(self.visitors)
+
+    def get_latest_visitors(self, count: int) -> List[Visitor]:
+        """Las ``count`` visitas cargadas con ingreso más reciente, de la más nueva a la más antigua."""
+        with self._lock:
+            return self._timeline.latest(count)
 
     def get_visitors_by_status(self, status: str) -> List[Visitor]:
+        if status == "Dentro":
+            return self.get_current_visitors()
         return [visitor for visitor in self.visitors if visitor.estado == status]
 
     def get_visitors_by_sector(self, sector: str) -> List[Visitor]:
         return [visitor for visitor in self.visitors if visitor.sector == sector]
 
     def get_current_visitors(self) -> List[Visitor]:
-        return [visitor for visitor in self.visitors if visitor.estado == "Dentro"]
+        return list(self._index.open.values())
 
-    def get_visitor_report_data(self, include_departed: bool = True) -> List[Dict]:
-        if include_departed:
-            visitors = self.visitors
+    def get_current_visitors_by_sector(self, sector: str) -> List[Visitor]:
+        return self._index.open_in_sector(sector)
+
+    def get_open_visit_for_rut(self, rut: str) -> Optional[Visitor]:
+        return self._index.open_visit_for(rut)
+
+    def find_visitors(
+        self,
+        filter: Optional[VisitorFilter] = None,
+        sort: Optional[SortSpec] = None,
+        limit: int = 0,
+        skip: int = 0,
+        projection: Optional[Projection] = None,
+    ) -> List:
+        """
+        Consulta visitantes con la sintaxis de ``core.visitors.query``. Si el
+        almacenamiento tiene consultas nativas (MongoDB, SQLite) el filtro se
+        resuelve allí; si no, sobre la lista en memoria.
+        """
+        if self.storage.native_query and not self._has_unsaved_changes():
+            try:
+                return self.storage.query(filter, sort, limit, skip, projection)
+            except VisitorStorageError as exc:
+                print(f"Error al consultar visitantes en el almacenamiento: {exc}")
+
+        try:
+            documents = run_query((visitor.to_dict() for visitor in self.get_all_visitors()), filter, sort, limit, skip)
+        except UnsupportedQueryError as exc:
+            print(f"Consulta de visitantes no soportada: {exc}")
+            return []
+        if projection is not None:
+            return [project(document, projection) for document in documents]
+        return [self._index.get(document["id"]) for document in documents]
+
+    def query(
+        self,
+        estado: Optional[str] = None,
+        sector: Optional[str] = None,
+        text: Optional[str] = None,
+        since=None,
+        until=None,
+        registrador: Optional[str] = None,
+        order_by: Optional[OrderBy] = "-fecha_ingreso",
+        limit: int = 0,
+        offset: int = 0,
+        history: bool = False,
+    ) -> VisitorPage:
+        """
+        Página de visitantes que cumplen todos los criterios indicados, con el
+        total de coincidencias. ``text`` busca sin distinguir mayúsculas en
+        RUT (también sin puntos ni guion), nombre, acompañante y sector, sin
+        tildes y palabra por palabra; ``order_by`` acepta "campo" o
+        "-campo" (o una lista). Las visitas abiertas salen de los índices; con
+        ``history`` se incluyen también las particiones antiguas y el archivo
+        histórico del rango ``since``/``until``.
+        """
+        since, until = to_timestamp(since), to_timestamp(until)
+        text = (text or "").strip()
+        sort = parse_order_by(order_by)
+        # Orden por fecha de ingreso: lo da la línea de tiempo sin ordenar
+        by_time = len(sort) == 1 and sort[0][0] == "fecha_ingreso"
+        newest_first = by_time and sort[0][1] == DESCENDING
+
+        unfiltered = not text and all(value is None for value in (estado, sector, registrador, since, until))
+        if by_time and unfiltered and not history:
+            # Página de todas las visitas cargadas: corte directo, totales desde la ocupación
+            with self._lock:
+                items = self._timeline.slice(offset, limit, newest_first)
+                total = len(self._timeline)
+                counts = self.occupancy.snapshot()
+            by_estado = {}
+            by_sector = {}
+            for name, count in counts.items():
+                by_sector[name] = count["dentro"] + count["fuera"]
+                for estado_name, key in (("Dentro", "dentro"), ("Fuera", "fuera")):
+                    if count[key]:
+                        by_estado[estado_name] = by_estado.get(estado_name, 0) + count[key]
+            return VisitorPage(items, total, offset, limit, by_estado, by_sector)
+
+        matched_ids = None
+        # Candidatos que ya vienen en orden de ingreso
+        ordered = False
+        with self._lock:
+            if text:
+                matched_ids = self._search.search(text)
+            if estado == "Dentro":
+                candidates = self._index.open_in_sector(sector) if sector else list(self._index.open.values())
+            elif matched_ids is not None and not history:
+                # La búsqueda ya acotó los candidatos
+                candidates = [self._index.get(visitor_id) for visitor_id in matched_ids]
+            elif not history:
+                candidates = self._timeline.between(since, until)
+                ordered = True
+        if history and estado != "Dentro":
+            candidates = self.get_visitors_in_range(since, until)
+            ordered = True
+
+        def keep(visitor: Visitor) -> bool:
+            if estado is not None and visitor.estado != estado:
+                return False
+            if sector is not None and visitor.sector != sector:
+                return False
+            if registrador is not None and visitor.usuario_registrador != registrador:
+                return False
+            if since is not None and visitor.fecha_ingreso < since:
+                return False
+            if until is not None and visitor.fecha_ingreso >= until:
+                return False
+            if text:
+                if visitor.id in matched_ids:
+                    return True
+                # Visitas históricas: no están en el índice de búsqueda
+                return visitor.id not in self._search and matches_text(visitor, text)
+            return True
+
+        matched = [visitor for visitor in candidates if keep(visitor)]
+        by_estado: Dict[str, int] = {}
+        by_sector: Dict[str, int] = {}
+        for visitor in matched:
+            by_estado[visitor.estado] = by_estado.get(visitor.estado, 0) + 1
+            by_sector[visitor.sector] = by_sector.get(visitor.sector, 0) + 1
+
+        if ordered and by_time:
+            if newest_first:
+                matched.reverse()
+        else:
+            sort_visitors(matched, sort)
+        items = matched[offset:offset + limit] if limit else matched[offset:]
+        return VisitorPage(items, len(matched), offset, limit, by_estado, by_sector)
+
+    def _load_cold_partitions(self, since: Optional[str], until: str) -> None:
+        """Carga desde el almacenamiento las particiones frías que falten."""
+        if self._cold_complete:
+            return
+
+        if since is None:
+            # Todo el historial anterior a la partición caliente, en una sola consulta
+            keys = None
+            query = {"fecha_ingreso": {"$lt": until}, "estado": {"$ne": "Dentro"}}
         else:
-            visitors = self.get_current_visitors()
+            keys = [key for key in partitions_between(since, until) if key not in self._cold]
+            if not keys:
+                return
+            query = {
+                "fecha_ingreso": {
+                    "$gte": partition_start(keys[0]),
+                    # Meses completos, para que cada partición quede entera en caché
+                    "$lt": partition_start(next_partition(keys[-1])),
+                },
+                "estado": {"$ne": "Dentro"},
+            }
 
-        report_data: List[Dict] = []
+        try:
+            visitors = self.storage.query(query)
+        except VisitorStorageError as exc:
+            print(f"Error al cargar historial de visitantes: {exc}")
+            return
+
+        loaded: Dict[str, List[Visitor]] = {key: [] for key in keys or ()}
         for visitor in visitors:
-            if visitor.fecha_salida:
-                fecha_salida = visitor.fecha_salida
-                estado_visita = "Finalizada"
-            else:
-                fecha_salida = "Aún en el edificio"
-                estado_visita = "En curso"
-
-            report_data.append(
-                {
-                    "nombre": visitor.nombre_completo,
-                    "rut": visitor.rut,
-                    "fecha_entrada": visitor.fecha_ingreso,
-                    "fecha_salida": fecha_salida,
-                    "destino": visitor.sector,
-                    "acompañante": visitor.acompañante,
-                    "estado_visita": estado_visita,
-                    "usuario_registrador": visitor.usuario_registrador or "Sistema",
-                }
+            loaded.setdefault(partition_key(visitor.fecha_ingreso), []).append(visitor)
+        self._cold.update(loaded)
+        if keys is None:
+            self._cold_complete = True
+        print(f"Cargadas {len(visitors)} visitas históricas ({len(loaded)} meses)")
+
+    def get_visitors_in_range(self, since=None, until=None) -> List[Visitor]:
+        """
+        Visitas con ``since <= fecha_ingreso < until`` (``datetime`` o texto;
+        ``None`` deja el extremo abierto), en orden de ingreso. Las
+        particiones antiguas se leen del almacenamiento la primera vez que
+        se piden.
+        """
+        since, until = to_timestamp(since), to_timestamp(until)
+
+        def in_range(visitor: Visitor) -> bool:
+            return (since is None or visitor.fecha_ingreso >= since) and (
+                until is None or visitor.fecha_ingreso < until
             )
 
-        report_data.sort(key=lambda item: item["fecha_entrada"], reverse=True)
-        return report_data
+        with self._lock:
+            visitors = self._timeline.between(since, until)
+        older: List[Visitor] = []
+        if self._hot_since is not None and (since is None or since < self._hot_since):
+            cold_until = self._hot_since if until is None else min(until, self._hot_since)
+            self._load_cold_partitions(since, cold_until)
+            for key in sorted(self._cold):
+                older.extend(visitor for visitor in self._cold[key] if in_range(visitor))
+
+        # Visitas archivadas; un id puede quedar en ambos lados si el archivado se interrumpió
+        seen = {visitor.id for visitor in visitors}
+        seen.update(visitor.id for visitor in older)
+        for visitor in self._load_archived(since, until):
+            if visitor.id not in seen and in_range(visitor):
+                seen.add(visitor.id)
+                older.append(visitor)
+        if not older:
+            return visitors
+        # Dos tramos ya casi ordenados: timsort los mezcla en tiempo lineal
+        older.sort(key=lambda visitor: visitor.fecha_ingreso)
+        visitors = older + visitors
+        visitors.sort(key=lambda visitor: visitor.fecha_ingreso)
+        return visitors
+
+    def count_visits_by_day(self, since=None, until=None) -> Dict[str, int]:
+        """
+        Ingresos por día ("YYYY-MM-DD" -> cantidad) en ``since <= fecha_ingreso < until``.
+        Con MongoDB se agrupan en el servidor sobre el índice de
+        ``fecha_ingreso``, sin traer las visitas; si no, se cuentan en memoria.
+        """
+        since, until = to_timestamp(since), to_timestamp(until)
+        counts = None
+        if not self._has_unsaved_changes():
+            try:
+                counts = self.storage.count_by_day(since, until)
+            except VisitorStorageError as exc:
+                print(f"Error al agrupar visitas por día: {exc}")
+
+        if counts is None:
+            visitors = self.get_visitors_in_range(since, until)
+        else:
+            # Lo archivado está fuera de la colección principal
+            visitors = [
+                visitor
+                for visitor in self._load_archived(since, until)
+                if (since is None or visitor.fecha_ingreso >= since)
+                and (until is None or visitor.fecha_ingreso < until)
+            ]
+        counts = dict(counts or {})
+        for visitor in visitors:
+            day = visitor.fecha_ingreso[:10]
+            counts[day] = counts.get(day, 0) + 1
+        return counts
+
+    def request_report(self, since=None, until=None) -> None:
+        """
+        Calcula en un hilo aparte las visitas del rango y sus ingresos por día
+        (puede requerir leer particiones antiguas o el archivo, o agrupar en
+        MongoDB) y los entrega con la señal ``report_ready``. Si llegan
+        pedidos mientras se calcula, solo se responde el último.
+        """
+        request = (to_timestamp(since), to_timestamp(until))
+        with self._report_lock:
+            running = self._report_request is not None
+            self._report_request = request
+        if not running:
+            threading.Thread(target=self._run_reports, name="visitor-report", daemon=True).start()
+
+    def _run_reports(self) -> None:
+        while True:
+            with self._report_lock:
+                request = self._report_request
+            since, until = request
+            try:
+                visitors = self.get_visitors_in_range(since, until)
+                counts = self.count_visits_by_day(since, until)
+            except Exception as exc:
+                # Sin esto el hilo moriría y los próximos pedidos quedarían sin respuesta
+                print(f"Error al calcular el reporte de visitantes: {exc}")
+                with self._report_lock:
+                    self._report_request = None
+                return
+            with self._report_lock:
+                if self._report_request is not request:
+                    # Se pidió otro rango mientras tanto: este resultado ya no sirve
+                    continue
+                self._report_request = None
+            self.signals.report_ready.emit(since, visitors, counts)
+            return
+
+    def get_visitor_report_data(
+        self,
+        include_departed: bool = True,
+        since=None,
+        until=None,
+    ) -> List[Dict]:
+        if include_departed:
+            # Ya vienen en orden de ingreso: basta recorrerlas al revés
+            visitors = reversed(self.get_visitors_in_range(since, until))
+        else:
+            visitors = sorted(self.get_current_visitors(), key=lambda visitor: visitor.fecha_ingreso, reverse=True)
+        return [self.get_visitor_report_row(visitor) for visitor in visitors]
+
+    @staticmethod
+    def get_visitor_report_row(visitor: Visitor) -> Dict:
+        if visitor.fecha_salida:
+            fecha_salida = visitor.fecha_salida
+            estado_visita = "Finalizada"
+        else:
+            fecha_salida = "Aún en el edificio"
+            estado_visita = "En curso"
+
+        return {
+            "nombre": visitor.nombre_completo,
+            "rut": visitor.rut,
+            "fecha_entrada": visitor.fecha_ingreso,
+            "fecha_salida": fecha_salida,
+            "destino": visitor.sector,
+            "acompañante": visitor.acompañante,
+            "estado_visita": estado_visita,
+            "usuario_registrador": visitor.usuario_registrador or "Sistema",
+        }
+
+    def sync(self) -> int:
+        """
+        Incorpora los visitantes modificados en el almacenamiento desde la
+        última sincronización y devuelve cuántos se actualizaron. Si el
+        almacenamiento no admite sincronización incremental no hace nada.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            # Ya hay una en curso (p. ej. la puesta al día del arranque)
+            return 0
+        try:
+            try:
+                changed = self.storage.load_changes()
+            except VisitorStorageError as exc:
+                print(f"Error al sincronizar visitantes: {exc}")
+                return 0
+            if changed is None:
+                return 0
+
+            with self._lock:
+                # Lo local aún no guardado (o en envío) prevalece sobre el remoto
+                pending_ids = set(self._pending.ids) | set(self._in_flight.ids)
+                added_ids: List[str] = []
+                updated_ids: List[str] = []
+                applied: List[Visitor] = []
+                for fresh in changed:
+                    if fresh.id in pending_ids:
+                        continue
+                    current = self._index.get(fresh.id)
+                    if current is None and not self._is_hot(fresh):
+                        # Cambio en una visita antigua: solo afecta a su partición fría
+                        key = partition_key(fresh.fecha_ingreso)
+                        cached = {visitor.id: visitor.version for visitor in self._cold.get(key, ())}
+                        if cached.get(fresh.id, -1) < fresh.version:
+                            self._cold.pop(key, None)
+                            self._cold_complete = False
+                        continue
+                    if current is None:
+                        self.visitors.append(fresh)
+                        self._reindex_add(fresh)
+                        added_ids.append(fresh.id)
+                    elif fresh.version <= current.version:
+                        # La marca de agua es inclusiva: lo último ya aplicado
+                        # (o escrito por esta estación) vuelve en cada consulta
+                        continue
+                    else:
+                        # Actualizar en el mismo objeto para no invalidar referencias de las vistas
+                        for key, value in fresh.to_dict().items():
+                            setattr(current, key, value)
+                        self._reindex_refresh(current)
+                        updated_ids.append(fresh.id)
+                    applied.append(fresh)
+            if applied:
+                self._snapshot.apply(applied, watermark=getattr(self.storage, "watermark", None))
+        finally:
+            self._sync_lock.release()
+
+        if added_ids:
+            self.signals.visitor_added.emit(added_ids)
+        if updated_ids:
+            self.signals.visitor_updated.emit(updated_ids)
+
+        # Las eliminaciones no dejan rastro en updated_at: si los totales no
+        # cuadran se recurre a una recarga completa
+        try:
+            remote_count = self.storage.count(self._hot_filter())
+        except VisitorStorageError:
+            remote_count = None
+        if (
+            remote_count is not None
+            and remote_count != len(self.visitors)
+            and not self._history_loading
+            and not self._has_unsaved_changes()
+        ):
+            self.load_visitors()
+        return len(added_ids) + len(updated_ids)
+
+    def sync_in_background(self) -> None:
+        """
+        Como ``sync``, en un hilo aparte, para que la consulta a MongoDB (y la
+        recarga si los totales no cuadran) no bloquee la interfaz. Los cambios
+        llegan a las vistas con las señales habituales.
+        """
+        if self._sync_lock.locked():
+            return
+        threading.Thread(target=self.sync, name="visitor-sync", daemon=True).start()
 
     def force_reload(self) -> int:
         print("Forzando recarga de visitantes...")
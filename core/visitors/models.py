@@ -1,14 +1,54 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Dict
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from .ids import new_visitor_id
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """"2025-01-31 08:15:00" -> ``datetime``; ``None`` si falta o no es válida."""
+    if not value:
+        return None
+    try:
+        # Bastante más rápido que strptime para el formato ISO de las fechas
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _intern(value):
+    # Sectores, estados y usuarios se repiten en miles de visitas
+    return sys.intern(value) if isinstance(value, str) else value
 
 
 class Visitor:
     """
     Representa a un visitante registrado en el sistema.
+
+    Usa ``__slots__`` para que cada visita cargada ocupe poco. Las fechas se
+    guardan como texto (el formato de siempre en archivos y MongoDB) y
+    ``entered_at``, ``exited_at`` y ``duration`` las interpretan una sola vez,
+    volviendo a hacerlo solo si el texto cambia.
     """
 
+    __slots__ = (
+        "id",
+        "rut",
+        "nombre_completo",
+        "fecha_ingreso",
+        "fecha_salida",
+        "acompañante",
+        "sector",
+        "estado",
+        "usuario_registrador",
+        "version",
+        # (texto, fecha) interpretados por última vez
+        "_entered_cache",
+        "_exited_cache",
+    )
+
     def __init__(
         self,
         rut: str,
@@ -23,18 +63,22 @@ class Visitor:
         self.nombre_completo = nombre_completo
         self.fecha_ingreso = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.fecha_salida = None
-        self.acompañante = acompañante
-        self.sector = sector
-        self.estado = estado
-        self.usuario_registrador = usuario_registrador
+        self.acompañante = _intern(acompañante)
+        self.sector = _intern(sector)
+        self.estado = _intern(estado)
+        self.usuario_registrador = _intern(usuario_registrador)
+        # Versión del documento en MongoDB (0 = aún no guardado allí); las
+        # escrituras solo se aplican si nadie la cambió entremedio
+        self.version = 0
+        self._entered_cache: Optional[Tuple[str, Optional[datetime]]] = None
+        self._exited_cache: Optional[Tuple[str, Optional[datetime]]] = None
 
     # ------------------------------------------------------------------
     # Serialización
     # ------------------------------------------------------------------
 
     def _generate_id(self) -> str:
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
-        return f"VIS{timestamp}"
+        return new_visitor_id()
 
     def to_dict(self) -> Dict:
         return {
@@ -47,6 +91,7 @@ class Visitor:
             "sector": self.sector,
             "estado": self.estado,
             "usuario_registrador": self.usuario_registrador,
+            "version": self.version,
         }
 
     @classmethod
@@ -62,8 +107,35 @@ class Visitor:
         visitor.id = data.get("id", visitor.id)
         visitor.fecha_ingreso = data.get("fecha_ingreso", visitor.fecha_ingreso)
         visitor.fecha_salida = data.get("fecha_salida")
+        visitor.version = data.get("version") or 0
         return visitor
 
+    # ------------------------------------------------------------------
+    # Fechas interpretadas
+    # ------------------------------------------------------------------
+
+    @property
+    def entered_at(self) -> Optional[datetime]:
+        cached = self._entered_cache
+        if cached is None or cached[0] is not self.fecha_ingreso:
+            cached = self._entered_cache = (self.fecha_ingreso, parse_timestamp(self.fecha_ingreso))
+        return cached[1]
+
+    @property
+    def exited_at(self) -> Optional[datetime]:
+        cached = self._exited_cache
+        if cached is None or cached[0] is not self.fecha_salida:
+            cached = self._exited_cache = (self.fecha_salida, parse_timestamp(self.fecha_salida))
+        return cached[1]
+
+    @property
+    def duration(self) -> Optional[timedelta]:
+        """Duración de una visita finalizada."""
+        entered_at, exited_at = self.entered_at, self.exited_at
+        if entered_at is None or exited_at is None:
+            return None
+        return exited_at - entered_at
+
     # ------------------------------------------------------------------
     # Operaciones
     # ------------------------------------------------------------------
@@ -74,5 +146,3 @@ class Visitor:
         if self.estado == "Dentro":
             self.estado = "Fuera"
             self.fecha_salida = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-
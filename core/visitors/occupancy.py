@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from .models import Visitor
+
+OccupancyListener = Callable[[Set[str]], None]
+
+
+class OccupancyRegistry:
+    """
+    Contadores por sector de visitas dentro y fuera, mantenidos con los
+    mismos eventos que ``VisitorIndex`` (alta, edición, salida, eliminación).
+
+    Se recuerda con qué sector y estado se contó cada visita para descontarla
+    aunque el formulario ya haya editado el objeto. Los suscriptores reciben
+    los sectores cuya ocupación (visitas dentro) cambió; los cambios en
+    visitas finalizadas, como el archivado en segundo plano, no notifican.
+    """
+
+    def __init__(self):
+        self._inside: Dict[str, int] = {}
+        self._outside: Dict[str, int] = {}
+        self._counted: Dict[str, Tuple[str, str]] = {}
+        self._listeners: List[OccupancyListener] = []
+
+    # ------------------------------------------------------------------
+    # Suscripción
+    # ------------------------------------------------------------------
+
+    def subscribe(self, listener: OccupancyListener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: OccupancyListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, sectors: Set[str]) -> None:
+        if not sectors:
+            return
+        for listener in list(self._listeners):
+            try:
+                listener(sectors)
+            except Exception as exc:
+                print(f"Error al notificar cambio de ocupación: {exc}")
+
+    # ------------------------------------------------------------------
+    # Mantenimiento
+    # ------------------------------------------------------------------
+
+    def rebuild(self, visitors: Iterable[Visitor]) -> None:
+        previous = dict(self._inside)
+        self._inside.clear()
+        self._outside.clear()
+        self._counted.clear()
+        for visitor in visitors:
+            self._count(visitor)
+
+        sectors = set(previous) | set(self._inside)
+        self._notify({sector for sector in sectors if previous.get(sector, 0) != self._inside.get(sector, 0)})
+
+    def add(self, visitor: Visitor) -> None:
+        self._notify(self._count(visitor))
+
+    def remove(self, visitor_id: str) -> None:
+        self._notify(self._uncount(visitor_id))
+
+    def refresh(self, visitor: Visitor) -> None:
+        """Vuelve a contar una visita cuyo estado o sector pudo cambiar."""
+        if self._counted.get(visitor.id) == (visitor.sector, visitor.estado):
+            return
+        self._notify(self._uncount(visitor.id) | self._count(visitor))
+
+    def _count(self, visitor: Visitor) -> Set[str]:
+        key = (visitor.sector, visitor.estado)
+        self._counted[visitor.id] = key
+        if visitor.estado == "Dentro":
+            self._inside[visitor.sector] = self._inside.get(visitor.sector, 0) + 1
+            return {visitor.sector}
+        self._outside[visitor.sector] = self._outside.get(visitor.sector, 0) + 1
+        return set()
+
+    def _uncount(self, visitor_id: str) -> Set[str]:
+        key = self._counted.pop(visitor_id, None)
+        if key is None:
+            return set()
+        sector, estado = key
+        counters = self._inside if estado == "Dentro" else self._outside
+        remaining = counters.get(sector, 0) - 1
+        if remaining > 0:
+            counters[sector] = remaining
+        else:
+            counters.pop(sector, None)
+        return {sector} if estado == "Dentro" else set()
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def inside(self, sector: str) -> int:
+        return self._inside.get(sector, 0)
+
+    def outside(self, sector: str) -> int:
+        return self._outside.get(sector, 0)
+
+    def total_inside(self) -> int:
+        return sum(self._inside.values())
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """``{sector: {"dentro": n, "fuera": m}}`` de las visitas cargadas."""
+        sectors = set(self._inside) | set(self._outside)
+        return {
+            sector: {"dentro": self._inside.get(sector, 0), "fuera": self._outside.get(sector, 0)}
+            for sector in sorted(sectors)
+        }
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from . import codec
+from .changes import VisitorChangeSet
+from .models import Visitor
+from .storage import BaseVisitorStorage, VisitorConflictError, VisitorStorageError
+
+OFFLINE_ENV_VAR = "VISITASEGURA_OFFLINE"
+
+# Recibe lo guardado en el remoto (con su nueva versión), los ids eliminados y
+# las visitas en conflicto
+SentCallback = Callable[[List[Visitor], List[str], Dict[str, Optional[Visitor]]], None]
+
+
+def remote_sync_enabled() -> bool:
+    """False en modo offline explícito: no hay nube a la cual reenviar cambios."""
+    return os.environ.get(OFFLINE_ENV_VAR) != "1"
+
+
+def outbox_path_for(json_filepath: str) -> str:
+    root, _ = os.path.splitext(json_filepath)
+    return f"{root}.outbox.ndjson"
+
+
+class VisitorOutbox:
+    """
+    Cola persistente (NDJSON) de cambios pendientes de enviar a MongoDB.
+
+    Cada evento es un ``upsert`` o ``delete`` identificado por ``id``, por lo
+    que reenviar un lote ya aplicado no tiene efecto. Al vaciarla, la cola se
+    congela en ``*.sending`` para que las nuevas escrituras nunca esperen a la
+    red.
+    """
+
+    BATCH_SIZE = 500
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.sending_path = f"{filepath}.sending"
+        self._lock = threading.Lock()
+        # Serializa los envíos sin bloquear a quienes encolan
+        self._drain_lock = threading.Lock()
+        # Versión con que quedó en el remoto cada visita enviada en este vaciado;
+        # los eventos encolados antes de saberla la heredan
+        self._written_versions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        total = 0
+        for path in (self.sending_path, self.filepath):
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as handle:
+                    total += sum(1 for line in handle if line.strip())
+        return total
+
+    def __bool__(self) -> bool:
+        return any(
+            os.path.exists(path) and os.path.getsize(path) > 0
+            for path in (self.sending_path, self.filepath)
+        )
+
+    def enqueue(self, changes: VisitorChangeSet) -> None:
+        lines = [
+            codec.dumps({"op": "upsert", "visitor": codec.encode_visitor(visitor)})
+            for visitor in changes.upserts
+        ]
+        lines.extend(
+            codec.dumps(
+                {"op": "delete", "id": visitor_id, "version": changes.removed_versions[visitor_id]}
+                if visitor_id in changes.removed_versions
+                else {"op": "delete", "id": visitor_id}
+            )
+            for visitor_id in changes.removed
+        )
+        if not lines:
+            return
+
+        try:
+            with self._lock:
+                with open(self.filepath, "a", encoding="utf-8") as handle:
+                    handle.write("\n".join(lines) + "\n")
+                    handle.flush()
+                    os.fsync(handle.fileno())
+        except OSError as exc:
+            raise VisitorStorageError(f"No se pudo registrar el cambio en la cola offline: {exc}") from exc
+
+    def clear(self) -> None:
+        with self._lock:
+            for path in (self.sending_path, self.filepath):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def pending(self) -> Tuple[List[Visitor], Set[str]]:
+        """Estado por enviar de cada visita: (visitas guardadas, ids eliminados)."""
+        events: "OrderedDict[str, Dict]" = OrderedDict()
+        with self._lock:
+            # Lo congelado para el envío es anterior a lo encolado después
+            for path in (self.sending_path, self.filepath):
+                if os.path.exists(path):
+                    for visitor_id, event in self._read_events(path).items():
+                        events.pop(visitor_id, None)
+                        events[visitor_id] = event
+        upserts = codec.decode_visitors(event["visitor"] for event in events.values() if event["op"] == "upsert")
+        deleted = {event["id"] for event in events.values() if event["op"] == "delete"}
+        return upserts, deleted
+
+    @staticmethod
+    def _read_events(path: str) -> "OrderedDict[str, Dict]":
+        # Solo importa el último evento de cada id
+        events: "OrderedDict[str, Dict]" = OrderedDict()
+        with open(path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    event = codec.loads(line)
+                except codec.JSONDecodeError:
+                    continue
+                visitor_id = event["visitor"]["id"] if event.get("op") == "upsert" else event.get("id")
+                events.pop(visitor_id, None)
+                events[visitor_id] = event
+        return events
+
+    def _send(self, storage: BaseVisitorStorage, events: List[Dict], on_sent: Optional[SentCallback]) -> None:
+        for start in range(0, len(events), self.BATCH_SIZE):
+            batch = events[start:start + self.BATCH_SIZE]
+            changed = codec.decode_visitors(event["visitor"] for event in batch if event["op"] == "upsert")
+            for visitor in changed:
+                # Un cambio posterior a otro de esta misma estación ya enviado
+                visitor.version = max(visitor.version, self._written_versions.get(visitor.id, 0))
+            changes = VisitorChangeSet()
+            for visitor in changed:
+                changes.record_modified(visitor)
+            for event in batch:
+                if event["op"] != "delete":
+                    continue
+                version = event.get("version")
+                if version is not None:
+                    version = max(version, self._written_versions.get(event["id"], 0))
+                changes.record_removed(event["id"], version)
+            conflicts: Dict[str, Optional[Visitor]] = {}
+            try:
+                sent = storage.apply_changes(changes)
+            except VisitorConflictError as exc:
+                # Otra estación cambió esas visitas mientras esta estaba sin
+                # conexión: prevalece lo remoto
+                print(f"Cambios sin conexión descartados por conflicto: {', '.join(exc.conflicts)}")
+                conflicts = exc.conflicts
+                sent = True
+            if not sent:
+                raise VisitorStorageError("El almacenamiento remoto rechazó el lote de cambios")
+
+            saved = [visitor for visitor in changed if visitor.id not in conflicts]
+            deleted = [visitor_id for visitor_id in changes.removed if visitor_id not in conflicts]
+            for visitor in saved:
+                self._written_versions[visitor.id] = visitor.version
+            if on_sent is not None:
+                on_sent(saved, deleted, conflicts)
+
+    def drain(self, storage: BaseVisitorStorage, on_sent: Optional[SentCallback] = None) -> int:
+        """
+        Envía todos los cambios encolados a ``storage`` en lotes. Si falla, los
+        cambios siguen en disco y se reenvían en el próximo intento. Tras cada
+        lote, ``on_sent`` recibe lo guardado, lo eliminado y lo descartado
+        por conflicto.
+        """
+        sent = 0
+        with self._drain_lock:
+            while True:
+                with self._lock:
+                    if not os.path.exists(self.sending_path):
+                        if not os.path.exists(self.filepath):
+                            self._written_versions.clear()
+                            return sent
+                        os.replace(self.filepath, self.sending_path)
+
+                events = list(self._read_events(self.sending_path).values())
+                self._send(storage, events, on_sent)
+                sent += len(events)
+                os.remove(self.sending_path)
+
+
+class OutboxReplayer(threading.Thread):
+    """
+    Reintenta en segundo plano, con espera exponencial, reconectar con el
+    almacenamiento remoto y vaciar la cola. Al lograrlo entrega el nuevo
+    almacenamiento a ``on_restored`` y termina. Con ``immediate`` el primer
+    intento no espera (puesta al día del arranque).
+    """
+
+    def __init__(
+        self,
+        outbox: VisitorOutbox,
+        storage_factory: Callable[[], BaseVisitorStorage],
+        on_restored: Callable[[BaseVisitorStorage], None],
+        initial_delay: float = 5.0,
+        max_delay: float = 300.0,
+        on_sent: Optional[SentCallback] = None,
+        immediate: bool = False,
+    ):
+        super().__init__(name="visitor-outbox-replayer", daemon=True)
+        self.outbox = outbox
+        self.storage_factory = storage_factory
+        self.on_restored = on_restored
+        self.on_sent = on_sent
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.immediate = immediate
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        delay = self.initial_delay
+        wait = 0.0 if self.immediate else delay
+        while not self._stop_event.wait(wait):
+            storage: Optional[BaseVisitorStorage] = None
+            try:
+                storage = self.storage_factory()
+                sent = self.outbox.drain(storage, self.on_sent)
+            except (VisitorStorageError, OSError) as exc:
+                if wait:
+                    delay = min(delay * 2, self.max_delay)
+                wait = delay
+                print(f"Reintento de sincronización con MongoDB fallido ({exc}); próximo en {delay:.0f}s")
+                continue
+
+            if sent:
+                print(f"Sincronizados {sent} cambios pendientes con MongoDB")
+            self.on_restored(storage)
+            return
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List, Optional
+
+# El historial se particiona por mes de ingreso. Como ``fecha_ingreso`` se
+# guarda como "%Y-%m-%d %H:%M:%S", cada partición es un rango contiguo del
+# índice sobre ``fecha_ingreso`` y su clave son los 7 primeros caracteres.
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def partition_key(fecha: str) -> str:
+    """"2025-03-14 10:00:00" -> "2025-03"."""
+    return fecha[:7]
+
+
+def partition_start(key: str) -> str:
+    return f"{key}-01 00:00:00"
+
+
+def next_partition(key: str) -> str:
+    year, month = int(key[:4]), int(key[5:7])
+    if month == 12:
+        return f"{year + 1:04d}-01"
+    return f"{year:04d}-{month + 1:02d}"
+
+
+def partitions_between(since: str, until: str) -> List[str]:
+    """Claves de mes que intersectan el rango [since, until)."""
+    keys: List[str] = []
+    key = partition_key(since)
+    last = partition_key(until)
+    while key <= last:
+        if partition_start(key) < until:
+            keys.append(key)
+        key = next_partition(key)
+    return keys
+
+
+def current_partition_start(now: Optional[datetime] = None) -> str:
+    """Inicio del mes en curso, límite inferior de la partición caliente."""
+    now = now or datetime.now()
+    return partition_start(now.strftime("%Y-%m"))
+
+
+def to_timestamp(value) -> Optional[str]:
+    """Acepta ``datetime`` o texto y devuelve el formato almacenado."""
+    if value is None or isinstance(value, str):
+        return value
+    return value.strftime(DATE_FORMAT)
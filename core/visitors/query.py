@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Subconjunto de la sintaxis de filtros de MongoDB que entienden todos los
+# almacenamientos. Los locales lo evalúan en Python; MongoDB lo recibe con las
+# fechas convertidas a fechas nativas (ver ``codec.mongo_filter``).
+#
+#   {"estado": "Dentro", "sector": {"$in": ["CITT", "Auditorio"]}}
+#   {"fecha_ingreso": {"$gte": "2025-01-01 00:00:00"}}
+#   {"$or": [{"rut": {"$regex": "^12"}}, {"nombre_completo": {"$regex": "ana", "$options": "i"}}]}
+
+VisitorFilter = Dict[str, Any]
+SortSpec = Sequence[Tuple[str, int]]
+OrderBy = Union[str, Sequence[Union[str, Tuple[str, int]]]]
+Projection = Union[Iterable[str], Dict[str, int]]
+
+ASCENDING = 1
+DESCENDING = -1
+
+COMPARISON_OPERATORS = ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin", "$exists")
+
+
+class UnsupportedQueryError(ValueError):
+    """El filtro usa un operador que no forma parte del subconjunto soportado."""
+
+
+def _matches_condition(value: Any, condition: Any) -> bool:
+    if not isinstance(condition, dict) or not any(key.startswith("$") for key in condition):
+        return value == condition
+
+    for operator, operand in condition.items():
+        if operator == "$options":
+            continue
+        if operator == "$eq":
+            ok = value == operand
+        elif operator == "$ne":
+            ok = value != operand
+        elif operator in ("$gt", "$gte", "$lt", "$lte"):
+            if value is None:
+                return False
+            try:
+                if operator == "$gt":
+                    ok = value > operand
+                elif operator == "$gte":
+                    ok = value >= operand
+                elif operator == "$lt":
+                    ok = value < operand
+                else:
+                    ok = value <= operand
+            except TypeError:
+                return False
+        elif operator == "$in":
+            ok = value in operand
+        elif operator == "$nin":
+            ok = value not in operand
+        elif operator == "$exists":
+            ok = (value is not None) == bool(operand)
+        elif operator == "$regex":
+            flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+            ok = value is not None and re.search(operand, str(value), flags) is not None
+        else:
+            raise UnsupportedQueryError(f"Operador no soportado: {operator}")
+        if not ok:
+            return False
+    return True
+
+
+def matches(document: Dict[str, Any], filter: Optional[VisitorFilter]) -> bool:
+    """Indica si ``document`` cumple ``filter``."""
+    if not filter:
+        return True
+
+    for key, condition in filter.items():
+        if key == "$or":
+            if not any(matches(document, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, sub) for sub in condition):
+                return False
+        elif key.startswith("$"):
+            raise UnsupportedQueryError(f"Operador no soportado: {key}")
+        elif not _matches_condition(document.get(key), condition):
+            return False
+    return True
+
+
+def _sort_in_place(items: List[Any], sort: Optional[SortSpec], get_value: Callable[[Any, str], Any]) -> None:
+    def sort_key(field):
+        # None se ordena primero en ascendente, como en MongoDB
+        def key(item):
+            value = get_value(item, field)
+            return (value is not None, value if value is not None else 0)
+        return key
+
+    for field, direction in reversed(list(sort or ())):
+        items.sort(key=sort_key(field), reverse=direction == DESCENDING)
+
+
+def sort_documents(documents: List[Dict[str, Any]], sort: Optional[SortSpec]) -> None:
+    """Ordena en el lugar aplicando las claves de menor a mayor prioridad."""
+    _sort_in_place(documents, sort, lambda document, field: document.get(field))
+
+
+def sort_visitors(visitors: List[Any], sort: Optional[SortSpec]) -> None:
+    """Como ``sort_documents``, pero sobre objetos ``Visitor``."""
+    _sort_in_place(visitors, sort, lambda visitor, field: getattr(visitor, field, None))
+
+
+def parse_order_by(order_by: Optional[OrderBy]) -> List[Tuple[str, int]]:
+    """"-fecha_ingreso" o ["sector", "-fecha_ingreso"] -> [(campo, dirección), ...]."""
+    if not order_by:
+        return []
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    sort: List[Tuple[str, int]] = []
+    for item in order_by:
+        if isinstance(item, str):
+            if item.startswith("-"):
+                sort.append((item[1:], DESCENDING))
+            else:
+                sort.append((item.lstrip("+"), ASCENDING))
+        else:
+            field, direction = item
+            sort.append((field, direction))
+    return sort
+
+
+def projection_fields(projection: Optional[Projection]) -> Optional[List[str]]:
+    """Normaliza una proyección (lista de campos o ``{campo: 1}``) a lista de campos."""
+    if projection is None:
+        return None
+    if isinstance(projection, dict):
+        return [field for field, include in projection.items() if include]
+    return list(projection)
+
+
+def project(document: Dict[str, Any], projection: Optional[Projection]) -> Dict[str, Any]:
+    """Restringe ``document`` a los campos de ``projection`` (siempre incluye ``id``)."""
+    fields = projection_fields(projection)
+    if fields is None:
+        return document
+    result = {"id": document.get("id")}
+    for field in fields:
+        result[field] = document.get(field)
+    return result
+
+
+def run_query(
+    documents: Iterable[Dict[str, Any]],
+    filter: Optional[VisitorFilter] = None,
+    sort: Optional[SortSpec] = None,
+    limit: int = 0,
+    skip: int = 0,
+) -> List[Dict[str, Any]]:
+    """Evalúa filtro, orden y paginación sobre documentos en memoria."""
+    selected = [document for document in documents if matches(document, filter)]
+    sort_documents(selected, sort)
+    if skip:
+        selected = selected[skip:]
+    if limit:
+        selected = selected[:limit]
+    return selected
+
+
+class VisitorPage:
+    """
+    Página de resultados de ``VisitorManager.query``: los visitantes de la
+    página, el total de coincidencias y su desglose por estado y sector.
+    """
+
+    def __init__(
+        self,
+        items: List[Any],
+        total: int,
+        offset: int = 0,
+        limit: int = 0,
+        by_estado: Optional[Dict[str, int]] = None,
+        by_sector: Optional[Dict[str, int]] = None,
+    ):
+        self.items = items
+        self.total = total
+        self.offset = offset
+        self.limit = limit
+        self.by_estado = by_estado or {}
+        self.by_sector = by_sector or {}
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @property
+    def page_number(self) -> int:
+        """Número de página, desde 1."""
+        return self.offset // self.limit + 1 if self.limit else 1
+
+    @property
+    def page_count(self) -> int:
+        if not self.limit:
+            return 1
+        return max(1, -(-self.total // self.limit))
+
+    @property
+    def has_previous(self) -> bool:
+        return self.offset > 0
+
+    @property
+    def has_next(self) -> bool:
+        return bool(self.limit) and self.offset + self.limit < self.total
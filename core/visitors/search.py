@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .models import Visitor
+
+# Búsqueda por texto sobre RUT, nombre, acompañante y sector. El texto se
+# compara sin mayúsculas ni tildes ("jose" encuentra "José") y cada palabra
+# de la búsqueda debe aparecer dentro de alguna palabra de esos campos. Los
+# RUT se comparan por sus dígitos, así que da igual si se escriben con o sin
+# puntos y guion.
+
+GRAM_SIZE = 3
+
+_NOT_RUT_CHAR = re.compile(r"[^0-9k]")
+
+
+def fold(text: Optional[str]) -> str:
+    """Minúsculas y sin tildes: "Peñalolén" -> "penalolen"."""
+    if not text:
+        return ""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def rut_digits(text: Optional[str]) -> str:
+    """"12.345.678-K" -> "12345678k"."""
+    return _NOT_RUT_CHAR.sub("", (text or "").lower())
+
+
+def _looks_like_rut(token: str) -> bool:
+    return any(char.isdigit() for char in token) and all(char.isdigit() or char in ".-k" for char in token)
+
+
+def _tokens(query: str) -> List[str]:
+    return fold(query).split()
+
+
+def _grams(text: str) -> Set[str]:
+    return {text[start:start + GRAM_SIZE] for start in range(len(text) - GRAM_SIZE + 1)}
+
+
+@lru_cache(maxsize=65536)
+def _fold_word(word: str) -> str:
+    # Los nombres se repiten mucho entre visitas
+    return fold(word)
+
+
+def _words(visitor: Visitor) -> Tuple[str, ...]:
+    text = " ".join((visitor.nombre_completo or "", visitor.acompañante or "", visitor.sector or ""))
+    return tuple({_fold_word(word) for word in text.split()})
+
+
+def _token_matches(token: str, words: Iterable[str], digits: str) -> bool:
+    if any(token in word for word in words):
+        return True
+    if _looks_like_rut(token):
+        token_digits = rut_digits(token)
+        return bool(token_digits) and token_digits in digits
+    return False
+
+
+def matches_text(visitor: Visitor, query: str) -> bool:
+    """Evalúa la búsqueda sobre un visitante que no está en el índice."""
+    words = _words(visitor)
+    digits = rut_digits(visitor.rut)
+    return all(_token_matches(token, words, digits) for token in _tokens(query))
+
+
+class VisitorSearchIndex:
+    """
+    Índice de búsqueda por palabras normalizadas y dígitos de RUT.
+
+    Cada palabra distinta (nombres, acompañantes, sectores) apunta a los
+    visitantes que la contienen, y un índice de trigramas sobre ese
+    vocabulario —mucho más chico que el número de visitas— encuentra las
+    palabras que contienen lo buscado. Se mantiene con los mismos eventos que
+    ``VisitorIndex``; las altas quedan pendientes, para que cargar visitantes
+    no pague el índice, y se indexan por partes con ``index_pending`` o, a
+    más tardar, en la siguiente búsqueda.
+    """
+
+    def __init__(self):
+        self._by_word: Dict[str, Set[str]] = {}
+        self._word_grams: Dict[str, Set[str]] = {}
+        self._by_digits: Dict[str, Set[str]] = {}
+        # Palabras y dígitos con que se indexó cada visitante
+        self._indexed: Dict[str, Tuple[Tuple[str, ...], str]] = {}
+        # Altas aún no indexadas
+        self._unindexed: Dict[str, Visitor] = {}
+
+    def __contains__(self, visitor_id: str) -> bool:
+        return visitor_id in self._indexed or visitor_id in self._unindexed
+
+    def rebuild(self, visitors: Iterable[Visitor]) -> None:
+        self._by_word.clear()
+        self._word_grams.clear()
+        self._by_digits.clear()
+        self._indexed.clear()
+        self._unindexed = {visitor.id: visitor for visitor in visitors}
+
+    def add(self, visitor: Visitor) -> None:
+        self._unindexed[visitor.id] = visitor
+
+    def remove(self, visitor_id: str) -> None:
+        self._unindexed.pop(visitor_id, None)
+        entry = self._indexed.pop(visitor_id, None)
+        if entry is None:
+            return
+        words, digits = entry
+        for word in words:
+            bucket = self._by_word.get(word)
+            if bucket is not None:
+                bucket.discard(visitor_id)
+                if not bucket:
+                    del self._by_word[word]
+                    self._forget_word(word)
+        bucket = self._by_digits.get(digits)
+        if bucket is not None:
+            bucket.discard(visitor_id)
+            if not bucket:
+                del self._by_digits[digits]
+
+    def refresh(self, visitor: Visitor) -> None:
+        """Reindexa un visitante cuyos campos de texto pudieron cambiar."""
+        if visitor.id in self._unindexed:
+            return
+        if self._indexed.get(visitor.id) == (_words(visitor), rut_digits(visitor.rut)):
+            return
+        self.remove(visitor.id)
+        self.add(visitor)
+
+    def index_pending(self, limit: int = 0) -> bool:
+        """Indexa hasta ``limit`` altas pendientes (todas con 0); indica si quedan más."""
+        if limit and len(self._unindexed) > limit:
+            batch = [self._unindexed.pop(visitor_id) for visitor_id in list(islice(self._unindexed, limit))]
+        else:
+            batch = list(self._unindexed.values())
+            self._unindexed = {}
+        for visitor in batch:
+            words = _words(visitor)
+            digits = rut_digits(visitor.rut)
+            self._indexed[visitor.id] = (words, digits)
+            for word in words:
+                bucket = self._by_word.get(word)
+                if bucket is None:
+                    bucket = self._by_word[word] = set()
+                    for gram in _grams(word):
+                        self._word_grams.setdefault(gram, set()).add(word)
+                bucket.add(visitor.id)
+            self._by_digits.setdefault(digits, set()).add(visitor.id)
+        return bool(self._unindexed)
+
+    def _forget_word(self, word: str) -> None:
+        for gram in _grams(word):
+            bucket = self._word_grams.get(gram)
+            if bucket is not None:
+                bucket.discard(word)
+                if not bucket:
+                    del self._word_grams[gram]
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def _words_containing(self, token: str) -> List[str]:
+        if len(token) < GRAM_SIZE:
+            # Palabra corta: se recorre el vocabulario completo
+            return [word for word in self._by_word if token in word]
+        postings = sorted((self._word_grams.get(gram, set()) for gram in _grams(token)), key=len)
+        candidates = set(postings[0])
+        for bucket in postings[1:]:
+            candidates &= bucket
+        return [word for word in candidates if token in word]
+
+    def _matching(self, token: str) -> Set[str]:
+        ids: Set[str] = set()
+        for word in self._words_containing(token):
+            ids |= self._by_word[word]
+        if _looks_like_rut(token):
+            token_digits = rut_digits(token)
+            exact = self._by_digits.get(token_digits)
+            if exact is not None:
+                ids |= exact
+            elif token_digits:
+                for digits, bucket in self._by_digits.items():
+                    if token_digits in digits:
+                        ids |= bucket
+        return ids
+
+    def search(self, query: str) -> Set[str]:
+        """Ids de los visitantes indexados que cumplen la búsqueda."""
+        if self._unindexed:
+            self.index_pending()
+
+        result: Optional[Set[str]] = None
+        # Las palabras más largas suelen ser más selectivas
+        for token in sorted(_tokens(query), key=len, reverse=True):
+            found = self._matching(token)
+            result = found if result is None else result & found
+            if not result:
+                break
+        return set(self._indexed) if result is None else result
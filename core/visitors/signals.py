@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from typing import Callable, List
+
+try:
+    from PySide6.QtCore import QObject, Signal
+except ImportError:
+    # Scripts sin interfaz (p. ej. generar_datos_prueba.py): mismas señales,
+    # entregadas de forma directa
+    QObject = object  # type: ignore
+
+    class _BoundSignal:
+        def __init__(self):
+            self._slots: List[Callable] = []
+
+        def connect(self, slot: Callable) -> None:
+            self._slots.append(slot)
+
+        def disconnect(self, slot: Callable | None = None) -> None:
+            if slot is None:
+                self._slots.clear()
+            elif slot in self._slots:
+                self._slots.remove(slot)
+
+        def emit(self, *args) -> None:
+            for slot in list(self._slots):
+                slot(*args)
+
+    class Signal:  # type: ignore
+        def __init__(self, *types):
+            self._name = ""
+
+        def __set_name__(self, owner, name):
+            self._name = f"_signal_{name}"
+
+        def __get__(self, instance, owner):
+            if instance is None:
+                return self
+            bound = instance.__dict__.get(self._name)
+            if bound is None:
+                bound = instance.__dict__[self._name] = _BoundSignal()
+            return bound
+
+
+class VisitorSignals(QObject):
+    """
+    Notificaciones de cambios en los visitantes cargados por ``VisitorManager``.
+
+    Las señales de visitas llevan la lista de ids afectados. Pueden emitirse
+    desde hilos en segundo plano (guardado, sincronización, archivado); las
+    conexiones a métodos de widgets se entregan en el hilo de la interfaz.
+    """
+
+    visitor_added = Signal(list)
+    visitor_updated = Signal(list)
+    visitor_removed = Signal(list)
+    # La lista en memoria se reemplazó completa
+    dataset_reloaded = Signal()
+    # Sectores cuya cantidad de visitas dentro cambió
+    occupancy_changed = Signal(list)
+    # Carga en segundo plano del resto del mes (visitas cargadas, total o -1)
+    history_progress = Signal(int, int)
+    history_loaded = Signal()
+    # Resultado de request_report: (desde, visitas del rango, ingresos por día)
+    report_ready = Signal(object, object, object)
+    # Resultado de las escrituras en segundo plano (ids, mensaje de error)
+    changes_saved = Signal(list)
+    save_failed = Signal(list, str)
+    # Cambios descartados porque otra estación modificó antes esas visitas
+    save_conflict = Signal(list)
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from . import codec
+from .models import Visitor
+
+
+def snapshot_path_for(json_filepath: str) -> str:
+    root, _ = os.path.splitext(json_filepath)
+    return f"{root}.cache.db"
+
+
+class VisitorSnapshot:
+    """
+    Copia local (SQLite) de las visitas de MongoDB que había en memoria,
+    junto con la marca de agua de sincronización a la que corresponde.
+
+    Permite arrancar leyendo del disco y pedir a MongoDB solo lo modificado
+    después. No es un respaldo: si se pierde o se corrompe, la aplicación
+    vuelve a descargar la partición caliente como antes. Solo se considera
+    válida después de un ``replace`` completo; ``apply`` la mantiene al día.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS visitantes (id TEXT PRIMARY KEY, documento TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT)",
+    )
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.filepath, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            with self._conn:
+                for statement in self._SCHEMA:
+                    self._conn.execute(statement)
+        return self._conn
+
+    @staticmethod
+    def _encode(visitor: Visitor) -> Tuple[str, str]:
+        return visitor.id, codec.dumps(codec.encode_visitor(visitor))
+
+    def _watermark(self, conn: sqlite3.Connection) -> Optional[datetime]:
+        row = conn.execute("SELECT valor FROM meta WHERE clave = 'watermark'").fetchone()
+        return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+    def load(self) -> Optional[Tuple[List[Visitor], datetime]]:
+        """Visitas y marca de agua guardadas, o ``None`` si no hay copia válida."""
+        if not os.path.exists(self.filepath):
+            return None
+        try:
+            with self._lock:
+                conn = self._connection()
+                watermark = self._watermark(conn)
+                if watermark is None:
+                    return None
+                rows = conn.execute("SELECT documento FROM visitantes").fetchall()
+            return codec.decode_visitors(codec.loads(row[0]) for row in rows), watermark
+        except (sqlite3.Error, ValueError) as exc:
+            print(f"Copia local de visitantes inutilizable ({exc}); se descarga desde MongoDB")
+            return None
+
+    def replace(self, visitors: Iterable[Visitor], watermark: Optional[datetime]) -> None:
+        """Reemplaza la copia completa; sin marca de agua queda invalidada."""
+        rows = [self._encode(visitor) for visitor in visitors]
+        try:
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    conn.execute("DELETE FROM visitantes")
+                    conn.executemany("INSERT INTO visitantes (id, documento) VALUES (?, ?)", rows)
+                    self._set_watermark(conn, watermark)
+        except sqlite3.Error as exc:
+            print(f"Error al guardar la copia local de visitantes: {exc}")
+
+    def apply(
+        self,
+        changed: Iterable[Visitor] = (),
+        deleted_ids: Iterable[str] = (),
+        watermark: Optional[datetime] = None,
+    ) -> None:
+        """Aplica cambios sobre una copia válida y, si se indica, avanza su marca de agua."""
+        rows = [self._encode(visitor) for visitor in changed]
+        deleted = [(visitor_id,) for visitor_id in deleted_ids]
+        if not rows and not deleted and watermark is None:
+            return
+        try:
+            with self._lock:
+                if not os.path.exists(self.filepath):
+                    return
+                conn = self._connection()
+                if self._watermark(conn) is None:
+                    # Copia incompleta: no vale la pena mantenerla
+                    return
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO visitantes (id, documento) VALUES (?, ?)", rows)
+                    conn.executemany("DELETE FROM visitantes WHERE id = ?", deleted)
+                    if watermark is not None:
+                        self._set_watermark(conn, watermark)
+        except sqlite3.Error as exc:
+            print(f"Error al actualizar la copia local de visitantes: {exc}")
+
+    def invalidate(self) -> None:
+        self.replace((), None)
+
+    @staticmethod
+    def _set_watermark(conn: sqlite3.Connection, watermark: Optional[datetime]) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (clave, valor) VALUES ('watermark', ?)",
+            (watermark.isoformat() if watermark is not None else None,),
+        )
@@ -1,39 +1,177 @@
 from __future__ import annotations
 
-import json
 import os
+import sqlite3
+import tempfile
+import threading
 from abc import ABC, abstractmethod
-from typing import Iterable, List
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
 
+from . import codec
+from .changes import VisitorChangeSet
 from .models import Visitor
+from .query import (
+    COMPARISON_OPERATORS,
+    Projection,
+    SortSpec,
+    UnsupportedQueryError,
+    VisitorFilter,
+    project,
+    projection_fields,
+    run_query,
+)
+
+
+LOCAL_STORAGE_ENV_VAR = "VISITASEGURA_LOCAL_STORAGE"
+
+# Documentos por lote al convertir a fechas nativas las fechas guardadas como texto
+DATE_MIGRATION_BATCH_SIZE = 500
+
+# Documentos con alguna fecha aún guardada como texto
+LEGACY_DATES_FILTER = {"$or": [{field: {"$type": "string"}} for field in codec.DATE_FIELDS]}
 
 
 class VisitorStorageError(RuntimeError):
     """Excepción base para problemas de almacenamiento de visitantes."""
 
 
+class VisitorConflictError(VisitorStorageError):
+    """
+    Otra estación modificó o eliminó algunas visitas desde que se leyeron.
+    El resto de los cambios del lote sí se guardó; ``conflicts`` trae el estado
+    actual de cada visita en conflicto (``None`` si ya no existe).
+    """
+
+    def __init__(self, conflicts: Dict[str, Optional[Visitor]]):
+        super().__init__(f"{len(conflicts)} visita(s) modificadas en otra estación")
+        self.conflicts = conflicts
+
+
 class BaseVisitorStorage(ABC):
     """Interfaz base para almacenar y recuperar visitantes."""
 
+    # Los almacenamientos locales sirven de respaldo cuando falla el remoto
+    is_local: bool = False
+    # True si ``query`` se resuelve en el propio almacenamiento (con índices)
+    native_query: bool = False
+
     @abstractmethod
     def load(self) -> List[Visitor]:
         raise NotImplementedError
 
     @abstractmethod
     def save(self, visitors: Iterable[Visitor]) -> bool:
+        """
+        Reescribe el almacenamiento completo. Reservado para migraciones
+        explícitas; las operaciones normales usan ``save_changes``.
+        """
         raise NotImplementedError
 
+    @abstractmethod
+    def save_changes(
+        self,
+        changed: Iterable[Visitor] = (),
+        deleted_ids: Iterable[str] = (),
+    ) -> bool:
+        """Persiste solo los visitantes modificados y eliminados (por ``id``)."""
+        raise NotImplementedError
+
+    def query(
+        self,
+        filter: Optional[VisitorFilter] = None,
+        sort: Optional[SortSpec] = None,
+        limit: int = 0,
+        skip: int = 0,
+        projection: Optional[Projection] = None,
+    ) -> List:
+        """
+        Devuelve los visitantes que cumplen ``filter`` (sintaxis de
+        ``core.visitors.query``), ordenados y paginados. Con ``projection``
+        se devuelven diccionarios con solo esos campos en lugar de ``Visitor``.
+
+        La implementación base filtra en memoria; cada backend la reemplaza
+        por una consulta nativa cuando puede.
+        """
+        try:
+            documents = run_query(codec.encode_visitors(self.load()), filter, sort, limit, skip)
+        except UnsupportedQueryError as exc:
+            raise VisitorStorageError(str(exc)) from exc
+        return _query_result(documents, projection)
+
+    def load_matching(self, filter: Optional[VisitorFilter] = None) -> List[Visitor]:
+        """
+        Como ``query``, para la carga inicial: los almacenamientos con
+        sincronización incremental fijan además desde dónde la retoma
+        ``load_changes``, para no volver a descargar lo recién leído.
+        """
+        return self.query(filter)
+
+    def load_changes(self) -> Optional[List[Visitor]]:
+        """
+        Devuelve los visitantes modificados desde la última marca de agua y la
+        avanza. ``None`` indica que el almacenamiento no admite sincronización
+        incremental (los locales solo cambian a través de este proceso).
+        """
+        return None
+
+    def count(self, filter: Optional[VisitorFilter] = None) -> Optional[int]:
+        """
+        Cantidad de visitantes almacenados (que cumplen ``filter``), si puede
+        obtenerse sin leer los documentos. ``None`` si no es así.
+        """
+        return None
+
+    def count_by_day(self, since: Optional[str] = None, until: Optional[str] = None) -> Optional[Dict[str, int]]:
+        """
+        Ingresos por día ("YYYY-MM-DD" -> cantidad) con ``since <= fecha_ingreso < until``,
+        si el almacenamiento puede agruparlos por sí mismo. ``None`` si no es así.
+        """
+        return None
+
+    def apply_changes(self, changes: VisitorChangeSet) -> bool:
+        """Persiste un conjunto de cambios acumulado por ``VisitorManager``."""
+        if not changes:
+            return True
+        return self.save_changes(changes.upserts, changes.removed)
+
     @abstractmethod
     def delete_all(self) -> bool:
         raise NotImplementedError
 
 
+def _query_result(documents: Iterable[Dict], projection: Optional[Projection]) -> List:
+    if projection is None:
+        return codec.decode_visitors(documents)
+    return [project(document, projection) for document in documents]
+
+
+def _atomic_write_json(filepath: str, payload, indent: bool = False) -> None:
+    """Escribe JSON en un archivo temporal y lo renombra sobre el destino."""
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(prefix=".visitors-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(codec.dumps(payload, indent=indent))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 # ---------------------------------------------------------------------------
 # Almacenamiento JSON
 # ---------------------------------------------------------------------------
 
 
 class JsonVisitorStorage(BaseVisitorStorage):
+    is_local = True
+
     def __init__(self, filepath: str):
         self.filepath = filepath
 
@@ -42,22 +180,35 @@ class JsonVisitorStorage(BaseVisitorStorage):
             return []
 
         try:
-            with open(self.filepath, "r", encoding="utf-8") as handle:
-                data = json.load(handle)
-        except (json.JSONDecodeError, FileNotFoundError):
+            with open(self.filepath, "rb") as handle:
+                data = codec.loads(handle.read())
+        except (codec.JSONDecodeError, FileNotFoundError):
             return []
 
-        return [Visitor.from_dict(item) for item in data]
+        return codec.decode_visitors(data)
 
     def save(self, visitors: Iterable[Visitor]) -> bool:
-        payload = [visitor.to_dict() for visitor in visitors]
+        payload = codec.encode_visitors(visitors)
         try:
-            with open(self.filepath, "w", encoding="utf-8") as handle:
-                json.dump(payload, handle, indent=2, ensure_ascii=False)
+            _atomic_write_json(self.filepath, payload, indent=True)
             return True
         except OSError as exc:
             raise VisitorStorageError(f"Error al guardar visitantes en JSON: {exc}") from exc
 
+    def save_changes(
+        self,
+        changed: Iterable[Visitor] = (),
+        deleted_ids: Iterable[str] = (),
+    ) -> bool:
+        # El formato JSON no permite escrituras parciales: se combina con el
+        # contenido actual del archivo y se reescribe.
+        visitors = {visitor.id: visitor for visitor in self.load()}
+        for visitor in changed:
+            visitors[visitor.id] = visitor
+        for visitor_id in deleted_ids:
+            visitors.pop(visitor_id, None)
+        return self.save(visitors.values())
+
     def delete_all(self) -> bool:
         try:
             if os.path.exists(self.filepath):
@@ -67,15 +218,423 @@ class JsonVisitorStorage(BaseVisitorStorage):
             raise VisitorStorageError(f"No se pudo eliminar el archivo JSON: {exc}") from exc
 
 
+# ---------------------------------------------------------------------------
+# Almacenamiento por bitácora (snapshot + NDJSON)
+# ---------------------------------------------------------------------------
+
+
+class JournalVisitorStorage(BaseVisitorStorage):
+    """
+    Guarda cada cambio como una línea NDJSON al final de una bitácora y la
+    compacta periódicamente, en segundo plano, sobre un snapshot JSON.
+
+    El snapshot conserva el formato de ``visitors.json``; al cargar se lee
+    el snapshot y se reproducen los eventos de la bitácora en orden.
+    """
+
+    is_local = True
+    COMPACT_THRESHOLD = 500
+
+    def __init__(self, filepath: str, compact_threshold: int | None = None):
+        self.filepath = filepath
+        root, _ = os.path.splitext(filepath)
+        self.journal_path = f"{root}.journal.ndjson"
+        # Bitácora congelada mientras se compacta; se reproduce si quedó a medias
+        self.compacting_path = f"{root}.journal.compacting"
+        self.compact_threshold = compact_threshold or self.COMPACT_THRESHOLD
+
+        self._lock = threading.RLock()
+        self._compaction: threading.Thread | None = None
+        self._journal_entries = 0
+        # Cambia con cada reescritura completa para descartar compactaciones obsoletas
+        self._generation = 0
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def _read_snapshot(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.filepath):
+            return {}
+        try:
+            with open(self.filepath, "rb") as handle:
+                data = codec.loads(handle.read())
+        except (codec.JSONDecodeError, FileNotFoundError):
+            return {}
+        return {item.get("id"): item for item in data}
+
+    @staticmethod
+    def _replay(path: str, documents: Dict[str, Dict]) -> int:
+        if not os.path.exists(path):
+            return 0
+
+        applied = 0
+        with open(path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    event = codec.loads(line)
+                except codec.JSONDecodeError:
+                    # Última línea truncada por un corte de energía: se ignora
+                    continue
+
+                if event.get("op") == "upsert":
+                    document = event["visitor"]
+                    documents[document["id"]] = document
+                elif event.get("op") == "delete":
+                    documents.pop(event["id"], None)
+                applied += 1
+        return applied
+
+    def _repair_journal_tail(self) -> None:
+        # Tras un corte a mitad de escritura, cerrar la línea incompleta para
+        # que el siguiente evento no quede pegado a ella
+        try:
+            with open(self.journal_path, "rb+") as handle:
+                handle.seek(0, os.SEEK_END)
+                if handle.tell() == 0:
+                    return
+                handle.seek(-1, os.SEEK_END)
+                if handle.read(1) != b"\n":
+                    handle.write(b"\n")
+        except OSError:
+            pass
+
+    def _read_state(self) -> Dict[str, Dict]:
+        self._repair_journal_tail()
+        documents = self._read_snapshot()
+        self._replay(self.compacting_path, documents)
+        self._journal_entries = self._replay(self.journal_path, documents)
+        return documents
+
+    def load(self) -> List[Visitor]:
+        with self._lock:
+            documents = self._read_state()
+        self._maybe_compact()
+        return codec.decode_visitors(documents.values())
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def save_changes(
+        self,
+        changed: Iterable[Visitor] = (),
+        deleted_ids: Iterable[str] = (),
+    ) -> bool:
+        lines = [codec.dumps({"op": "upsert", "visitor": codec.encode_visitor(visitor)}) for visitor in changed]
+        lines.extend(codec.dumps({"op": "delete", "id": visitor_id}) for visitor_id in deleted_ids)
+        if not lines:
+            return True
+
+        try:
+            with self._lock:
+                with open(self.journal_path, "a", encoding="utf-8") as handle:
+                    handle.write("\n".join(lines) + "\n")
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                self._journal_entries += len(lines)
+        except OSError as exc:
+            raise VisitorStorageError(f"Error al escribir la bitácora de visitantes: {exc}") from exc
+
+        self._maybe_compact()
+        return True
+
+    def save(self, visitors: Iterable[Visitor]) -> bool:
+        payload = codec.encode_visitors(visitors)
+        try:
+            with self._lock:
+                _atomic_write_json(self.filepath, payload)
+                self._generation += 1
+                self._remove(self.journal_path)
+                self._remove(self.compacting_path)
+                self._journal_entries = 0
+            return True
+        except OSError as exc:
+            raise VisitorStorageError(f"Error al guardar el snapshot de visitantes: {exc}") from exc
+
+    def delete_all(self) -> bool:
+        try:
+            with self._lock:
+                for path in (self.filepath, self.journal_path, self.compacting_path):
+                    self._remove(path)
+                self._generation += 1
+                self._journal_entries = 0
+            return True
+        except OSError as exc:
+            raise VisitorStorageError(f"No se pudieron eliminar los archivos de visitantes: {exc}") from exc
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+
+    # ------------------------------------------------------------------
+    # Compactación
+    # ------------------------------------------------------------------
+
+    def _maybe_compact(self) -> None:
+        with self._lock:
+            if self._journal_entries < self.compact_threshold:
+                return
+            if self._compaction is not None and self._compaction.is_alive():
+                return
+            self._compaction = threading.Thread(
+                target=self.compact, name="visitor-journal-compaction", daemon=True
+            )
+            self._compaction.start()
+
+    def compact(self) -> None:
+        """Integra la bitácora en el snapshot mediante escritura atómica."""
+        try:
+            with self._lock:
+                generation = self._generation
+                if os.path.exists(self.journal_path) and not os.path.exists(self.compacting_path):
+                    # Las escrituras nuevas continúan en una bitácora vacía
+                    os.replace(self.journal_path, self.compacting_path)
+                    self._journal_entries = 0
+
+            documents = self._read_snapshot()
+            self._replay(self.compacting_path, documents)
+            with self._lock:
+                if generation != self._generation:
+                    return
+                _atomic_write_json(self.filepath, list(documents.values()))
+                self._remove(self.compacting_path)
+        except OSError as exc:
+            print(f"Error al compactar la bitácora de visitantes: {exc}")
+
+
+# ---------------------------------------------------------------------------
+# Almacenamiento SQLite
+# ---------------------------------------------------------------------------
+
+
+class SqliteVisitorStorage(BaseVisitorStorage):
+    """
+    Almacenamiento local indexado. Cada alta o cambio es una sentencia SQL
+    sobre una fila, sin reescribir el resto del historial.
+    """
+
+    is_local = True
+    native_query = True
+
+    _COLUMNS = (
+        "id",
+        "rut",
+        "nombre_completo",
+        "fecha_ingreso",
+        "fecha_salida",
+        "acompañante",
+        "sector",
+        "estado",
+        "usuario_registrador",
+        "version",
+    )
+
+    _SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS visitantes (
+            id TEXT PRIMARY KEY,
+            rut TEXT,
+            nombre_completo TEXT,
+            fecha_ingreso TEXT,
+            fecha_salida TEXT,
+            "acompañante" TEXT,
+            sector TEXT,
+            estado TEXT,
+            usuario_registrador TEXT,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        # La clave primaria ya crea el índice único sobre id
+        "CREATE INDEX IF NOT EXISTS idx_visitantes_rut_estado ON visitantes (rut, estado)",
+        "CREATE INDEX IF NOT EXISTS idx_visitantes_sector_estado ON visitantes (sector, estado)",
+        "CREATE INDEX IF NOT EXISTS idx_visitantes_fecha_ingreso ON visitantes (fecha_ingreso)",
+    )
+
+    def __init__(self, filepath: str, import_from: str | None = None):
+        self.filepath = filepath
+        self._lock = threading.RLock()
+        is_new = not os.path.exists(filepath)
+
+        try:
+            self._conn = sqlite3.connect(filepath, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            with self._conn:
+                for statement in self._SCHEMA:
+                    self._conn.execute(statement)
+                self._migrate_schema()
+        except sqlite3.Error as exc:
+            raise VisitorStorageError(f"No se pudo abrir la base SQLite de visitantes: {exc}") from exc
+
+        columns = ", ".join(f'"{column}"' for column in self._COLUMNS)
+        placeholders = ", ".join("?" for _ in self._COLUMNS)
+        self._select_sql = f"SELECT {columns} FROM visitantes"
+        self._upsert_sql = f"INSERT OR REPLACE INTO visitantes ({columns}) VALUES ({placeholders})"
+
+        if is_new and import_from:
+            # Migración única del historial JSON existente
+            migrated = migrate_visitors(JournalVisitorStorage(import_from), self)
+            if migrated:
+                print(f"Migrados {migrated} visitantes de {import_from} a {filepath}")
+
+    def _migrate_schema(self) -> None:
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(visitantes)")}
+        if "version" not in existing:
+            # Bases anteriores al versionado: sin la versión leída de MongoDB, la
+            # cola offline reenviaría cada cambio como versión 0 y chocaría
+            self._conn.execute("ALTER TABLE visitantes ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def _row(self, visitor: Visitor) -> tuple:
+        data = codec.encode_visitor(visitor)
+        return tuple(data.get(column) for column in self._COLUMNS)
+
+    def load(self) -> List[Visitor]:
+        try:
+            with self._lock:
+                rows = self._conn.execute(f"{self._select_sql} ORDER BY fecha_ingreso, id").fetchall()
+        except sqlite3.Error as exc:
+            raise VisitorStorageError(f"Error al leer visitantes desde SQLite: {exc}") from exc
+        return codec.decode_visitors(dict(zip(self._COLUMNS, row)) for row in rows)
+
+    _SQL_OPERATORS = {"$eq": "=", "$ne": "IS NOT", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+    def _where(self, filter: Optional[VisitorFilter]) -> Optional[tuple]:
+        """
+        Traduce el filtro a una cláusula WHERE. Devuelve ``None`` si usa algo
+        que SQLite no puede resolver con índices (p. ej. ``$regex``).
+        """
+        clauses: List[str] = []
+        params: List = []
+        for key, condition in (filter or {}).items():
+            if key in ("$or", "$and"):
+                parts = [self._where(sub) for sub in condition]
+                if not parts or any(part is None for part in parts):
+                    return None
+                joiner = " OR " if key == "$or" else " AND "
+                clauses.append("(" + joiner.join(f"({sql})" for sql, _ in parts) + ")")
+                for _, sub_params in parts:
+                    params.extend(sub_params)
+                continue
+            if key not in self._COLUMNS:
+                return None
+
+            column = f'"{key}"'
+            if not isinstance(condition, dict):
+                clauses.append(f"{column} IS ?")
+                params.append(condition)
+                continue
+
+            for operator, operand in condition.items():
+                if operator not in COMPARISON_OPERATORS:
+                    return None
+                if operator == "$exists":
+                    clauses.append(f"{column} IS {'NOT ' if operand else ''}NULL")
+                elif operator in ("$in", "$nin"):
+                    operand = list(operand)
+                    if not operand:
+                        clauses.append("0" if operator == "$in" else "1")
+                        continue
+                    negation = "NOT " if operator == "$nin" else ""
+                    clauses.append(f"{column} {negation}IN ({', '.join('?' for _ in operand)})")
+                    params.extend(operand)
+                else:
+                    sql_operator = self._SQL_OPERATORS[operator]
+                    if operator == "$eq":
+                        sql_operator = "IS"
+                    clauses.append(f"{column} {sql_operator} ?")
+                    params.append(operand)
+
+        return (" AND ".join(clauses) or "1", params)
+
+    def query(
+        self,
+        filter: Optional[VisitorFilter] = None,
+        sort: Optional[SortSpec] = None,
+        limit: int = 0,
+        skip: int = 0,
+        projection: Optional[Projection] = None,
+    ) -> List:
+        where = self._where(filter)
+        fields = projection_fields(projection)
+        if where is None or any(field not in self._COLUMNS for field, _ in sort or ()) or (
+            fields is not None and any(field not in self._COLUMNS for field in fields)
+        ):
+            return super().query(filter, sort, limit, skip, projection)
+
+        columns = self._COLUMNS if fields is None else ("id",) + tuple(f for f in fields if f != "id")
+        selected = ", ".join(f'"{column}"' for column in columns)
+        sql = f"SELECT {selected} FROM visitantes WHERE {where[0]}"
+        if sort:
+            order = ", ".join(f'"{field}" {"DESC" if direction < 0 else "ASC"}' for field, direction in sort)
+            sql += f" ORDER BY {order}"
+        if limit or skip:
+            sql += f" LIMIT {int(limit) if limit else -1} OFFSET {int(skip)}"
+
+        try:
+            with self._lock:
+                rows = self._conn.execute(sql, where[1]).fetchall()
+        except sqlite3.Error as exc:
+            raise VisitorStorageError(f"Error al consultar visitantes en SQLite: {exc}") from exc
+
+        documents = [dict(zip(columns, row)) for row in rows]
+        if fields is None:
+            return codec.decode_visitors(documents)
+        return documents
+
+    def save_changes(
+        self,
+        changed: Iterable[Visitor] = (),
+        deleted_ids: Iterable[str] = (),
+    ) -> bool:
+        rows = [self._row(visitor) for visitor in changed]
+        deletes = [(visitor_id,) for visitor_id in deleted_ids]
+        try:
+            with self._lock, self._conn:
+                if rows:
+                    self._conn.executemany(self._upsert_sql, rows)
+                if deletes:
+                    self._conn.executemany("DELETE FROM visitantes WHERE id = ?", deletes)
+            return True
+        except sqlite3.Error as exc:
+            raise VisitorStorageError(f"Error al guardar visitantes en SQLite: {exc}") from exc
+
+    def save(self, visitors: Iterable[Visitor]) -> bool:
+        rows = [self._row(visitor) for visitor in visitors]
+        try:
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM visitantes")
+                self._conn.executemany(self._upsert_sql, rows)
+            return True
+        except sqlite3.Error as exc:
+            raise VisitorStorageError(f"Error al guardar visitantes en SQLite: {exc}") from exc
+
+    def delete_all(self) -> bool:
+        try:
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM visitantes")
+            return True
+        except sqlite3.Error as exc:
+            raise VisitorStorageError(f"Error al eliminar visitantes en SQLite: {exc}") from exc
+
+
 # ---------------------------------------------------------------------------
 # Almacenamiento MongoDB
 # ---------------------------------------------------------------------------
 
 
 class MongoVisitorStorage(BaseVisitorStorage):
+    native_query = True
+
     def __init__(self):
         try:
             from database import connect_db, get_visitantes_collection
+            from pymongo import DeleteOne, UpdateOne
+            from pymongo.errors import BulkWriteError
         except ImportError as exc:
             raise VisitorStorageError("MongoDB no está disponible en este entorno") from exc
 
@@ -86,27 +645,322 @@ class MongoVisitorStorage(BaseVisitorStorage):
         if self.collection is None:
             raise VisitorStorageError("No se pudo obtener la colección de visitantes")
 
-    def load(self) -> List[Visitor]:
-        documents = list(self.collection.find({}))
-        visitors: List[Visitor] = []
+        self._delete_op = DeleteOne
+        self._update_op = UpdateOne
+        self._bulk_write_error = BulkWriteError
+        # Mayor ``updated_at`` visto; las sincronizaciones piden solo lo posterior
+        self.watermark: datetime | None = None
+        # Mientras queden fechas guardadas como texto, los filtros aceptan ambas
+        # formas. Comprobarlo recorre la colección, así que se supone que quedan
+        # hasta que migrate_dates (en segundo plano) lo verifique
+        self.legacy_dates = True
+        # Los upsert de visitas nuevas dependen del índice único de id para no duplicarlas
+        self.unique_ids = self._has_unique_id_index()
 
+    def _has_unique_id_index(self) -> bool:
+        try:
+            indexes = self.collection.index_information()
+        except Exception:
+            return False
+        return any(
+            info.get("unique") and [field for field, _ in info.get("key", [])] == ["id"]
+            for info in indexes.values()
+        )
+
+    def _absent_ids(self, visitor_ids: List[str]) -> Set[str]:
+        """Ids que aún no existen en la colección."""
+        if not visitor_ids:
+            return set()
+        try:
+            existing = set(self.collection.distinct("id", {"id": {"$in": visitor_ids}}))
+        except Exception as exc:
+            raise VisitorStorageError(f"Error al verificar visitas en MongoDB: {exc}") from exc
+        return set(visitor_ids) - existing
+
+    def _has_legacy_dates(self) -> bool:
+        try:
+            return self.collection.find_one(LEGACY_DATES_FILTER, {"_id": 1}) is not None
+        except Exception:
+            # Ante la duda se consulta de la forma que sirve para ambos casos
+            return True
+
+    def _filter(self, filter: Optional[VisitorFilter]) -> Dict:
+        return codec.mongo_filter(filter, legacy=self.legacy_dates)
+
+    def migrate_dates(self, batch_size: int = DATE_MIGRATION_BATCH_SIZE) -> int:
+        """
+        Comprueba si quedan fechas guardadas como texto y convierte esos
+        documentos a fechas nativas. Lento en colecciones grandes: se llama
+        en segundo plano.
+        """
+        self.legacy_dates = self._has_legacy_dates()
+        if not self.legacy_dates:
+            return 0
+        migrated = migrate_date_fields(self.collection, batch_size)
+        self.legacy_dates = self._has_legacy_dates()
+        return migrated
+
+    def _decode(self, documents) -> List[Visitor]:
+        visitors: List[Visitor] = []
         for document in documents:
             document.pop("_id", None)
-            visitors.append(Visitor.from_dict(document))
+            updated_at = document.pop("updated_at", None)
+            if updated_at is not None and (self.watermark is None or updated_at > self.watermark):
+                self.watermark = updated_at
+            visitors.append(codec.decode_mongo_visitor(document))
+        return visitors
 
+    def _server_time(self) -> Optional[datetime]:
+        try:
+            return self.collection.database.command("hello").get("localTime")
+        except Exception:
+            return None
+
+    def _load(self, query: Dict) -> List[Visitor]:
+        # Sin marca de agua, se parte de la hora del servidor previa a la
+        # lectura: aunque no llegue ningún documento (p. ej. sin visitas en el
+        # mes), la sincronización pide solo lo escrito desde entonces
+        started = self._server_time() if self.watermark is None else None
+        try:
+            visitors = self._decode(self.collection.find(query))
+        except Exception as exc:
+            raise VisitorStorageError(f"Error al cargar visitantes desde MongoDB: {exc}") from exc
+        if self.watermark is None:
+            self.watermark = started
         return visitors
 
+    def load(self) -> List[Visitor]:
+        self.watermark = None
+        return self._load({})
+
+    def query(
+        self,
+        filter: Optional[VisitorFilter] = None,
+        sort: Optional[SortSpec] = None,
+        limit: int = 0,
+        skip: int = 0,
+        projection: Optional[Projection] = None,
+    ) -> List:
+        fields = projection_fields(projection)
+        mongo_projection = None if fields is None else {"_id": 0, "id": 1, **{field: 1 for field in fields}}
+        try:
+            cursor = self.collection.find(self._filter(filter), mongo_projection)
+            if sort:
+                cursor = cursor.sort(list(sort))
+            if skip:
+                cursor = cursor.skip(skip)
+            if limit:
+                cursor = cursor.limit(limit)
+            documents = list(cursor)
+        except Exception as exc:
+            raise VisitorStorageError(f"Error al consultar visitantes en MongoDB: {exc}") from exc
+
+        if fields is not None:
+            for document in documents:
+                for field in codec.DATE_FIELDS:
+                    if field in document:
+                        document[field] = codec.from_datetime(document[field])
+            return documents
+        for document in documents:
+            document.pop("_id", None)
+            document.pop("updated_at", None)
+        return codec.decode_mongo_visitors(documents)
+
+    def load_matching(self, filter: Optional[VisitorFilter] = None) -> List[Visitor]:
+        return self._load(self._filter(filter))
+
+    def load_changes(self) -> Optional[List[Visitor]]:
+        if self.watermark is None:
+            query = {"updated_at": {"$exists": True}}
+        else:
+            # $gte para no perder escrituras con el mismo milisegundo; reaplicarlas es inocuo
+            query = {"updated_at": {"$gte": self.watermark}}
+        try:
+            return self._decode(self.collection.find(query))
+        except Exception as exc:
+            raise VisitorStorageError(f"Error al sincronizar visitantes desde MongoDB: {exc}") from exc
+
+    def count(self, filter: Optional[VisitorFilter] = None) -> Optional[int]:
+        try:
+            if filter:
+                return self.collection.count_documents(self._filter(filter))
+            return self.collection.estimated_document_count()
+        except Exception as exc:
+            raise VisitorStorageError(f"Error al contar visitantes en MongoDB: {exc}") from exc
+
+    def count_by_day(self, since: Optional[str] = None, until: Optional[str] = None) -> Optional[Dict[str, int]]:
+        if self.legacy_dates:
+            # Con fechas como texto la agrupación en el servidor no sería exacta
+            return None
+        condition = {}
+        if since is not None:
+            condition["$gte"] = since
+        if until is not None:
+            condition["$lt"] = until
+        match = self._filter({"fecha_ingreso": condition} if condition else None)
+        # Días en hora local de la estación (desfase actual; no sigue cambios de horario dentro del rango)
+        offset = datetime.now().astimezone().strftime("%z")
+        pipeline = [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$fecha_ingreso", "timezone": offset}},
+                    "total": {"$sum": 1},
+                }
+            },
+        ]
+        try:
+            return {row["_id"]: row["total"] for row in self.collection.aggregate(pipeline)}
+        except Exception as exc:
+            raise VisitorStorageError(f"Error al agrupar visitantes en MongoDB: {exc}") from exc
+
     def save(self, visitors: Iterable[Visitor]) -> bool:
         visitors = list(visitors)
         try:
             self.collection.delete_many({})
             if visitors:
-                payload = [visitor.to_dict() for visitor in visitors]
+                updated_at = datetime.now(timezone.utc)
+                payload = [codec.encode_mongo_visitor(visitor) for visitor in visitors]
+                for document in payload:
+                    document["updated_at"] = updated_at
                 self.collection.insert_many(payload)
             return True
         except Exception as exc:
             raise VisitorStorageError(f"Error al guardar visitantes en MongoDB: {exc}") from exc
 
+    def apply_changes(self, changes: VisitorChangeSet) -> bool:
+        if not changes:
+            return True
+        return self.save_changes(changes.upserts, changes.removed, changes.removed_versions)
+
+    def save_changes(
+        self,
+        changed: Iterable[Visitor] = (),
+        deleted_ids: Iterable[str] = (),
+        deleted_versions: Optional[Dict[str, int]] = None,
+    ) -> bool:
+        """
+        Como en los demás almacenamientos; ``deleted_versions`` condiciona
+        además cada borrado a la versión leída de la visita.
+        """
+        upserts = {visitor.id: visitor for visitor in changed}
+        deletes = set(deleted_ids)
+        deleted_versions = deleted_versions or {}
+        written = [visitor for visitor_id, visitor in upserts.items() if visitor_id not in deletes]
+
+        # Cada escritura se condiciona a la versión leída (compare-and-set):
+        # si otra estación cambió el documento, el filtro no coincide y se
+        # informa el conflicto en vez de pisar su cambio. updated_at lo fija
+        # el servidor para que la marca de agua no dependa del reloj de cada
+        # estación
+        operations = []
+        # Lo enviado, para verificarlo aunque el objeto cambie mientras tanto
+        sent: Dict[str, Dict] = {}
+        # Sin índice único (p. ej. porque ids duplicados antiguos impidieron
+        # crearlo) un upsert podría insertar un segundo documento con el mismo
+        # id: las visitas nuevas se insertan solo si su id no existe
+        inserts = set() if self.unique_ids else self._absent_ids([v.id for v in written if v.version == 0])
+        for visitor in written:
+            sent[visitor.id] = dict(codec.encode_visitor(visitor), version=visitor.version + 1)
+            document = codec.encode_mongo_visitor(visitor)
+            del document["version"]
+            if visitor.id in inserts:
+                # Si otra estación lo insertó entremedio no se modifica (salvo
+                # updated_at) y se informa como conflicto
+                operations.append(
+                    self._update_op(
+                        {"id": visitor.id},
+                        {"$setOnInsert": dict(document, version=1), "$currentDate": {"updated_at": True}},
+                        upsert=True,
+                    )
+                )
+                continue
+            operations.append(
+                self._update_op(
+                    self._version_filter(visitor.id, visitor.version),
+                    {"$set": document, "$inc": {"version": 1}, "$currentDate": {"updated_at": True}},
+                    # Solo se crea si nunca llegó a MongoDB; si ya existe con otra
+                    # versión, el índice único de id lo rechaza como clave duplicada
+                    upsert=visitor.version == 0 and self.unique_ids,
+                )
+            )
+        # Un borrado sin versión conocida (datos anteriores al versionado) no se condiciona
+        operations.extend(
+            self._delete_op(
+                self._version_filter(visitor_id, deleted_versions[visitor_id])
+                if visitor_id in deleted_versions
+                else {"id": visitor_id}
+            )
+            for visitor_id in deletes
+        )
+        if not operations:
+            return True
+
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            applied = result.matched_count + result.upserted_count
+            removed = result.deleted_count
+            # Una inserción condicionada que encontró el id cuenta como coincidencia
+            rejected = result.upserted_count < len(inserts)
+        except self._bulk_write_error as exc:
+            errors = exc.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise VisitorStorageError(f"Error al guardar cambios en MongoDB: {exc}") from exc
+            applied = exc.details.get("nMatched", 0) + exc.details.get("nUpserted", 0)
+            removed = exc.details.get("nRemoved", 0)
+            rejected = True
+        except Exception as exc:
+            raise VisitorStorageError(f"Error al guardar cambios en MongoDB: {exc}") from exc
+
+        conflicts: Dict[str, Optional[Visitor]] = {}
+        if rejected or applied < len(written):
+            conflicts = self._find_conflicts(sent)
+        if removed < len(deletes):
+            # Borrados sin coincidencia: la visita ya no existía (no es conflicto)
+            # o cambió de versión en otra estación, y entonces prevalece ese cambio
+            conflicts.update(self._read_current(deletes))
+        for visitor in written:
+            if visitor.id not in conflicts:
+                visitor.version += 1
+        if conflicts:
+            raise VisitorConflictError(conflicts)
+        return True
+
+    @staticmethod
+    def _version_filter(visitor_id: str, version: int) -> Dict:
+        if version == 0:
+            # Los documentos anteriores al versionado no tienen el campo
+            return {"id": visitor_id, "version": {"$in": [0, None]}}
+        return {"id": visitor_id, "version": version}
+
+    def _read_current(self, visitor_ids: Iterable[str]) -> Dict[str, Visitor]:
+        """Estado actual en la colección de las visitas indicadas que existen."""
+        try:
+            documents = list(self.collection.find({"id": {"$in": list(visitor_ids)}}))
+        except Exception as exc:
+            raise VisitorStorageError(f"Error al verificar cambios en MongoDB: {exc}") from exc
+
+        current: Dict[str, Visitor] = {}
+        for document in documents:
+            # Sin pasar por _decode: la marca de agua solo avanza al sincronizar
+            document.pop("_id", None)
+            document.pop("updated_at", None)
+            current[document["id"]] = codec.decode_mongo_visitor(document)
+        return current
+
+    def _find_conflicts(self, sent: Dict[str, Dict]) -> Dict[str, Optional[Visitor]]:
+        """
+        El resultado del lote no dice qué escritura no coincidió: se relee el
+        estado actual y se compara con lo enviado.
+        """
+        current = self._read_current(sent)
+        conflicts: Dict[str, Optional[Visitor]] = {}
+        for visitor_id, expected in sent.items():
+            stored = current.get(visitor_id)
+            if stored is None or codec.encode_visitor(stored) != expected:
+                conflicts[visitor_id] = stored
+        return conflicts
+
     def delete_all(self) -> bool:
         try:
             self.collection.delete_many({})
@@ -120,13 +974,92 @@ class MongoVisitorStorage(BaseVisitorStorage):
 # ---------------------------------------------------------------------------
 
 
+def migrate_visitors(source: BaseVisitorStorage, target: BaseVisitorStorage) -> int:
+    """
+    Copia todo el contenido de ``source`` sobre ``target`` con una reescritura
+    completa. Es la única operación que debe usar ``save``.
+    """
+    visitors = source.load()
+    if visitors:
+        target.save(visitors)
+    return len(visitors)
+
+
+def migrate_date_fields(collection, batch_size: int = DATE_MIGRATION_BATCH_SIZE) -> int:
+    """
+    Convierte a fechas nativas, por lotes, las fechas guardadas como texto en
+    una colección de visitas de MongoDB. Puede interrumpirse y retomarse: solo
+    recorre los documentos que aún tienen texto, y cada actualización exige
+    que el documento conserve el valor leído, para no pisar una escritura
+    concurrente (que ya guarda fechas nativas). No cambia ``version`` ni
+    ``updated_at``: el contenido de la visita es el mismo.
+    """
+    from pymongo import UpdateOne
+
+    fields = {"_id": 1, **{field: 1 for field in codec.DATE_FIELDS}}
+    migrated = 0
+    last_id = None
+    while True:
+        query = LEGACY_DATES_FILTER if last_id is None else {"$and": [LEGACY_DATES_FILTER, {"_id": {"$gt": last_id}}]}
+        try:
+            documents = list(collection.find(query, fields).sort("_id", 1).limit(batch_size))
+        except Exception as exc:
+            raise VisitorStorageError(f"Error al leer fechas a migrar en MongoDB: {exc}") from exc
+        if not documents:
+            break
+        last_id = documents[-1]["_id"]
+
+        operations = []
+        for document in documents:
+            expected = {"_id": document["_id"]}
+            converted = {}
+            for field in codec.DATE_FIELDS:
+                value = document.get(field)
+                expected[field] = value
+                native = codec.to_datetime(value)
+                if native is not value:
+                    converted[field] = native
+            # Un texto que no es fecha se deja como está (y se salta en esta pasada)
+            if converted:
+                operations.append(UpdateOne(expected, {"$set": converted}))
+        if operations:
+            try:
+                migrated += collection.bulk_write(operations, ordered=False).modified_count
+            except Exception as exc:
+                raise VisitorStorageError(f"Error al migrar fechas en MongoDB: {exc}") from exc
+        if len(documents) < batch_size:
+            break
+    return migrated
+
+
+def create_local_storage(json_filepath: str, backend: str | None = None) -> BaseVisitorStorage:
+    """
+    Almacenamiento local usado en modo offline y como respaldo de MongoDB.
+
+    El backend se elige con ``backend`` o con la variable de entorno
+    ``VISITASEGURA_LOCAL_STORAGE`` (``journal`` por defecto, ``sqlite`` o ``json``).
+    """
+    backend = (backend or os.environ.get(LOCAL_STORAGE_ENV_VAR) or "journal").lower()
+
+    if backend == "sqlite":
+        root, _ = os.path.splitext(json_filepath)
+        try:
+            return SqliteVisitorStorage(f"{root}.db", import_from=json_filepath)
+        except VisitorStorageError as exc:
+            print(f"⚠️ SQLite no disponible ({exc}). Usando bitácora JSON.")
+    elif backend == "json":
+        return JsonVisitorStorage(json_filepath)
+
+    return JournalVisitorStorage(json_filepath)
+
+
 def create_default_storage(json_filepath: str) -> BaseVisitorStorage:
     """
-    Intenta usar MongoDB y cae a JSON si no está disponible.
+    Intenta usar MongoDB y cae al almacenamiento local si no está disponible.
     """
     try:
         return MongoVisitorStorage()
     except VisitorStorageError as exc:
-        print(f"⚠️ MongoDB no disponible ({exc}). Usando almacenamiento JSON.")
-        return JsonVisitorStorage(json_filepath)
+        print(f"⚠️ MongoDB no disponible ({exc}). Usando almacenamiento local.")
+        return create_local_storage(json_filepath)
 
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, Optional
+
+
+class PersistenceWorker(threading.Thread):
+    """
+    Hilo dedicado a las escrituras en el almacenamiento. ``submit`` solo
+    anota que hay cambios por guardar; varias solicitudes seguidas se
+    atienden con una única ejecución de ``job`` que persiste todo lo
+    acumulado.
+    """
+
+    def __init__(self, job: Callable[[], None]):
+        super().__init__(name="visitor-persistence", daemon=True)
+        self.job = job
+        self._condition = threading.Condition()
+        self._requested = 0
+        self._completed = 0
+        self._stopping = False
+
+    def submit(self) -> None:
+        with self._condition:
+            self._requested += 1
+            self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que terminen las escrituras solicitadas hasta ahora."""
+        with self._condition:
+            target = self._requested
+            if not self.is_alive():
+                return self._completed >= target
+            return self._condition.wait_for(lambda: self._completed >= target, timeout)
+
+    def stop(self) -> None:
+        """Termina el hilo después de atender lo ya solicitado."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+
+    def run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._stopping or self._requested > self._completed)
+                if self._requested == self._completed:
+                    return
+                target = self._requested
+
+            try:
+                self.job()
+            except Exception as exc:
+                print(f"Error en el guardado en segundo plano: {exc}")
+
+            with self._condition:
+                self._completed = target
+                self._condition.notify_all()
@@ -1,6 +1,7 @@
 # database.py
-from pymongo import MongoClient
-from pymongo.errors import ServerSelectionTimeoutError, ConfigurationError
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import ServerSelectionTimeoutError, ConfigurationError, PyMongoError
+from datetime import datetime, timezone
 import os
 import socket
 
@@ -12,11 +13,36 @@ OFFLINE_ENV_VAR = "VISITASEGURA_OFFLINE"
 # Timeout para conexión (5 segundos - suficiente para detectar bloqueos DNS rápidamente)
 CONNECTION_TIMEOUT = 5  # segundos
 
+# Índices requeridos por las consultas frecuentes: (colección, claves, opciones)
+INDEX_SPECS = [
+    ("Visitantes", [("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+    ("Visitantes", [("estado", ASCENDING), ("sector", ASCENDING)], {"name": "estado_sector"}),
+    ("Visitantes", [("rut", ASCENDING), ("estado", ASCENDING)], {"name": "rut_estado"}),
+    ("Visitantes", [("fecha_ingreso", ASCENDING)], {"name": "fecha_ingreso"}),
+    ("Visitantes", [("updated_at", ASCENDING)], {"name": "updated_at"}),
+    ("VisitantesArchivo", [("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+    ("VisitantesArchivo", [("periodo", ASCENDING)], {"name": "periodo"}),
+    ("Usuarios", [("username", ASCENDING)], {"name": "username_unique", "unique": True}),
+    ("Usuarios", [("role", ASCENDING)], {"name": "role"}),
+]
+
+# Consultas frecuentes cuya cobertura por índices se verifica con report_index_usage()
+HOT_QUERIES = [
+    ("Visitantes", {"id": "VIS00000000000000000000"}),
+    ("Visitantes", {"rut": "12345678-9", "estado": "Dentro"}),
+    ("Visitantes", {"estado": "Dentro", "sector": "CITT"}),
+    ("Visitantes", {"fecha_ingreso": {"$gte": datetime(2000, 1, 1)}}),
+    ("Visitantes", {"updated_at": {"$gte": datetime(2000, 1, 1, tzinfo=timezone.utc)}}),
+    ("Usuarios", {"username": "admin", "password": "", "is_active": True}),
+    ("Usuarios", {"role": "admin"}),
+]
+
 # Crear conexión global
 client = None
 db = None
 usuarios_collection = None
 visitantes_collection = None
+_indexes_ensured = False
 
 
 def _is_offline_mode() -> bool:
@@ -56,6 +82,8 @@ def connect_db():
         print("Conectado a MongoDB correctamente")
         print(f"Base de datos: {db.name}")
         print(f"Colecciones disponibles: {db.list_collection_names()}")
+
+        ensure_indexes()
         return True
 
     except (ServerSelectionTimeoutError, socket.gaierror, ConfigurationError) as e:
@@ -75,6 +103,79 @@ def connect_db():
         return False
 
 
+def ensure_indexes():
+    """
+    Crea los índices de INDEX_SPECS si no existen. Es idempotente: MongoDB
+    ignora un create_index con la misma especificación.
+    """
+    global _indexes_ensured
+
+    if db is None:
+        return False
+    if _indexes_ensured:
+        return True
+
+    all_created = True
+    for collection_name, keys, options in INDEX_SPECS:
+        try:
+            db[collection_name].create_index(keys, **options)
+        except PyMongoError as e:
+            # Ej.: duplicados históricos que impiden un índice único
+            print(f"No se pudo crear el índice {options['name']} en {collection_name}: {e}")
+            all_created = False
+    _indexes_ensured = all_created
+    return all_created
+
+
+def _plan_stages(plan):
+    """Recorre un plan de ejecución y devuelve sus etapas (IXSCAN, COLLSCAN, ...)."""
+    stages = [plan.get("stage")]
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    if "inputStage" in plan:
+        stages.extend(_plan_stages(plan["inputStage"]))
+    return [stage for stage in stages if stage]
+
+
+def report_index_usage():
+    """
+    Muestra cuántas veces se ha usado cada índice ($indexStats) y si las
+    consultas de HOT_QUERIES se resuelven con un índice o recorriendo la
+    colección completa.
+    """
+    if db is None and not connect_db():
+        return None
+
+    report = {"usage": {}, "queries": []}
+    for collection_name in sorted({name for name, _, _ in INDEX_SPECS}):
+        try:
+            stats = db[collection_name].aggregate([{"$indexStats": {}}])
+            usage = {item["name"]: item["accesses"]["ops"] for item in stats}
+        except PyMongoError as e:
+            print(f"No se pudo leer $indexStats de {collection_name}: {e}")
+            continue
+        report["usage"][collection_name] = usage
+        print(f"Uso de índices en {collection_name}:")
+        for name, ops in usage.items():
+            print(f"  {name}: {ops} operaciones")
+
+    for collection_name, query in HOT_QUERIES:
+        try:
+            plan = db[collection_name].find(query).explain()["queryPlanner"]["winningPlan"]
+        except PyMongoError as e:
+            print(f"No se pudo obtener el plan de {query} en {collection_name}: {e}")
+            continue
+        stages = _plan_stages(plan)
+        covered = "COLLSCAN" not in stages
+        report["queries"].append(
+            {"collection": collection_name, "query": query, "stages": stages, "indexed": covered}
+        )
+        status = "índice" if covered else "RECORRIDO COMPLETO"
+        print(f"  [{status}] {collection_name} {list(query)} -> {' < '.join(stages)}")
+
+    return report
+
+
 def check_connection():
     """Verifica si la conexión con MongoDB sigue activa."""
     if _is_offline_mode():
@@ -109,3 +210,7 @@ def get_db():
     if db is None:
         connect_db()
     return db
+
+
+if __name__ == "__main__":
+    report_index_usage()
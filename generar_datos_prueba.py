@@ -24,8 +24,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from core.visitors.models import Visitor
-from core.visitors.storage import JsonVisitorStorage, MongoVisitorStorage
-from database import connect_db, get_visitantes_collection
+from core.visitors.storage import MongoVisitorStorage, VisitorStorageError, create_local_storage
 
 
 # RUT de prueba único
@@ -325,28 +324,24 @@ def guardar_en_mongodb(visitantes: List[Visitor]) -> bool:
     try:
         print("\n📡 Intentando guardar en MongoDB...")
         
-        if not connect_db():
-            print("⚠️ No se pudo conectar a MongoDB. Saltando guardado en nube.")
-            return False
-        
-        collection = get_visitantes_collection()
-        if collection is None:
-            print("⚠️ No se pudo obtener la colección de MongoDB. Saltando guardado en nube.")
+        try:
+            # Conecta y deja los índices creados
+            storage = MongoVisitorStorage()
+        except VisitorStorageError as e:
+            print(f"⚠️ No se pudo conectar a MongoDB ({e}). Saltando guardado en nube.")
             return False
         
         # Borrar visitantes existentes del RUT de prueba (para evitar duplicados)
         rut_prueba = visitantes[0].rut if visitantes else None
         if rut_prueba:
-            eliminados = collection.delete_many({"rut": rut_prueba})
+            eliminados = storage.collection.delete_many({"rut": rut_prueba})
             if eliminados.deleted_count > 0:
                 print(f"   ℹ️  Eliminados {eliminados.deleted_count} visitantes existentes con RUT {rut_prueba}")
         
-        # Convertir visitantes a diccionarios
-        documentos = [v.to_dict() for v in visitantes]
-        
-        # Insertar en MongoDB
-        if documentos:
-            collection.insert_many(documentos)
+        # Mismo formato que escribe la aplicación: fechas nativas, version y
+        # updated_at (sin este último la sincronización incremental no los ve)
+        if visitantes:
+            storage.save_changes(visitantes)
             print(f"✅ Guardados {len(visitantes)} visitantes en MongoDB (nube)")
         else:
             print("⚠️ No hay visitantes para guardar")
@@ -363,7 +358,7 @@ def guardar_en_json(visitantes: List[Visitor], archivo: str = "visitors.json") -
     try:
         print(f"\n💾 Guardando en archivo JSON local ({archivo})...")
         
-        storage = JsonVisitorStorage(archivo)
+        storage = create_local_storage(archivo)
         if storage.save(visitantes):
             print(f"✅ Guardados {len(visitantes)} visitantes en archivo JSON local")
             return True
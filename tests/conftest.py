@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+# Las pruebas importan ``core.visitors`` desde la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.visitors.models import Visitor  # noqa: E402
+
+
+def build_visitor(
+    visitor_id="VIS1",
+    fecha_ingreso="2025-03-10 09:00:00",
+    estado="Dentro",
+    sector="CITT",
+    rut="12.345.678-9",
+    nombre_completo="José Peña",
+    acompañante="No",
+    version=0,
+):
+    visitor = Visitor(
+        rut=rut,
+        nombre_completo=nombre_completo,
+        acompañante=acompañante,
+        sector=sector,
+        estado=estado,
+        usuario_registrador="admin",
+    )
+    visitor.id = visitor_id
+    visitor.fecha_ingreso = fecha_ingreso
+    if estado == "Fuera":
+        visitor.fecha_salida = fecha_ingreso[:11] + "18:00:00"
+    visitor.version = version
+    return visitor
+
+
+@pytest.fixture
+def make_visitor():
+    return build_visitor
@@ -0,0 +1,69 @@
+from core.visitors.changes import VisitorChangeSet
+
+
+def test_created_then_removed_is_forgotten(make_visitor):
+    changes = VisitorChangeSet()
+    visitor = make_visitor()
+    changes.record_created(visitor)
+    changes.record_removed(visitor.id)
+    assert not changes
+
+
+def test_modified_after_created_stays_created(make_visitor):
+    changes = VisitorChangeSet()
+    visitor = make_visitor()
+    changes.record_created(visitor)
+    changes.record_modified(visitor)
+    assert list(changes.created) == [visitor.id]
+    assert not changes.modified
+
+
+def test_recreated_after_removed_becomes_modified(make_visitor):
+    changes = VisitorChangeSet()
+    visitor = make_visitor()
+    changes.record_removed(visitor.id)
+    changes.record_created(visitor)
+    assert changes.modified == {visitor.id: visitor}
+    assert not changes.removed
+
+
+def test_merge_applies_newer_changes_on_top(make_visitor):
+    older = VisitorChangeSet()
+    kept, dropped, edited = make_visitor("A"), make_visitor("B"), make_visitor("C")
+    older.record_created(kept)
+    older.record_created(dropped)
+    older.record_modified(edited)
+
+    newer = VisitorChangeSet()
+    newer.record_removed("B")
+    newer.record_removed("C")
+    newer.record_modified(kept)
+
+    older.merge(newer)
+    assert list(older.created) == ["A"]
+    assert older.removed == {"C"}
+    assert not older.modified
+    assert sorted(older.ids) == ["A", "C"]
+
+
+def test_removed_versions_follow_the_removal(make_visitor):
+    older = VisitorChangeSet()
+    older.record_removed("A", 2)
+    newer = VisitorChangeSet()
+    newer.record_removed("B", 5)
+    older.merge(newer)
+    assert older.removed_versions == {"A": 2, "B": 5}
+
+    older.record_created(make_visitor("A"))
+    older.forget("B")
+    assert older.removed_versions == {}
+    assert not older.removed
+
+
+def test_copy_is_independent(make_visitor):
+    changes = VisitorChangeSet()
+    changes.record_created(make_visitor("A"))
+    clone = changes.copy()
+    clone.record_removed("A")
+    assert "A" in changes.created
+    assert not clone
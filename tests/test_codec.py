@@ -0,0 +1,80 @@
+from datetime import datetime
+
+from core.visitors import codec
+
+
+def test_round_trip_keeps_every_field(make_visitor):
+    visitor = make_visitor(estado="Fuera", version=3)
+    decoded = codec.decode_visitor(codec.loads(codec.dumps(codec.encode_visitor(visitor))))
+    assert codec.encode_visitor(decoded) == codec.encode_visitor(visitor)
+
+
+def test_dumps_keeps_accents():
+    assert "Peñalolén" in codec.dumps({"sector": "Peñalolén"})
+    assert "\n" in codec.dumps([{"a": 1}], indent=True)
+
+
+def test_decode_fills_defaults_for_incomplete_documents():
+    visitor = codec.decode_visitor(
+        {"rut": "1-9", "nombre_completo": "Ana", "acompañante": "No", "sector": "CITT"}
+    )
+    assert visitor.id.startswith("VIS")
+    assert visitor.fecha_ingreso
+    assert visitor.estado == "Dentro"
+    assert visitor.version == 0
+
+
+def test_decoded_visitor_parses_timestamps(make_visitor):
+    visitor = codec.decode_visitor(codec.encode_visitor(make_visitor(estado="Fuera")))
+    assert visitor.entered_at == datetime(2025, 3, 10, 9, 0)
+    assert visitor.duration.total_seconds() == 9 * 3600
+
+
+def test_mongo_documents_use_native_dates(make_visitor):
+    visitor = make_visitor(estado="Fuera")
+    document = codec.encode_mongo_visitor(visitor)
+    assert isinstance(document["fecha_ingreso"], datetime)
+    assert isinstance(document["fecha_salida"], datetime)
+    decoded = codec.decode_mongo_visitor(dict(document))
+    assert decoded.fecha_ingreso == visitor.fecha_ingreso
+    assert decoded.fecha_salida == visitor.fecha_salida
+
+
+def test_mongo_decode_accepts_legacy_text_dates(make_visitor):
+    document = codec.encode_visitor(make_visitor())
+    assert codec.decode_mongo_visitor(dict(document)).fecha_ingreso == "2025-03-10 09:00:00"
+
+
+def test_mongo_filter_converts_date_conditions():
+    translated = codec.mongo_filter(
+        {"estado": "Fuera", "fecha_ingreso": {"$gte": "2025-01-01 00:00:00", "$lt": "2025-02-01 00:00:00"}}
+    )
+    assert translated["estado"] == "Fuera"
+    assert translated["fecha_ingreso"]["$gte"] == codec.to_datetime("2025-01-01 00:00:00")
+    assert isinstance(translated["fecha_ingreso"]["$lt"], datetime)
+
+
+def test_mongo_filter_recurses_into_or():
+    translated = codec.mongo_filter({"$or": [{"estado": "Dentro"}, {"fecha_ingreso": {"$gte": "2025-01-01 00:00:00"}}]})
+    assert isinstance(translated["$or"][1]["fecha_ingreso"]["$gte"], datetime)
+
+
+def test_mongo_filter_legacy_accepts_both_forms():
+    text = {"$gte": "2025-01-01 00:00:00"}
+    translated = codec.mongo_filter({"estado": "Fuera", "fecha_ingreso": text}, legacy=True)
+    assert translated == {
+        "$and": [
+            {"estado": "Fuera"},
+            {"$or": [{"fecha_ingreso": {"$gte": codec.to_datetime(text["$gte"])}}, {"fecha_ingreso": text}]},
+        ]
+    }
+
+
+def test_mongo_filter_legacy_negation_must_hold_in_both_forms():
+    translated = codec.mongo_filter({"fecha_salida": {"$ne": "2025-01-01 00:00:00"}}, legacy=True)
+    assert list(translated) == ["$and"]
+
+
+def test_mongo_filter_leaves_non_dates_alone():
+    assert codec.mongo_filter({"fecha_salida": None}, legacy=True) == {"fecha_salida": None}
+    assert codec.mongo_filter(None) == {}
@@ -0,0 +1,27 @@
+from core.visitors.indexes import VisitorIndex
+
+
+def test_open_visits_follow_edits(make_visitor):
+    index = VisitorIndex()
+    visitor = make_visitor(rut="1-9", sector="CITT")
+    index.add(visitor)
+    assert index.has_open_visit("1-9")
+    assert index.open_count("CITT") == 1
+
+    # El formulario edita el objeto antes de avisar
+    visitor.sector = "Auditorio"
+    visitor.estado = "Fuera"
+    index.refresh(visitor)
+    assert not index.has_open_visit("1-9")
+    assert index.open_count("CITT") == 0
+    assert index.get(visitor.id) is visitor
+
+
+def test_remove_uses_indexed_keys(make_visitor):
+    index = VisitorIndex()
+    visitor = make_visitor(rut="1-9")
+    index.add(visitor)
+    visitor.rut = "2-7"
+    index.remove(visitor.id)
+    assert not index.open_by_rut
+    assert index.get(visitor.id) is None
@@ -0,0 +1,67 @@
+from core.visitors import codec
+from core.visitors.storage import JournalVisitorStorage
+
+
+def _ids(visitors):
+    return sorted(visitor.id for visitor in visitors)
+
+
+def test_journal_replays_changes_over_snapshot(tmp_path, make_visitor):
+    path = str(tmp_path / "visitors.json")
+    storage = JournalVisitorStorage(path)
+    storage.save([make_visitor("A"), make_visitor("B")])
+
+    edited = make_visitor("A", estado="Fuera", version=2)
+    storage.save_changes([edited, make_visitor("C")], ["B"])
+
+    loaded = {visitor.id: visitor for visitor in JournalVisitorStorage(path).load()}
+    assert sorted(loaded) == ["A", "C"]
+    assert loaded["A"].estado == "Fuera"
+    assert loaded["A"].version == 2
+
+
+def test_journal_ignores_truncated_last_line(tmp_path, make_visitor):
+    path = str(tmp_path / "visitors.json")
+    storage = JournalVisitorStorage(path)
+    storage.save_changes([make_visitor("A")])
+    with open(storage.journal_path, "a", encoding="utf-8") as handle:
+        handle.write('{"op": "upsert", "visitor": {"id": "B"')
+
+    reopened = JournalVisitorStorage(path)
+    assert _ids(reopened.load()) == ["A"]
+    # La línea incompleta se cierra para no corromper el siguiente evento
+    reopened.save_changes([make_visitor("C")])
+    assert _ids(JournalVisitorStorage(path).load()) == ["A", "C"]
+
+
+def test_journal_compaction_folds_into_snapshot(tmp_path, make_visitor):
+    path = str(tmp_path / "visitors.json")
+    storage = JournalVisitorStorage(path)
+    storage.save_changes([make_visitor("A"), make_visitor("B")])
+    storage.save_changes([], ["A"])
+    storage.compact()
+
+    assert not (tmp_path / "visitors.journal.ndjson").exists()
+    assert not (tmp_path / "visitors.journal.compacting").exists()
+    with open(path, "rb") as handle:
+        assert [document["id"] for document in codec.loads(handle.read())] == ["B"]
+    assert _ids(JournalVisitorStorage(path).load()) == ["B"]
+
+
+def test_journal_replays_interrupted_compaction(tmp_path, make_visitor):
+    path = str(tmp_path / "visitors.json")
+    storage = JournalVisitorStorage(path)
+    storage.save_changes([make_visitor("A")])
+    # Corte justo después de congelar la bitácora
+    (tmp_path / "visitors.journal.ndjson").rename(tmp_path / "visitors.journal.compacting")
+    storage.save_changes([make_visitor("B")])
+    assert _ids(JournalVisitorStorage(path).load()) == ["A", "B"]
+
+
+def test_journal_delete_all(tmp_path, make_visitor):
+    path = str(tmp_path / "visitors.json")
+    storage = JournalVisitorStorage(path)
+    storage.save([make_visitor("A")])
+    storage.save_changes([make_visitor("B")])
+    storage.delete_all()
+    assert JournalVisitorStorage(path).load() == []
@@ -0,0 +1,473 @@
+import copy
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import pytest
+
+from core.visitors import codec
+from core.visitors import manager as manager_module
+from core.visitors.manager import VisitorManager
+from core.visitors.changes import VisitorChangeSet
+from core.visitors.models import Visitor
+from core.visitors.outbox import OutboxReplayer, VisitorOutbox, outbox_path_for
+from core.visitors.partitions import current_partition_start
+from core.visitors.query import run_query
+from core.visitors.storage import BaseVisitorStorage, VisitorConflictError, VisitorStorageError
+
+
+class FakeMongoStorage(BaseVisitorStorage):
+    """
+    Remoto en memoria con la semántica de ``MongoVisitorStorage`` que usa el
+    gestor: escrituras condicionadas a la versión, marca de agua inclusiva
+    sobre ``updated_at`` y conteos sin leer los documentos.
+    """
+
+    native_query = True
+
+    def __init__(self):
+        self.documents: Dict[str, Dict] = {}
+        self.watermark: Optional[datetime] = None
+        self.offline = False
+        self.save_calls = 0
+        self._clock = datetime(2025, 1, 1)
+
+    def _check(self) -> None:
+        if self.offline:
+            raise VisitorStorageError("sin conexión")
+
+    def _tick(self) -> datetime:
+        self._clock += timedelta(seconds=1)
+        return self._clock
+
+    def _decode(self, documents: Iterable[Dict]) -> List[Visitor]:
+        visitors = []
+        for document in documents:
+            updated_at = document.get("updated_at")
+            if updated_at is not None and (self.watermark is None or updated_at > self.watermark):
+                self.watermark = updated_at
+            visitors.append(codec.decode_visitor({k: v for k, v in document.items() if k != "updated_at"}))
+        return visitors
+
+    # Escritura desde "otra estación"
+    def put(self, visitor: Visitor) -> None:
+        document = codec.encode_visitor(visitor)
+        document["version"] = self.documents.get(visitor.id, {}).get("version", 0) + 1
+        document["updated_at"] = self._tick()
+        self.documents[visitor.id] = document
+
+    def remove(self, visitor_id: str) -> None:
+        self.documents.pop(visitor_id, None)
+
+    # Como una nueva instancia de MongoVisitorStorage al reconectar
+    def connect(self) -> "FakeMongoStorage":
+        self._check()
+        self.watermark = None
+        return self
+
+    def _load(self, documents: List[Dict]) -> List[Visitor]:
+        # Como MongoDB: sin marca de agua se parte de la hora del servidor previa a la lectura
+        started = self._clock if self.watermark is None else None
+        visitors = self._decode(documents)
+        if self.watermark is None:
+            self.watermark = started
+        return visitors
+
+    # BaseVisitorStorage
+    def load(self) -> List[Visitor]:
+        self._check()
+        self.watermark = None
+        return self._load(copy.deepcopy(list(self.documents.values())))
+
+    def query(self, filter=None, sort=None, limit=0, skip=0, projection=None) -> List:
+        self._check()
+        documents = run_query(copy.deepcopy(list(self.documents.values())), filter, sort, limit, skip)
+        for document in documents:
+            document.pop("updated_at", None)
+        return codec.decode_visitors(documents)
+
+    def load_matching(self, filter=None) -> List[Visitor]:
+        self._check()
+        return self._load(run_query(copy.deepcopy(list(self.documents.values())), filter))
+
+    def load_changes(self) -> Optional[List[Visitor]]:
+        self._check()
+        documents = [
+            document
+            for document in self.documents.values()
+            if document.get("updated_at") is not None
+            and (self.watermark is None or document["updated_at"] >= self.watermark)
+        ]
+        return self._decode(copy.deepcopy(documents))
+
+    def count(self, filter=None) -> Optional[int]:
+        self._check()
+        return len(run_query(list(self.documents.values()), filter))
+
+    def save(self, visitors: Iterable[Visitor]) -> bool:
+        self._check()
+        self.documents = {}
+        for visitor in visitors:
+            self.documents[visitor.id] = dict(codec.encode_visitor(visitor), updated_at=self._tick())
+        return True
+
+    def apply_changes(self, changes: VisitorChangeSet) -> bool:
+        return self.save_changes(changes.upserts, changes.removed, changes.removed_versions)
+
+    def save_changes(
+        self,
+        changed: Iterable[Visitor] = (),
+        deleted_ids: Iterable[str] = (),
+        deleted_versions: Optional[Dict[str, int]] = None,
+    ) -> bool:
+        self._check()
+        self.save_calls += 1
+        conflicts: Dict[str, Optional[Visitor]] = {}
+        for visitor in changed:
+            stored = self.documents.get(visitor.id)
+            if (stored or {}).get("version", 0) != visitor.version or (stored is None and visitor.version):
+                conflicts[visitor.id] = self._current(visitor.id)
+                continue
+            document = codec.encode_visitor(visitor)
+            document["version"] = visitor.version + 1
+            document["updated_at"] = self._tick()
+            self.documents[visitor.id] = document
+            visitor.version += 1
+        for visitor_id in deleted_ids:
+            stored = self.documents.get(visitor_id)
+            if stored is None:
+                continue
+            if deleted_versions and visitor_id in deleted_versions and stored["version"] != deleted_versions[visitor_id]:
+                conflicts[visitor_id] = self._current(visitor_id)
+                continue
+            del self.documents[visitor_id]
+        if conflicts:
+            raise VisitorConflictError(conflicts)
+        return True
+
+    def _current(self, visitor_id: str) -> Optional[Visitor]:
+        stored = self.documents.get(visitor_id)
+        if stored is None:
+            return None
+        return codec.decode_visitor({k: v for k, v in stored.items() if k != "updated_at"})
+
+    def delete_all(self) -> bool:
+        self._check()
+        self.documents = {}
+        return True
+
+
+class Recorder:
+    """Registra las emisiones de las señales del gestor."""
+
+    def __init__(self, signals):
+        self.events: List[tuple] = []
+        for name in ("visitor_added", "visitor_updated", "visitor_removed", "dataset_reloaded", "save_conflict"):
+            getattr(signals, name).connect(lambda *args, name=name: self.events.append((name,) + args))
+
+    def names(self) -> List[str]:
+        return [event[0] for event in self.events]
+
+    def clear(self) -> None:
+        self.events.clear()
+
+
+@pytest.fixture
+def remote():
+    return FakeMongoStorage()
+
+
+@pytest.fixture
+def start_manager(tmp_path, remote, monkeypatch):
+    monkeypatch.setenv("VISITASEGURA_OFFLINE", "1")
+    monkeypatch.setattr(manager_module, "create_default_storage", lambda data_file: remote)
+    started: List[VisitorManager] = []
+
+    def start() -> VisitorManager:
+        VisitorManager._instance = None
+        manager = VisitorManager(str(tmp_path / "visitors.json"))
+        started.append(manager)
+        return manager
+
+    yield start
+    for manager in started:
+        manager.close()
+    VisitorManager._instance = None
+
+
+@pytest.fixture
+def online(start_manager, remote, monkeypatch):
+    """Permite la reconexión en segundo plano, contra ``remote``; se activa al reconectar."""
+    monkeypatch.delenv("VISITASEGURA_OFFLINE", raising=False)
+    restored = threading.Event()
+
+    class Replayer(OutboxReplayer):
+        def __init__(self, outbox, storage_factory, on_restored, **kwargs):
+            def on_remote_restored(storage):
+                on_restored(storage)
+                restored.set()
+
+            super().__init__(outbox, remote.connect, on_remote_restored, initial_delay=0.01, **kwargs)
+
+    monkeypatch.setattr(manager_module, "OutboxReplayer", Replayer)
+    return restored
+
+
+def _wait(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _ids(manager) -> List[str]:
+    return sorted(visitor.id for visitor in manager.get_all_visitors())
+
+
+def _today(hour: int) -> str:
+    return datetime.now().replace(hour=hour, minute=0, second=0, microsecond=0).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# ----------------------------------------------------------------------
+# Sincronización incremental
+# ----------------------------------------------------------------------
+
+
+def test_idle_sync_applies_nothing(start_manager, remote, make_visitor):
+    remote.put(make_visitor("A", _today(0)))
+    remote.put(make_visitor("B", _today(0)))
+    manager = start_manager()
+    recorder = Recorder(manager.signals)
+
+    assert [manager.sync() for _ in range(3)] == [0, 0, 0]
+    assert recorder.events == []
+
+
+def test_sync_applies_remote_changes_once(start_manager, remote, make_visitor):
+    remote.put(make_visitor("A", _today(0)))
+    manager = start_manager()
+    visitor = manager.get_visitor_by_id("A")
+    recorder = Recorder(manager.signals)
+
+    remote.put(make_visitor("A", _today(0), estado="Fuera"))
+    remote.put(make_visitor("B", _today(0)))
+    assert manager.sync() == 2
+    assert manager.sync() == 0
+    # Mismo objeto, para no invalidar las referencias de las vistas
+    assert manager.get_visitor_by_id("A") is visitor
+    assert visitor.estado == "Fuera" and visitor.version == 2
+    assert recorder.events == [("visitor_added", ["B"]), ("visitor_updated", ["A"])]
+    assert manager.occupancy.inside("CITT") == 1
+
+
+def test_own_writes_are_not_applied_again(start_manager, remote, make_visitor):
+    manager = start_manager()
+    manager.add_visitor(make_visitor("A", _today(0)))
+    manager.flush()
+    assert manager.get_visitor_by_id("A").version == 1
+
+    recorder = Recorder(manager.signals)
+    assert manager.sync() == 0
+    assert recorder.events == []
+
+
+def test_sync_keeps_unsaved_local_edits(start_manager, remote, make_visitor):
+    remote.put(make_visitor("A", _today(0)))
+    manager = start_manager()
+    manager._writer.submit = lambda: None
+    manager.update_visitor("A", sector="Auditorio")
+
+    remote.put(make_visitor("A", _today(0), sector="Biblioteca"))
+    assert manager.sync() == 0
+    assert manager.get_visitor_by_id("A").sector == "Auditorio"
+
+
+def test_count_mismatch_reloads(start_manager, remote, make_visitor):
+    remote.put(make_visitor("A", _today(0)))
+    remote.put(make_visitor("B", _today(0)))
+    manager = start_manager()
+    recorder = Recorder(manager.signals)
+
+    # Las eliminaciones no dejan rastro en updated_at
+    remote.remove("B")
+    manager.sync()
+    assert [visitor.id for visitor in manager.get_all_visitors()] == ["A"]
+    assert "dataset_reloaded" in recorder.names()
+
+
+def test_delete_of_visit_changed_elsewhere_is_a_conflict(start_manager, remote, make_visitor):
+    remote.put(make_visitor("A", _today(0)))
+    manager = start_manager()
+    recorder = Recorder(manager.signals)
+
+    # Otra estación marca la salida antes de que llegue la eliminación local
+    remote.put(make_visitor("A", _today(0), estado="Fuera"))
+    manager.delete_visitor("A")
+    manager.flush()
+
+    assert "A" in remote.documents
+    assert manager.get_visitor_by_id("A").estado == "Fuera"
+    assert ("save_conflict", ["A"]) in recorder.events
+    assert manager.sync() == 0
+
+
+def test_delete_while_saving_waits_for_the_written_version(start_manager, remote, make_visitor):
+    remote.put(make_visitor("A", _today(0)))
+    manager = start_manager()
+    manager._writer.submit = lambda: None
+    manager.update_visitor("A", estado="Fuera")
+
+    # La eliminación se registra mientras el cambio anterior está en vuelo
+    save_changes = remote.save_changes
+
+    def save_and_delete(*args, **kwargs):
+        if not manager._pending:
+            manager.delete_visitor("A")
+        return save_changes(*args, **kwargs)
+
+    remote.save_changes = save_and_delete
+    manager._flush_pending()
+    manager._flush_pending()
+    assert "A" not in remote.documents
+    assert manager.get_visitor_by_id("A") is None
+
+
+def test_search_index_is_built_in_background(start_manager, remote, make_visitor, monkeypatch):
+    monkeypatch.setattr(manager_module, "SEARCH_INDEX_BATCH", 3)
+    for number in range(10):
+        remote.put(make_visitor(str(number), _today(0), nombre_completo=f"Visita {number}"))
+    manager = start_manager()
+
+    # Sin ninguna búsqueda, el índice queda completo
+    assert _wait(lambda: not manager._search_indexing)
+    assert not manager._search._unindexed
+    assert manager.query(text="visita").total == 10
+
+
+# ----------------------------------------------------------------------
+# Reportes
+# ----------------------------------------------------------------------
+
+
+def _collect_reports(manager):
+    reports: List[tuple] = []
+    ready = threading.Event()
+
+    def on_ready(*args):
+        reports.append(args)
+        ready.set()
+
+    manager.signals.report_ready.connect(on_ready)
+    return reports, ready
+
+
+def test_report_is_computed_in_background(start_manager, remote, make_visitor):
+    remote.put(make_visitor("A", _today(9)))
+    remote.put(make_visitor("B", _today(10), estado="Fuera"))
+    manager = start_manager()
+    reports, ready = _collect_reports(manager)
+
+    manager.request_report(since=_today(0))
+    assert ready.wait(5)
+    [(since, visitors, counts)] = reports
+    assert since == _today(0)
+    assert [visitor.id for visitor in visitors] == ["A", "B"]
+    assert counts == {_today(0)[:10]: 2}
+
+
+def test_report_requests_coalesce_to_latest(start_manager, remote, make_visitor, monkeypatch):
+    remote.put(make_visitor("A", _today(9)))
+    manager = start_manager()
+    reports, ready = _collect_reports(manager)
+
+    gate = threading.Event()
+    compute = manager.get_visitors_in_range
+
+    def slow_range(since=None, until=None):
+        gate.wait(5)
+        return compute(since, until)
+
+    monkeypatch.setattr(manager, "get_visitors_in_range", slow_range)
+    manager.request_report(since=_today(0))
+    manager.request_report(since=_today(1))
+    manager.request_report(since=_today(2))
+    gate.set()
+    assert ready.wait(5)
+    # El hilo termina después de emitir: ya no queda ningún cálculo en curso
+    assert [since for since, _, _ in reports] == [_today(2)]
+
+
+# ----------------------------------------------------------------------
+# Arranque desde la copia local
+# ----------------------------------------------------------------------
+
+
+def test_empty_hot_partition_still_saves_a_valid_snapshot(start_manager, remote, make_visitor):
+    # Solo una visita finalizada del mes anterior: nada que cargar en memoria
+    start = datetime.strptime(current_partition_start(), "%Y-%m-%d %H:%M:%S")
+    previous_month = (start - timedelta(days=3)).strftime("%Y-%m-%d %H:%M:%S")
+    remote.put(make_visitor("A", previous_month, estado="Fuera"))
+    manager = start_manager()
+    assert manager.get_all_visitors() == []
+
+    cached = manager._snapshot.load()
+    assert cached is not None
+    assert cached[0] == []
+    # La sincronización parte de esa marca, sin volver a pedir toda la colección
+    assert manager.sync() == 0
+    remote.put(make_visitor("B", _today(0)))
+    assert manager.sync() == 1
+    assert _ids(manager) == ["B"]
+
+
+def _start_with_snapshot(start_manager, remote):
+    first = start_manager()
+    # El resto del mes puede cargarse en segundo plano; la copia se guarda al terminar
+    assert _wait(lambda: first._snapshot.load() is not None)
+    first.close()
+    return first
+
+
+def test_warm_start_does_not_wait_for_remote(start_manager, online, remote, make_visitor):
+    remote.put(make_visitor("A", _today(0)))
+    remote.put(make_visitor("B", _today(0)))
+    _start_with_snapshot(start_manager, remote)
+
+    remote.offline = True
+    remote.put(make_visitor("C", _today(0)))
+    manager = start_manager()
+    assert _ids(manager) == ["A", "B"]
+    assert manager.storage.is_local
+
+    remote.offline = False
+    assert online.wait(5)
+    assert manager.storage is remote
+    assert _ids(manager) == ["A", "B", "C"]
+
+
+def test_warm_start_includes_unsent_offline_changes(start_manager, online, remote, make_visitor, tmp_path):
+    remote.put(make_visitor("A", _today(0)))
+    remote.put(make_visitor("B", _today(0)))
+    _start_with_snapshot(start_manager, remote)
+
+    # Sesión anterior terminada sin conexión
+    changes = VisitorChangeSet()
+    changes.record_modified(make_visitor("A", _today(0), estado="Fuera", version=1))
+    changes.record_removed("B")
+    VisitorOutbox(outbox_path_for(str(tmp_path / "visitors.json"))).enqueue(changes)
+
+    remote.offline = True
+    manager = start_manager()
+    assert _ids(manager) == ["A"]
+    assert manager.get_visitor_by_id("A").estado == "Fuera"
+
+    remote.offline = False
+    assert online.wait(5)
+    assert remote.documents["A"]["estado"] == "Fuera"
+    assert "B" not in remote.documents
+    assert manager.get_visitor_by_id("A").version == 2
+    assert not manager._outbox
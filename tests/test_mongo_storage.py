@@ -0,0 +1,224 @@
+import copy
+from datetime import datetime
+
+import pytest
+
+from core.visitors import codec
+from core.visitors.query import matches
+from core.visitors.storage import MongoVisitorStorage, VisitorConflictError
+
+
+class FakeUpdateOne:
+    def __init__(self, filter, update, upsert=False):
+        self.filter = filter
+        self.update = update
+        self.upsert = upsert
+
+
+class FakeDeleteOne:
+    def __init__(self, filter):
+        self.filter = filter
+
+
+class FakeBulkWriteError(Exception):
+    def __init__(self, details):
+        super().__init__("bulk write error")
+        self.details = details
+
+
+class FakeResult:
+    def __init__(self, matched_count, upserted_count, deleted_count):
+        self.matched_count = matched_count
+        self.upserted_count = upserted_count
+        self.deleted_count = deleted_count
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.local_time = datetime(2025, 1, 1, 12, 0)
+
+    def command(self, name):
+        return {"ok": 1, "localTime": self.local_time}
+
+
+class FakeCollection:
+    """Lo mínimo de una colección de pymongo que usa ``MongoVisitorStorage.save_changes``."""
+
+    def __init__(self, unique_ids=True):
+        self.documents = []
+        self.unique_ids = unique_ids
+        self.database = FakeDatabase()
+
+    def index_information(self):
+        indexes = {"_id_": {"key": [("_id", 1)]}}
+        if self.unique_ids:
+            indexes["id_unique"] = {"key": [("id", 1)], "unique": True}
+        return indexes
+
+    def find(self, filter=None, projection=None):
+        return [copy.deepcopy(document) for document in self.documents if matches(document, filter)]
+
+    def distinct(self, field, filter=None):
+        return sorted({document.get(field) for document in self.documents if matches(document, filter)})
+
+    def bulk_write(self, operations, ordered=True):
+        matched = upserted = deleted = 0
+        errors = []
+        for index, operation in enumerate(operations):
+            targets = [document for document in self.documents if matches(document, operation.filter)]
+            if isinstance(operation, FakeDeleteOne):
+                if targets:
+                    self.documents.remove(targets[0])
+                    deleted += 1
+                continue
+            if targets:
+                matched += 1
+                self._apply(targets[0], operation.update, inserting=False)
+            elif operation.upsert:
+                document = {"id": operation.filter["id"]}
+                self._apply(document, operation.update, inserting=True)
+                if self.unique_ids and any(existing["id"] == document["id"] for existing in self.documents):
+                    errors.append({"index": index, "code": 11000})
+                    continue
+                self.documents.append(document)
+                upserted += 1
+        if errors:
+            raise FakeBulkWriteError(
+                {"writeErrors": errors, "nMatched": matched, "nUpserted": upserted, "nRemoved": deleted}
+            )
+        return FakeResult(matched, upserted, deleted)
+
+    @staticmethod
+    def _apply(document, update, inserting):
+        document.update(update.get("$set", {}))
+        if inserting:
+            document.update(update.get("$setOnInsert", {}))
+        for field, amount in update.get("$inc", {}).items():
+            document[field] = (document.get(field) or 0) + amount
+        for field in update.get("$currentDate", {}):
+            document[field] = datetime.utcnow()
+
+
+def _storage(collection):
+    storage = MongoVisitorStorage.__new__(MongoVisitorStorage)
+    storage.collection = collection
+    storage._update_op = FakeUpdateOne
+    storage._delete_op = FakeDeleteOne
+    storage._bulk_write_error = FakeBulkWriteError
+    storage.watermark = None
+    storage.legacy_dates = False
+    storage.unique_ids = storage._has_unique_id_index()
+    return storage
+
+
+@pytest.fixture(params=[True, False], ids=["unique-index", "no-unique-index"])
+def collection(request):
+    return FakeCollection(unique_ids=request.param)
+
+
+def test_detects_unique_id_index():
+    assert _storage(FakeCollection(unique_ids=True)).unique_ids
+    assert not _storage(FakeCollection(unique_ids=False)).unique_ids
+
+
+def test_new_visits_are_inserted_once(collection, make_visitor):
+    storage = _storage(collection)
+    visitor = make_visitor("A")
+    assert storage.save_changes([visitor])
+    assert visitor.version == 1
+    assert [document["version"] for document in collection.documents] == [1]
+    assert isinstance(collection.documents[0]["fecha_ingreso"], datetime)
+    assert "updated_at" in collection.documents[0]
+
+
+def test_concurrent_insert_of_same_id_is_a_conflict(collection, make_visitor):
+    storage = _storage(collection)
+    storage.save_changes([make_visitor("A", sector="Auditorio")])
+
+    stale = make_visitor("A", sector="CITT")
+    with pytest.raises(VisitorConflictError) as raised:
+        storage.save_changes([stale])
+    assert raised.value.conflicts["A"].sector == "Auditorio"
+    assert stale.version == 0
+    assert len(collection.documents) == 1
+    assert collection.documents[0]["sector"] == "Auditorio"
+
+
+def test_updates_are_compare_and_set(collection, make_visitor):
+    storage = _storage(collection)
+    first = make_visitor("A")
+    storage.save_changes([first])
+
+    # Otra estación edita con la versión vigente
+    other = make_visitor("A", estado="Fuera", version=1)
+    storage.save_changes([other])
+    assert other.version == 2
+
+    first.sector = "Auditorio"
+    with pytest.raises(VisitorConflictError) as raised:
+        storage.save_changes([first, make_visitor("B")])
+    assert raised.value.conflicts["A"].estado == "Fuera"
+    assert raised.value.conflicts["A"].version == 2
+    # El resto del lote sí se guardó
+    assert sorted(document["id"] for document in collection.documents) == ["A", "B"]
+    assert first.version == 1
+
+
+def test_update_of_deleted_visit_is_a_conflict(collection, make_visitor):
+    storage = _storage(collection)
+    visitor = make_visitor("A")
+    storage.save_changes([visitor])
+    storage.save_changes([], ["A"])
+
+    visitor.estado = "Fuera"
+    with pytest.raises(VisitorConflictError) as raised:
+        storage.save_changes([visitor])
+    assert raised.value.conflicts == {"A": None}
+    assert collection.documents == []
+
+
+def test_deletes_are_compare_and_set(collection, make_visitor):
+    storage = _storage(collection)
+    storage.save_changes([make_visitor("A"), make_visitor("B")])
+
+    # Otra estación marca la salida de A después de que esta la leyera
+    storage.save_changes([make_visitor("A", estado="Fuera", version=1)])
+    with pytest.raises(VisitorConflictError) as raised:
+        storage.save_changes([], ["A", "B"], {"A": 1, "B": 1})
+    assert list(raised.value.conflicts) == ["A"]
+    assert raised.value.conflicts["A"].estado == "Fuera"
+    # B sí se eliminó; A conserva el cambio de la otra estación
+    assert [document["id"] for document in collection.documents] == ["A"]
+    assert collection.documents[0]["version"] == 2
+
+
+def test_deleting_an_already_deleted_visit_is_not_a_conflict(collection, make_visitor):
+    storage = _storage(collection)
+    storage.save_changes([make_visitor("A")])
+    storage.save_changes([], ["A"], {"A": 1})
+    assert storage.save_changes([], ["A"], {"A": 1})
+    assert collection.documents == []
+
+
+def test_legacy_documents_without_version_accept_first_write(collection, make_visitor):
+    document = codec.encode_visitor(make_visitor("A"))
+    del document["version"]
+    collection.documents.append(document)
+
+    storage = _storage(collection)
+    visitor = make_visitor("A", estado="Fuera")
+    storage.save_changes([visitor])
+    assert visitor.version == 1
+    assert len(collection.documents) == 1
+    assert collection.documents[0]["estado"] == "Fuera"
+
+
+def test_empty_load_starts_watermark_at_server_time(collection, make_visitor):
+    storage = _storage(collection)
+    assert storage.load_matching({"estado": "Dentro"}) == []
+    assert storage.watermark == collection.database.local_time
+
+    # Con documentos, la marca de agua avanza hasta el más reciente
+    storage.save_changes([make_visitor("A")])
+    storage.load()
+    assert storage.watermark == collection.documents[0]["updated_at"]
@@ -0,0 +1,169 @@
+from typing import Dict, Iterable, List, Optional
+
+import pytest
+
+from core.visitors.changes import VisitorChangeSet
+from core.visitors.models import Visitor
+from core.visitors.outbox import VisitorOutbox
+from core.visitors.storage import BaseVisitorStorage, VisitorConflictError, VisitorStorageError
+
+
+class FakeRemoteStorage(BaseVisitorStorage):
+    """Remoto en memoria con escrituras condicionadas a la versión, como MongoDB."""
+
+    def __init__(self):
+        self.versions: Dict[str, int] = {}
+        self.calls: List[tuple] = []
+        self.fail = False
+        self.before_save = None
+
+    def load(self) -> List[Visitor]:
+        return []
+
+    def save(self, visitors: Iterable[Visitor]) -> bool:
+        return True
+
+    def delete_all(self) -> bool:
+        self.versions.clear()
+        return True
+
+    def save_changes(
+        self,
+        changed: Iterable[Visitor] = (),
+        deleted_ids: Iterable[str] = (),
+        deleted_versions: Optional[Dict[str, int]] = None,
+    ) -> bool:
+        changed, deleted_ids = list(changed), list(deleted_ids)
+        if self.before_save is not None:
+            self.before_save()
+        if self.fail:
+            raise VisitorStorageError("sin conexión")
+        self.calls.append(([visitor.id for visitor in changed], deleted_ids))
+        conflicts = {}
+        for visitor in changed:
+            if self.versions.get(visitor.id, 0) != visitor.version:
+                conflicts[visitor.id] = None
+                continue
+            visitor.version += 1
+            self.versions[visitor.id] = visitor.version
+        for visitor_id in deleted_ids:
+            if visitor_id in self.versions and visitor_id in (deleted_versions or {}):
+                if self.versions[visitor_id] != deleted_versions[visitor_id]:
+                    conflicts[visitor_id] = None
+                    continue
+            self.versions.pop(visitor_id, None)
+        if conflicts:
+            raise VisitorConflictError(conflicts)
+        return True
+
+    def apply_changes(self, changes: VisitorChangeSet) -> bool:
+        return self.save_changes(changes.upserts, changes.removed, changes.removed_versions)
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return VisitorOutbox(str(tmp_path / "visitors.outbox.ndjson"))
+
+
+def _changes(created=(), modified=(), removed=()):
+    changes = VisitorChangeSet()
+    for visitor in created:
+        changes.record_created(visitor)
+    for visitor in modified:
+        changes.record_modified(visitor)
+    for visitor_id in removed:
+        changes.record_removed(visitor_id)
+    return changes
+
+
+def test_enqueue_persists_and_collapses_by_id(outbox, make_visitor):
+    outbox.enqueue(_changes(created=[make_visitor("A"), make_visitor("B")]))
+    outbox.enqueue(_changes(modified=[make_visitor("A", estado="Fuera")], removed=["B"]))
+    assert len(outbox) == 4
+
+    remote = FakeRemoteStorage()
+    assert outbox.drain(remote) == 2
+    assert remote.calls == [(["A"], ["B"])]
+    assert not outbox
+    assert len(outbox) == 0
+
+
+def test_failed_drain_keeps_events_for_next_attempt(outbox, make_visitor):
+    outbox.enqueue(_changes(created=[make_visitor("A")]))
+    remote = FakeRemoteStorage()
+    remote.fail = True
+    with pytest.raises(VisitorStorageError):
+        outbox.drain(remote)
+    assert outbox
+
+    # Lo encolado mientras tanto se envía tras lo congelado
+    outbox.enqueue(_changes(created=[make_visitor("B")]))
+    remote.fail = False
+    assert outbox.drain(remote) == 2
+    assert remote.calls == [(["A"], []), (["B"], [])]
+    assert not outbox
+
+
+def test_replaying_sent_batch_is_harmless(outbox, make_visitor):
+    remote = FakeRemoteStorage()
+    outbox.enqueue(_changes(removed=["A"]))
+    outbox.drain(remote)
+    outbox.enqueue(_changes(removed=["A"]))
+    assert outbox.drain(remote) == 1
+    assert remote.versions == {}
+
+
+def test_on_sent_reports_saved_versions_and_conflicts(outbox, make_visitor):
+    remote = FakeRemoteStorage()
+    remote.versions["B"] = 5
+    outbox.enqueue(_changes(modified=[make_visitor("A", version=0), make_visitor("B", version=2)]))
+
+    reports = []
+    outbox.drain(remote, lambda saved, deleted, conflicts: reports.append(([(v.id, v.version) for v in saved], conflicts)))
+    assert reports == [([("A", 1)], {"B": None})]
+    # El conflicto se descarta: prevalece lo remoto
+    assert remote.versions == {"A": 1, "B": 5}
+    assert not outbox
+
+
+def test_later_change_inherits_version_written_in_same_drain(outbox, make_visitor):
+    remote = FakeRemoteStorage()
+    outbox.enqueue(_changes(created=[make_visitor("A")]))
+
+    def edit_while_sending():
+        # La estación sigue sin conocer la versión remota de A
+        remote.before_save = None
+        outbox.enqueue(_changes(modified=[make_visitor("A", estado="Fuera", version=0)]))
+
+    remote.before_save = edit_while_sending
+    sent = []
+    outbox.drain(remote, lambda saved, deleted, conflicts: sent.append((saved, conflicts)))
+    assert [conflicts for _, conflicts in sent] == [{}, {}]
+    assert remote.versions == {"A": 2}
+
+
+def test_written_versions_do_not_outlive_drain(outbox, make_visitor):
+    remote = FakeRemoteStorage()
+    outbox.enqueue(_changes(created=[make_visitor("A")]))
+    outbox.drain(remote)
+    remote.versions.clear()
+
+    outbox.enqueue(_changes(created=[make_visitor("A")]))
+    reports = []
+    outbox.drain(remote, lambda saved, deleted, conflicts: reports.append(conflicts))
+    assert reports == [{}]
+
+
+def test_deletes_carry_the_known_version(outbox, make_visitor):
+    remote = FakeRemoteStorage()
+    remote.versions.update({"A": 1, "B": 3})
+    changes = VisitorChangeSet()
+    changes.record_removed("A", 1)
+    changes.record_removed("B", 1)
+    outbox.enqueue(changes)
+
+    reports = []
+    outbox.drain(remote, lambda saved, deleted, conflicts: reports.append((deleted, conflicts)))
+    # B cambió en otra estación después de leerla: su borrado se descarta
+    assert reports == [(["A"], {"B": None})]
+    assert remote.versions == {"B": 3}
@@ -0,0 +1,52 @@
+import pytest
+
+from core.visitors.query import (
+    DESCENDING,
+    UnsupportedQueryError,
+    matches,
+    parse_order_by,
+    project,
+    run_query,
+)
+
+DOCUMENTS = [
+    {"id": "A", "estado": "Dentro", "sector": "CITT", "fecha_ingreso": "2025-01-02 08:00:00", "fecha_salida": None},
+    {"id": "B", "estado": "Fuera", "sector": "Auditorio", "fecha_ingreso": "2025-01-01 08:00:00", "fecha_salida": "2025-01-01 09:00:00"},
+    {"id": "C", "estado": "Fuera", "sector": "CITT", "fecha_ingreso": "2025-01-03 08:00:00", "fecha_salida": "2025-01-03 09:00:00"},
+]
+
+
+def test_equality_and_operators():
+    assert matches(DOCUMENTS[0], {"estado": "Dentro", "sector": {"$in": ["CITT"]}})
+    assert not matches(DOCUMENTS[1], {"fecha_ingreso": {"$gte": "2025-01-02 00:00:00"}})
+    assert matches(DOCUMENTS[1], {"fecha_salida": {"$exists": True}})
+    assert not matches(DOCUMENTS[0], {"fecha_salida": {"$exists": True}})
+
+
+def test_or_and_regex():
+    query = {"$or": [{"estado": "Dentro"}, {"sector": {"$regex": "^audi", "$options": "i"}}]}
+    assert [document["id"] for document in run_query(DOCUMENTS, query)] == ["A", "B"]
+
+
+def test_range_with_none_never_matches():
+    assert not matches({"fecha_salida": None}, {"fecha_salida": {"$lt": "2030-01-01"}})
+
+
+def test_unsupported_operator_raises():
+    with pytest.raises(UnsupportedQueryError):
+        matches(DOCUMENTS[0], {"sector": {"$where": "x"}})
+
+
+def test_sort_skip_and_limit():
+    result = run_query(DOCUMENTS, None, parse_order_by("-fecha_ingreso"), limit=1, skip=1)
+    assert [document["id"] for document in result] == ["A"]
+
+
+def test_multi_key_sort():
+    result = run_query(DOCUMENTS, None, parse_order_by(["sector", "-fecha_ingreso"]))
+    assert [document["id"] for document in result] == ["B", "C", "A"]
+
+
+def test_parse_order_by_and_project():
+    assert parse_order_by("-fecha_ingreso") == [("fecha_ingreso", DESCENDING)]
+    assert project(DOCUMENTS[0], ["sector"]) == {"id": "A", "sector": "CITT"}
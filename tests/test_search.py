@@ -0,0 +1,55 @@
+from core.visitors.search import VisitorSearchIndex, fold, matches_text, rut_digits
+
+
+def _index(*visitors):
+    index = VisitorSearchIndex()
+    index.rebuild(visitors)
+    return index
+
+
+def test_fold_and_rut_digits():
+    assert fold("Peñalolén") == "penalolen"
+    assert rut_digits("12.345.678-K") == "12345678k"
+
+
+def test_search_ignores_case_and_accents(make_visitor):
+    index = _index(make_visitor("A", nombre_completo="José Peña"), make_visitor("B", nombre_completo="Ana Soto"))
+    assert index.search("jose") == {"A"}
+    assert index.search("PEÑ") == {"A"}
+    assert index.search("jo pe") == {"A"}
+    assert index.search("zz") == set()
+
+
+def test_search_by_rut_with_or_without_format(make_visitor):
+    index = _index(make_visitor("A", rut="12.345.678-9"), make_visitor("B", rut="9.876.543-2"))
+    assert index.search("12345678") == {"A"}
+    assert index.search("12.345") == {"A"}
+
+
+def test_search_follows_edits_and_removals(make_visitor):
+    visitor = make_visitor("A", nombre_completo="José Peña")
+    index = _index(visitor)
+    assert index.search("jose") == {"A"}
+
+    visitor.nombre_completo = "María Díaz"
+    index.refresh(visitor)
+    assert index.search("jose") == set()
+    assert index.search("maria") == {"A"}
+
+    index.remove("A")
+    assert index.search("maria") == set()
+    assert "A" not in index
+
+
+def test_matches_text_agrees_with_index(make_visitor):
+    visitor = make_visitor(nombre_completo="José Peña", sector="Auditorio")
+    assert matches_text(visitor, "pena audi")
+    assert not matches_text(visitor, "pena citt")
+
+
+def test_index_pending_works_in_batches(make_visitor):
+    index = _index(*(make_visitor(str(number), nombre_completo=f"Visita {number}") for number in range(5)))
+    assert index.index_pending(2)
+    assert index.index_pending(2)
+    assert not index.index_pending(2)
+    assert index.search("visita") == {"0", "1", "2", "3", "4"}
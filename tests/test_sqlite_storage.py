@@ -0,0 +1,68 @@
+import sqlite3
+
+from core.visitors.query import parse_order_by
+from core.visitors.storage import JournalVisitorStorage, SqliteVisitorStorage
+
+
+def _ids(visitors):
+    return sorted(visitor.id for visitor in visitors)
+
+
+def test_sqlite_query_filters_sorts_and_pages(tmp_path, make_visitor):
+    storage = SqliteVisitorStorage(str(tmp_path / "visitors.db"))
+    storage.save_changes(
+        [
+            make_visitor("A", "2025-01-01 08:00:00", sector="CITT"),
+            make_visitor("B", "2025-01-02 08:00:00", sector="Auditorio"),
+            make_visitor("C", "2025-01-03 08:00:00", sector="CITT", estado="Fuera"),
+        ]
+    )
+    result = storage.query({"sector": "CITT"}, parse_order_by("-fecha_ingreso"))
+    assert [visitor.id for visitor in result] == ["C", "A"]
+
+    page = storage.query({"fecha_ingreso": {"$gte": "2025-01-02 00:00:00"}}, parse_order_by("fecha_ingreso"), limit=1, skip=1)
+    assert [visitor.id for visitor in page] == ["C"]
+
+    # $regex no tiene traducción a SQL y se resuelve en Python
+    regex = storage.query({"sector": {"$regex": "^audi", "$options": "i"}})
+    assert [visitor.id for visitor in regex] == ["B"]
+
+    rows = storage.query({"estado": "Fuera"}, projection=["sector"])
+    assert rows == [{"id": "C", "sector": "CITT"}]
+
+
+def test_sqlite_persists_versions(tmp_path, make_visitor):
+    path = str(tmp_path / "visitors.db")
+    storage = SqliteVisitorStorage(path)
+    storage.save_changes([make_visitor("A", version=4), make_visitor("B")])
+    storage.save_changes([], ["B"])
+    loaded = SqliteVisitorStorage(path).load()
+    assert [(visitor.id, visitor.version) for visitor in loaded] == [("A", 4)]
+
+
+def test_sqlite_migrates_schema_without_version(tmp_path, make_visitor):
+    path = str(tmp_path / "visitors.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        'CREATE TABLE visitantes (id TEXT PRIMARY KEY, rut TEXT, nombre_completo TEXT, fecha_ingreso TEXT, '
+        'fecha_salida TEXT, "acompañante" TEXT, sector TEXT, estado TEXT, usuario_registrador TEXT)'
+    )
+    conn.execute(
+        "INSERT INTO visitantes VALUES ('A', '1-9', 'Ana', '2025-01-01 08:00:00', NULL, 'No', 'CITT', 'Dentro', 'admin')"
+    )
+    conn.commit()
+    conn.close()
+
+    storage = SqliteVisitorStorage(path)
+    [visitor] = storage.load()
+    assert visitor.version == 0
+    visitor.version = 3
+    storage.save_changes([visitor])
+    assert SqliteVisitorStorage(path).load()[0].version == 3
+
+
+def test_sqlite_imports_json_history_once(tmp_path, make_visitor):
+    json_path = str(tmp_path / "visitors.json")
+    JournalVisitorStorage(json_path).save([make_visitor("A"), make_visitor("B")])
+    storage = SqliteVisitorStorage(str(tmp_path / "visitors.db"), import_from=json_path)
+    assert _ids(storage.load()) == ["A", "B"]
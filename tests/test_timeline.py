@@ -0,0 +1,40 @@
+from core.visitors.indexes import VisitorTimeline
+
+
+def _timeline(make_visitor):
+    timeline = VisitorTimeline()
+    timeline.rebuild(
+        [make_visitor(f"V{day}", f"2025-01-{day:02d} 10:00:00") for day in (3, 1, 2, 5, 4)]
+    )
+    return timeline
+
+
+def test_timeline_range_and_order(make_visitor):
+    timeline = _timeline(make_visitor)
+    assert [v.id for v in timeline.between("2025-01-02 00:00:00", "2025-01-04 10:00:00")] == ["V2", "V3"]
+    assert timeline.count(since="2025-01-04 00:00:00") == 2
+    assert [v.id for v in timeline.latest(2)] == ["V5", "V4"]
+
+
+def test_timeline_pages(make_visitor):
+    timeline = _timeline(make_visitor)
+    assert [v.id for v in timeline.slice(offset=1, limit=2)] == ["V4", "V3"]
+    assert [v.id for v in timeline.slice(offset=3, limit=5, newest_first=False)] == ["V4", "V5"]
+    assert timeline.slice(offset=10, limit=2) == []
+
+
+def test_timeline_refresh_moves_edited_visit(make_visitor):
+    timeline = _timeline(make_visitor)
+    moved = timeline.between()[0]
+    moved.fecha_ingreso = "2025-01-09 10:00:00"
+    timeline.refresh(moved)
+    assert timeline.latest(1) == [moved]
+    assert len(timeline) == 5
+
+
+def test_timeline_extend_merges_and_skips_known(make_visitor):
+    timeline = _timeline(make_visitor)
+    timeline.extend([make_visitor("V0", "2025-01-01 05:00:00"), make_visitor("V3", "2025-01-03 10:00:00")])
+    assert [v.id for v in timeline.between()] == ["V0", "V1", "V2", "V3", "V4", "V5"]
+    timeline.remove("V0")
+    assert timeline.count() == 5